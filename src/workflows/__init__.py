@@ -1,13 +1,38 @@
+import argparse
 import os
 import sys
-import streamlit.web.cli as stcli
+import time
 
 
 def main():
+    parser = argparse.ArgumentParser(prog="gui", description="Run the workflow editor.")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print how long imports and loading the workflows take",
+    )
+    args, streamlit_args = parser.parse_known_args()
+
+    # Imported here so that the command line tools in this package don't pay
+    # for loading Streamlit.
+    start = time.perf_counter()
+    import streamlit.web.cli as stcli
+
     current_dir = os.path.dirname(os.path.abspath(__file__))
     app_path = os.path.join(current_dir, "app.py")
 
-    sys.argv = ["streamlit", "run", app_path]
+    # The pages import their modules as `pages.*`, from the app's directory,
+    # which Streamlit also puts first on the path. Loading them the same way
+    # here means the sessions find the caches that were filled ahead of time.
+    sys.path.insert(0, current_dir)
+    from pages.startup import report_timing, start_prewarm, workflows_path
+
+    report = report_timing if args.profile_startup else None
+    if report is not None:
+        report("import streamlit", time.perf_counter() - start)
+    start_prewarm(workflows_path(), report)
+
+    sys.argv = ["streamlit", "run", app_path, *streamlit_args]
     sys.exit(stcli.main())
 
 
@@ -1,9 +1,10 @@
 import streamlit as st
-from pathlib import Path
-from pages.types import Workflow, Example, Test
+from pages import profiling
+from pages.startup import workflows_path
 
 
-WORKFLOWS_FILE = Path("workflows.jsonl").resolve()
+# Either a .jsonl file or a directory with a file per workflow.
+WORKFLOWS_FILE = workflows_path()
 
 st.session_state.workflows_file = WORKFLOWS_FILE
 
@@ -23,7 +24,12 @@ edit_workflow = st.Page(
 
 def main():
     pg = st.navigation([entry, list_workflows, edit_workflow])
-    pg.run()
+    with profiling.rerun(pg.title):
+        pg.run()
+    if profiling.ENABLED:
+        from pages.session import render_memory
+
+        profiling.render_panel(render_memory)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+import argparse
+import sys
+from pathlib import Path
+
+from .corpus import CorpusShape, write_corpus
+from .suite import (
+    LAYOUTS,
+    BenchmarkReport,
+    compare,
+    format_comparison,
+    format_report,
+    run_suite,
+)
+
+
+def _add_shape_arguments(parser: argparse.ArgumentParser):
+    defaults = CorpusShape()
+    for field in CorpusShape.model_fields:
+        parser.add_argument(
+            f"--{field.replace('_', '-')}",
+            type=int,
+            default=getattr(defaults, field),
+            help=f"default: {getattr(defaults, field)}",
+        )
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def _shape(args) -> CorpusShape:
+    return CorpusShape(
+        **{field: getattr(args, field) for field in CorpusShape.model_fields}
+    )
+
+
+def run(args):
+    report = run_suite(
+        _shape(args),
+        layout=args.layout,
+        runs=args.runs,
+        seed=args.seed,
+        render=not args.no_render,
+    )
+    print(format_report(report))
+    if args.output:
+        args.output.write_text(report.model_dump_json(indent=2))
+
+
+def corpus(args):
+    size = write_corpus(_shape(args), args.path, args.seed)
+    print(f"Wrote {size / 1e6:.1f} MB to {args.path}")
+
+
+def compare_reports(args):
+    baseline = BenchmarkReport.model_validate_json(args.baseline.read_bytes())
+    current = BenchmarkReport.model_validate_json(args.current.read_bytes())
+    comparisons = compare(baseline, current)
+    print(format_comparison(comparisons))
+
+    if args.max_slowdown is not None:
+        slower = [c for c in comparisons if c.ratio - 1 > args.max_slowdown]
+        if slower:
+            sys.exit(f"Slower than allowed: {', '.join(c.name for c in slower)}")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="benchmark", description="Benchmark the store, search and editor pages."
+    )
+    commands = parser.add_subparsers(required=True, metavar="command")
+
+    command = commands.add_parser("run", help="Time operations on a synthetic corpus")
+    _add_shape_arguments(command)
+    command.add_argument("--layout", choices=LAYOUTS, default="jsonl")
+    command.add_argument("--runs", type=int, default=20, help="Runs per operation")
+    command.add_argument(
+        "--no-render", action="store_true", help="Skip rendering the list page"
+    )
+    command.add_argument("--output", type=Path, help="Write the results as JSON")
+    command.set_defaults(func=run)
+
+    command = commands.add_parser("corpus", help="Write a synthetic workflows file")
+    command.add_argument("path", type=Path)
+    _add_shape_arguments(command)
+    command.set_defaults(func=corpus)
+
+    command = commands.add_parser("compare", help="Compare two JSON results")
+    command.add_argument("baseline", type=Path)
+    command.add_argument("current", type=Path)
+    command.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=None,
+        help="Exit with an error if an operation got slower by more than this "
+        "fraction (e.g. 0.2)",
+    )
+    command.set_defaults(func=compare_reports)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
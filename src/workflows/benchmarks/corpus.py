@@ -0,0 +1,95 @@
+import random
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from ..pages.serialization import write_workflows
+from ..pages.types import CodeSnippet, Example, Test, Workflow
+
+
+WORDS = (
+    "schema type property link query insert update delete select filter order "
+    "index constraint migration branch module function trigger access policy "
+    "global computed backlink vector embedding search rag auth user session "
+    "token email password signup login nextjs fastapi python typescript client "
+    "transaction retry pagination cache config deploy cloud cli test fixture"
+).split()
+
+LANGUAGES = ["python", "typescript", "edgeql", "sdl", "bash"]
+
+
+class CorpusShape(BaseModel):
+    """The size and shape of a synthetic corpus of workflows"""
+
+    workflows: int = 100
+    tests: int = 3
+    examples: int = 5
+    snippets: int = 2
+    snippet_size: int = 1500
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choices(WORDS, k=count))
+
+
+def _id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _code(rng: random.Random, size: int) -> str:
+    lines = []
+    length = 0
+    while length < size:
+        indent = "    " * rng.randrange(3)
+        line = f"{indent}{rng.choice(WORDS)}_{rng.choice(WORDS)}({_words(rng, 3)})"
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def _snippets(rng: random.Random, shape: CorpusShape) -> list[CodeSnippet]:
+    return [
+        CodeSnippet(
+            id=_id(rng),
+            url=f"https://github.com/geldata/gel/blob/master/{rng.choice(WORDS)}.py",
+            code=_code(rng, shape.snippet_size),
+            language=rng.choice(LANGUAGES),
+        )
+        for _ in range(shape.snippets)
+    ]
+
+
+def generate(shape: CorpusShape, seed: int = 0) -> Iterator[Workflow]:
+    """Yield the workflows of a synthetic corpus, the same ones for the same seed."""
+    rng = random.Random(seed)
+    for _ in range(shape.workflows):
+        yield Workflow(
+            id=_id(rng),
+            name=_words(rng, 4).capitalize(),
+            tests=[
+                Test(
+                    id=_id(rng),
+                    test_prompt=_words(rng, 20),
+                    expected_outcome=_words(rng, 12),
+                    initial_state=_snippets(rng, shape),
+                )
+                for _ in range(shape.tests)
+            ],
+            examples=[
+                Example(
+                    id=_id(rng),
+                    name=_words(rng, 3).capitalize(),
+                    description=_words(rng, 25),
+                    instructions=_words(rng, 40),
+                    code=_snippets(rng, shape),
+                )
+                for _ in range(shape.examples)
+            ],
+        )
+
+
+def write_corpus(shape: CorpusShape, path: Path, seed: int = 0) -> int:
+    """Write a synthetic corpus as a workflows.jsonl file and return its size."""
+    return write_workflows(Path(path), generate(shape, seed))
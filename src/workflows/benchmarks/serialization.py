@@ -0,0 +1,150 @@
+import argparse
+import io
+import time
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from ..pages import serialization
+from ..pages.serialization import (
+    dump_workflow,
+    load_workflow,
+    load_workflows,
+    write_workflows,
+)
+from ..pages.store import get_store
+from ..pages.types import Workflow
+
+
+class Throughput(BaseModel):
+    """The best throughput of one way to parse or dump the corpus"""
+
+    name: str
+    seconds: float
+    mb_per_s: float
+
+
+class SerializationReport(BaseModel):
+    """Results of a serialization benchmark run"""
+
+    workflows: int
+    bytes: int
+    orjson: bool
+    parse: list[Throughput]
+    dump: list[Throughput]
+
+
+def _corpus(workflows: list[Workflow], copies: int) -> list[bytes]:
+    """The workflows repeated under new ids, as JSON lines without newlines."""
+    lines = []
+    for _ in range(copies):
+        for workflow in workflows:
+            lines.append(
+                workflow.model_copy(update={"id": str(uuid.uuid4())})
+                .model_dump_json()
+                .encode()
+            )
+    return lines
+
+
+def _best(name: str, run: Callable, size: int, repeat: int) -> Throughput:
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds = min(seconds, time.perf_counter() - start)
+    return Throughput(name=name, seconds=seconds, mb_per_s=size / seconds / 1e6)
+
+
+def evaluate(lines: list[bytes], repeat: int = 5) -> SerializationReport:
+    size = sum(len(line) + 1 for line in lines)
+    workflows = [load_workflow(line) for line in lines]
+
+    parse = [
+        _best(
+            "model_validate_json per line",
+            lambda: [Workflow.model_validate_json(line) for line in lines],
+            size,
+            repeat,
+        ),
+        _best(
+            "load_workflow per line",
+            lambda: [load_workflow(line) for line in lines],
+            size,
+            repeat,
+        ),
+        _best("load_workflows batch", lambda: load_workflows(lines), size, repeat),
+    ]
+    dump = [
+        _best(
+            "model_dump_json and join",
+            lambda: "".join(
+                workflow.model_dump_json() + "\n" for workflow in workflows
+            ).encode(),
+            size,
+            repeat,
+        ),
+        _best(
+            "dump_workflow and join",
+            lambda: b"".join(dump_workflow(workflow) + b"\n" for workflow in workflows),
+            size,
+            repeat,
+        ),
+        _best(
+            "write_workflows",
+            lambda: write_workflows(io.BytesIO(), workflows),
+            size,
+            repeat,
+        ),
+    ]
+    return SerializationReport(
+        workflows=len(lines),
+        bytes=size,
+        orjson=serialization.orjson is not None,
+        parse=parse,
+        dump=dump,
+    )
+
+
+def format_report(report: SerializationReport) -> str:
+    lines = [
+        f"{report.workflows} workflows, {report.bytes / 1e6:.1f} MB, "
+        f"orjson {'installed' if report.orjson else 'not installed'}"
+    ]
+    for title, results in (("parse", report.parse), ("dump", report.dump)):
+        lines.append("")
+        lines.append(f"{title:<32} {'MB/s':>8} {'ms':>8}")
+        for result in results:
+            lines.append(
+                f"{result.name:<32} {result.mb_per_s:>8.1f} "
+                f"{result.seconds * 1000:>8.1f}"
+            )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark parsing and dumping workflows."
+    )
+    parser.add_argument("--file", type=Path, default=Path("workflows.jsonl"))
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=1000,
+        help="How many times to repeat the workflows of the file (default: 1000)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    lines = _corpus(get_store(args.file).all(), args.copies)
+    if not lines:
+        parser.error(f"{args.file} has no workflows")
+    report = evaluate(lines, repeat=args.repeat)
+    print(report.model_dump_json(indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
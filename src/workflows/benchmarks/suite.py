@@ -0,0 +1,249 @@
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from ..pages.search import WorkflowIndex
+from ..pages.sharded import ShardedWorkflowStore, convert
+from ..pages.store import WorkflowStore
+from ..pages.types import Example
+from .corpus import WORDS, CorpusShape, write_corpus
+
+
+APP_DIR = Path(__file__).resolve().parents[1]
+LAYOUTS = ["jsonl", "sharded"]
+
+
+class Timing(BaseModel):
+    """How long one operation took over a number of runs"""
+
+    name: str
+    runs: int
+    min_ms: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+
+
+class BenchmarkReport(BaseModel):
+    """Results of a benchmark run, to be compared with other runs"""
+
+    commit: str | None = None
+    created: datetime
+    python: str
+    layout: str
+    seed: int
+    shape: CorpusShape
+    corpus_bytes: int
+    timings: list[Timing]
+
+
+class Comparison(BaseModel):
+    """The change of one timing between two benchmark runs"""
+
+    name: str
+    baseline_ms: float
+    current_ms: float
+    ratio: float
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def measure(
+    name: str, run: Callable, runs: int, setup: Callable | None = None
+) -> Timing:
+    """Time `run` `runs` times, calling the untimed `setup` before each run."""
+    times_ms = []
+    for i in range(runs):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        run(i)
+        times_ms.append((time.perf_counter() - start) * 1000)
+    times_ms.sort()
+    return Timing(
+        name=name,
+        runs=runs,
+        min_ms=times_ms[0],
+        mean_ms=statistics.fmean(times_ms),
+        p50_ms=times_ms[len(times_ms) // 2],
+        p95_ms=times_ms[int(len(times_ms) * 0.95)],
+    )
+
+
+def _open_store(path: Path, layout: str):
+    return ShardedWorkflowStore(path) if layout == "sharded" else WorkflowStore(path)
+
+
+def _render_list_page(path: Path, runs: int) -> list[Timing]:
+    from streamlit.testing.v1 import AppTest
+
+    # The pages import each other as `pages.*`, like when Streamlit runs app.py.
+    if str(APP_DIR) not in sys.path:
+        sys.path.insert(0, str(APP_DIR))
+
+    app = AppTest.from_file(str(APP_DIR / "pages" / "list_workflows.py"))
+    app.session_state.workflows_file = path
+
+    def render(_):
+        app.run(timeout=60)
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+
+    # The first run imports the pages and loads the store.
+    timings = [measure("list_render_cold", render, 1)]
+    timings.append(measure("list_render", render, runs))
+    # Likewise, the first search builds the search index.
+    app.text_input(key="workflows_search").input(" ".join(WORDS[:2]))
+    timings.append(measure("list_render_search_cold", render, 1))
+    timings.append(measure("list_render_search", render, runs))
+    return timings
+
+
+def run_suite(
+    shape: CorpusShape,
+    layout: str = "jsonl",
+    runs: int = 20,
+    seed: int = 0,
+    render: bool = True,
+) -> BenchmarkReport:
+    """Time the store, search and list page on a freshly generated corpus."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "workflows.jsonl"
+        corpus_bytes = write_corpus(shape, path, seed)
+        if layout == "sharded":
+            convert(path, Path(tmp) / "workflows")
+            path = Path(tmp) / "workflows"
+
+        timings = [
+            measure(
+                "load_summaries",
+                lambda _: _open_store(path, layout).summaries(),
+                runs,
+            ),
+            measure("load", lambda _: _open_store(path, layout).all(), runs),
+        ]
+
+        store = _open_store(path, layout)
+        ids = store.ids()
+        workflows = [store.get(ids[i % len(ids)]) for i in range(runs)]
+
+        def rename(i):
+            workflows[i].name = f"Renamed {i}"
+
+        timings.append(
+            measure("save", lambda i: store.put(workflows[i]), runs, setup=rename)
+        )
+
+        upserted = []
+
+        def new_example(i):
+            examples = workflows[i].examples
+            upserted.append(
+                Example(id=examples[0].id, name=f"Upserted {i}")
+                if examples
+                else Example(name=f"Upserted {i}")
+            )
+
+        timings.append(
+            measure(
+                "upsert_example",
+                lambda i: workflows[i].upsert_example(upserted[i]),
+                runs,
+                setup=new_example,
+            )
+        )
+
+        timings.append(
+            measure(
+                "delete",
+                lambda i: store.delete(workflows[i].id),
+                runs,
+                setup=lambda i: store.put(workflows[i]),
+            )
+        )
+        for workflow in workflows:
+            store.put(workflow)
+        timings.append(measure("compact", lambda _: store.compact(), 1))
+
+        index = WorkflowIndex(store)
+        timings.append(measure("search_index", lambda _: index.sync(), 1))
+        queries = [" ".join(WORDS[i : i + 3]) for i in range(runs)]
+        timings.append(
+            measure("search", lambda i: index.search(queries[i % len(queries)]), runs)
+        )
+
+        if render:
+            timings.extend(_render_list_page(path, runs))
+
+    return BenchmarkReport(
+        commit=_git_commit(),
+        created=datetime.now(timezone.utc),
+        python=platform.python_version(),
+        layout=layout,
+        seed=seed,
+        shape=shape,
+        corpus_bytes=corpus_bytes,
+        timings=timings,
+    )
+
+
+def compare(baseline: BenchmarkReport, current: BenchmarkReport) -> list[Comparison]:
+    """The change in median time of every operation timed in both runs."""
+    baseline_timings = {timing.name: timing for timing in baseline.timings}
+    return [
+        Comparison(
+            name=timing.name,
+            baseline_ms=baseline_timings[timing.name].p50_ms,
+            current_ms=timing.p50_ms,
+            ratio=timing.p50_ms / max(baseline_timings[timing.name].p50_ms, 1e-6),
+        )
+        for timing in current.timings
+        if timing.name in baseline_timings
+    ]
+
+
+def format_report(report: BenchmarkReport) -> str:
+    shape = report.shape
+    lines = [
+        f"{shape.workflows} workflows × {shape.tests} tests × {shape.examples} "
+        f"examples × {shape.snippets} snippets of {shape.snippet_size} B "
+        f"({report.corpus_bytes / 1e6:.1f} MB, {report.layout})",
+        "",
+        f"{'operation':<24} {'runs':>5} {'min ms':>9} {'p50 ms':>9} {'p95 ms':>9}",
+    ]
+    for timing in report.timings:
+        lines.append(
+            f"{timing.name:<24} {timing.runs:>5} {timing.min_ms:>9.2f} "
+            f"{timing.p50_ms:>9.2f} {timing.p95_ms:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(comparisons: list[Comparison]) -> str:
+    lines = [f"{'operation':<24} {'before ms':>10} {'after ms':>10} {'change':>8}"]
+    for comparison in comparisons:
+        lines.append(
+            f"{comparison.name:<24} {comparison.baseline_ms:>10.2f} "
+            f"{comparison.current_ms:>10.2f} {comparison.ratio - 1:>+8.0%}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,626 @@
+import argparse
+import io
+import itertools
+import json
+import sys
+from pathlib import Path
+
+from .pages.serialization import load_record
+from .pages.store import WorkflowStore, get_store, is_tombstone
+
+# Workflows validated with one call into pydantic when reading a file, so that
+# memory doesn't grow with the size of the file.
+READ_BATCH_SIZE = 1000
+
+
+def _resolve_id(store: WorkflowStore, prefix: str) -> str:
+    if prefix in store:
+        return prefix
+    matches = [
+        workflow_id for workflow_id in store.ids() if workflow_id.startswith(prefix)
+    ]
+    if not matches:
+        sys.exit(f"No workflow with id {prefix}")
+    if len(matches) > 1:
+        sys.exit(f"Ambiguous workflow id {prefix}: {', '.join(matches)}")
+    return matches[0]
+
+
+def _read_store(path: Path):
+    """The store at a path, or a packed export for the commands that only read."""
+    from .pages.sharded import is_sharded
+
+    if Path(path).is_dir() and not is_sharded(path):
+        # Packed exports need pydantic even to be opened.
+        from .pages.blobs import BLOB_INDEX_FILE, PackedWorkflows
+
+        if (Path(path) / BLOB_INDEX_FILE).exists():
+            return PackedWorkflows(path)
+    return get_store(path)
+
+
+def _read_workflows(path: Path):
+    from .pages.blobs import BLOB_INDEX_FILE, PackedWorkflows
+    from .pages.serialization import load_workflow, load_workflows
+    from .pages.sharded import ShardedWorkflowStore, is_sharded
+
+    if (path / BLOB_INDEX_FILE).exists():
+        packed = PackedWorkflows(path)
+        try:
+            yield from packed
+        finally:
+            packed.close()
+        return
+
+    if is_sharded(path):
+        for _, raw in ShardedWorkflowStore(path).iter_raw():
+            yield load_workflow(raw)
+        return
+    if path.is_dir():
+        raise FileNotFoundError(f"{path} is a directory, but not a workflows directory")
+
+    with path.open("rb") as f:
+        lines = (
+            (number, line)
+            for number, line in enumerate(f, 1)
+            if line.strip() and not is_tombstone(line)
+        )
+        for batch in itertools.batched(lines, READ_BATCH_SIZE):
+            try:
+                workflows = load_workflows(line for _, line in batch)
+            except ValueError:
+                _raise_first_error(path, batch)
+                raise
+            yield from workflows
+
+
+def _raise_first_error(path: Path, lines: tuple[tuple[int, bytes], ...]):
+    """Raise the error of the first invalid line, the way `validate` prints it."""
+    from .pages.validate import LineError, _errors
+
+    for number, line in lines:
+        for location, message in _errors(line):
+            raise ValueError(f"{path}:{LineError(number, location, message)}")
+
+
+def _merge(workflow, incoming):
+    """Combine two versions of a workflow, merging tests and examples by id."""
+    merged = workflow.model_copy()
+    merged.name = incoming.name or workflow.name
+    for field in ("tests", "examples"):
+        items = {item.id: item for item in getattr(workflow, field)}
+        items.update((item.id, item) for item in getattr(incoming, field))
+        setattr(merged, field, list(items.values()))
+    return merged
+
+
+def list_workflows(args):
+    store = _read_store(args.file)
+    for summary in store.summaries():
+        if args.json:
+            print(json.dumps(summary._asdict()))
+        else:
+            print(
+                f"{summary.id}\t{summary.name or 'Untitled'}\t"
+                f"{summary.tests} tests\t{summary.examples} examples\t{summary.size} B"
+            )
+
+
+def show(args):
+    store = _read_store(args.file)
+    raw = store.get_raw(_resolve_id(store, args.id))
+    if args.pretty:
+        print(json.dumps(json.loads(raw), indent=2))
+    else:
+        sys.stdout.buffer.write(raw)
+
+
+def validate(args):
+    from .pages.sharded import is_sharded
+    from .pages.validate import validate_directory, validate_file
+
+    path = args.path or args.file
+    errors = 0
+    if is_sharded(path):
+        for error in validate_directory(path):
+            print(f"{path}/{error}")
+            errors += 1
+    else:
+        for error in validate_file(path, jobs=args.jobs):
+            print(f"{path}:{error}")
+            errors += 1
+
+    if errors:
+        sys.exit(f"{errors} errors")
+    print(f"{path}: OK")
+
+
+def import_workflows(args):
+    store = get_store(args.file)
+    count = 0
+    try:
+        for workflow in _read_workflows(args.path):
+            store.put(workflow)
+            count += 1
+    except ValueError as e:
+        sys.exit(f"{e}\nImported the {count} workflows before it")
+    store.compact()
+    print(f"Imported {count} workflows")
+
+
+def export(args):
+    store = _read_store(args.file)
+    if args.bundle:
+        from .pages.bundle import build_bundle, read_checksum
+
+        if args.path is None:
+            sys.exit("Exporting a bundle needs an output file")
+        records = (load_record(raw) for _, raw in store.iter_raw())
+        count = build_bundle(records, args.path)
+        print(f"Wrote {count} examples, checksum {read_checksum(args.path)}")
+        return
+
+    if args.packed:
+        from .pages.blobs import pack
+        from .pages.serialization import load_workflow
+
+        if args.path is None:
+            sys.exit("Exporting in the packed format needs an output directory")
+        blobs, reused = pack(
+            (load_workflow(raw) for _, raw in store.iter_raw()),
+            args.path,
+        )
+        print(f"Wrote {blobs} snippet bodies, {reused} snippets deduplicated")
+        return
+
+    if args.path is None:
+        for _, raw in store.iter_raw():
+            sys.stdout.buffer.write(raw)
+        return
+
+    with args.path.open("wb") as f:
+        for _, raw in store.iter_raw():
+            f.write(raw)
+
+
+def merge(args):
+    from .pages.serialization import load_workflow
+
+    store = get_store(args.file)
+    count = 0
+    try:
+        for path in args.paths:
+            for incoming in _read_workflows(path):
+                raw = store.get_raw(incoming.id)
+                if raw is not None:
+                    incoming = _merge(load_workflow(raw), incoming)
+                store.put(incoming)
+                count += 1
+    except ValueError as e:
+        sys.exit(f"{e}\nMerged the {count} workflows before it")
+    store.compact()
+    print(f"Merged {count} workflows")
+
+
+def merge_driver(args):
+    from .pages.merge import merge_files
+
+    with io.BytesIO() as out:
+        conflicts = merge_files(
+            args.base, args.ours, args.theirs, out, marker_size=args.marker_size
+        )
+        # Git expects the result in place of our version.
+        args.ours.write_bytes(out.getvalue())
+    for conflict in conflicts:
+        print(f"{args.name}: conflict in {conflict}", file=sys.stderr)
+    if conflicts:
+        sys.exit(1)
+
+
+def normalize(args):
+    from .pages.serialization import is_canonical
+
+    store = get_store(args.file)
+    if args.check:
+        ids = [
+            workflow_id
+            for workflow_id, raw in store.iter_raw()
+            if not is_canonical(raw)
+        ]
+        for workflow_id in ids:
+            print(f"{workflow_id} is not in canonical form")
+        if ids:
+            sys.exit(f"{len(ids)} workflows to normalize")
+        return
+    print(f"Rewrote {store.normalize()} workflows")
+
+
+def delete(args):
+    store = get_store(args.file)
+    for workflow_id in [_resolve_id(store, prefix) for prefix in args.ids]:
+        store.delete(workflow_id)
+    store.compact()
+
+
+def convert(args):
+    from .pages.sharded import convert
+
+    convert(args.source, args.destination)
+
+
+def _resolve_item(items: list, prefix: str, kind: str):
+    matches = [item for item in items if item.id.startswith(prefix)]
+    if len(matches) != 1:
+        problem = "Ambiguous" if matches else "No"
+        sys.exit(f"{problem} {kind} id {prefix}")
+    return matches[0]
+
+
+def _print_ingested(result, unreadable: int = 0):
+    print(f"Added {result.added} snippets, updated {result.updated}")
+    if result.edited:
+        print(
+            f"Skipped {result.edited} snippets edited by hand since they were read "
+            "(use --force to overwrite them)"
+        )
+    if unreadable:
+        print(f"Skipped {unreadable} files that aren't text or couldn't be read")
+
+
+def ingest_snippets(args):
+    from .pages.ingest import (
+        SourceCache,
+        cache_path,
+        expand_spec,
+        ingest,
+        read_sources,
+    )
+    from .pages.types import Example
+
+    store = get_store(args.file)
+    workflow, version = store.checkout(_resolve_id(store, args.workflow))
+    if args.test:
+        parent = _resolve_item(workflow.tests, args.test, "test")
+    elif args.example:
+        parent = _resolve_item(workflow.examples, args.example, "example")
+    else:
+        parent = Example(name=args.new_example)
+
+    root = args.checkout.resolve()
+    try:
+        sources = [source for spec in args.specs for source in expand_spec(root, spec)]
+    except ValueError as e:
+        sys.exit(str(e))
+    if not sources:
+        sys.exit(f"No files in {root} match {' '.join(args.specs)}")
+
+    cache = SourceCache(cache_path(args.file))
+    texts = read_sources(root, sources, cache, jobs=args.jobs)
+    result = ingest(parent, sources, texts, force=args.force)
+    if args.new_example:
+        workflow.upsert_example(parent)
+    store.put(workflow, version)
+    cache.save()
+    _print_ingested(result, sum(text is None for text in texts.values()))
+
+
+def refresh_snippets(args):
+    from .pages.ingest import SourceCache, cache_path, refresh
+    from .pages.serialization import load_workflow
+    from .pages.store import WorkflowConflict
+
+    store = get_store(args.file)
+    ids = [_resolve_id(store, args.workflow)] if args.workflow else store.ids()
+    versions = {}
+    workflows = []
+    for workflow_id in ids:
+        raw, version = store.checkout_raw(workflow_id)
+        # Only workflows with ingested snippets need to be parsed.
+        if raw is not None and b'"source_hash":"' in raw:
+            versions[workflow_id] = version
+            workflows.append(load_workflow(raw))
+
+    cache = SourceCache(cache_path(args.file))
+    changed, result = refresh(
+        workflows, args.checkout.resolve(), cache, force=args.force, jobs=args.jobs
+    )
+    for workflow in changed:
+        try:
+            store.put(workflow, versions[workflow.id])
+        except WorkflowConflict:
+            print(f"Skipped {workflow.id}, which was changed while refreshing")
+    cache.save()
+    _print_ingested(result)
+
+
+def duplicates(args):
+    from .pages.duplicates import get_duplicate_index
+
+    store = get_store(args.file)
+    found = get_duplicate_index(store).pairs(args.threshold)
+    for duplicate in found:
+        if args.json:
+            print(duplicate.model_dump_json())
+        else:
+            print(
+                f"{duplicate.similarity:.2f}\t{duplicate.kind}\t"
+                f"{duplicate.title} ({duplicate.workflow_id}/{duplicate.item_id})\t"
+                f"{duplicate.other_title} "
+                f"({duplicate.other_workflow_id}/{duplicate.other_item_id})"
+            )
+    if not args.json:
+        print(f"{len(found)} near-duplicate pairs")
+
+
+def budget(args):
+    from .pages import budget
+
+    if args.example_budget is not None:
+        budget.EXAMPLE_BUDGET = args.example_budget
+    if args.workflow_budget is not None:
+        budget.WORKFLOW_BUDGET = args.workflow_budget
+
+    store = get_store(args.file)
+    names = {summary.id: summary.name for summary in store.summaries()}
+    over = 0
+    for workflow_id, tokens in budget.get_token_index(store).get().items():
+        examples_over = tokens.examples_over_budget
+        is_over = tokens.over_budget or bool(examples_over)
+        over += is_over
+        if args.over and not is_over:
+            continue
+        if args.json:
+            print(
+                json.dumps(
+                    {
+                        "id": workflow_id,
+                        "name": names.get(workflow_id),
+                        "tokens": tokens.total,
+                        "examples": tokens.examples,
+                        "over_budget": tokens.over_budget,
+                        "examples_over_budget": examples_over,
+                    }
+                )
+            )
+        else:
+            largest = max(tokens.examples.values(), default=0)
+            flags = []
+            if tokens.over_budget:
+                flags.append("over budget")
+            if examples_over:
+                flags.append(f"{len(examples_over)} examples over budget")
+            print(
+                f"{workflow_id}\t{names.get(workflow_id) or 'Untitled'}\t"
+                f"{tokens.total} tokens\t{len(tokens.examples)} examples\t"
+                f"largest {largest}\t{', '.join(flags)}".rstrip()
+            )
+
+    if not args.json:
+        print(
+            f"{over} workflows over budget (limits: {budget.WORKFLOW_BUDGET} tokens "
+            f"per workflow, {budget.EXAMPLE_BUDGET} per example)"
+        )
+    if args.check and over:
+        sys.exit(1)
+
+
+def stats(args):
+    store = _read_store(args.file)
+    counts = dict.fromkeys(["workflows", "tests", "examples", "snippets"], 0)
+    snippet_bytes = 0
+    bodies = set()
+    size = 0
+
+    for _, raw in store.iter_raw():
+        record = load_record(raw)
+        size += len(raw)
+        counts["workflows"] += 1
+        # Fields left out of a record take the model's defaults.
+        tests = record.get("tests") or []
+        examples = record.get("examples") or []
+        counts["tests"] += len(tests)
+        counts["examples"] += len(examples)
+        snippets = [
+            *(s for test in tests for s in test.get("initial_state") or []),
+            *(s for example in examples for s in example.get("code") or []),
+        ]
+        counts["snippets"] += len(snippets)
+        for snippet in snippets:
+            if snippet.get("code") is not None:
+                snippet_bytes += len(snippet["code"].encode())
+                bodies.add(snippet["code"])
+
+    for name, count in counts.items():
+        print(f"{name}: {count}")
+    print(f"distinct snippet bodies: {len(bodies)}")
+    print(f"snippet code: {snippet_bytes} B")
+    print(f"total: {size} B")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="workflows", description="Work with workflows without the editor."
+    )
+    parser.add_argument(
+        "--file",
+        type=Path,
+        default=Path("workflows.jsonl"),
+        help="The workflows file or directory (default: workflows.jsonl)",
+    )
+    commands = parser.add_subparsers(required=True, metavar="command")
+
+    command = commands.add_parser("list", help="List workflows")
+    command.add_argument("--json", action="store_true", help="Print JSON lines")
+    command.set_defaults(func=list_workflows)
+
+    command = commands.add_parser("show", help="Print a workflow")
+    command.add_argument("id", help="Workflow id or a unique prefix of it")
+    command.add_argument("--pretty", action="store_true", help="Indent the JSON")
+    command.set_defaults(func=show)
+
+    command = commands.add_parser("validate", help="Validate a workflows file")
+    command.add_argument("path", type=Path, nargs="?", help="Defaults to --file")
+    command.add_argument(
+        "--jobs", type=int, default=None, help="Worker processes (default: all cores)"
+    )
+    command.set_defaults(func=validate)
+
+    command = commands.add_parser(
+        "import", help="Add workflows from a file, replacing ones with the same id"
+    )
+    command.add_argument(
+        "path", type=Path, help="A workflows file or directory, or a packed directory"
+    )
+    command.set_defaults(func=import_workflows)
+
+    command = commands.add_parser("export", help="Write out all workflows")
+    command.add_argument("path", type=Path, nargs="?", help="Defaults to stdout")
+    command.add_argument(
+        "--packed",
+        action="store_true",
+        help="Write a directory with deduplicated code snippets",
+    )
+    command.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Write a memory-mappable bundle of the examples for the MCP server",
+    )
+    command.set_defaults(func=export)
+
+    command = commands.add_parser(
+        "merge",
+        help="Add workflows from files, merging tests and examples by id",
+    )
+    command.add_argument("paths", type=Path, nargs="+")
+    command.set_defaults(func=merge)
+
+    command = commands.add_parser(
+        "merge-driver",
+        help="Merge three versions of a workflows file by id, as a git merge driver",
+    )
+    command.add_argument("base", type=Path, help="The common ancestor (%%O)")
+    command.add_argument(
+        "ours", type=Path, help="Our version (%%A), replaced with the result"
+    )
+    command.add_argument("theirs", type=Path, help="Their version (%%B)")
+    command.add_argument(
+        "--marker-size", type=int, default=7, help="Conflict marker size (%%L)"
+    )
+    command.add_argument(
+        "--name", default="workflows.jsonl", help="The merged file's path (%%P)"
+    )
+    command.set_defaults(func=merge_driver)
+
+    command = commands.add_parser(
+        "normalize", help="Rewrite workflows that aren't in canonical form"
+    )
+    command.add_argument(
+        "--check",
+        action="store_true",
+        help="Only list them, and exit with an error if there are any",
+    )
+    command.set_defaults(func=normalize)
+
+    command = commands.add_parser("delete", help="Delete workflows")
+    command.add_argument("ids", nargs="+", help="Workflow ids or unique prefixes")
+    command.set_defaults(func=delete)
+
+    command = commands.add_parser(
+        "convert",
+        help="Convert between a .jsonl file and a directory with a file per workflow",
+    )
+    command.add_argument("source", type=Path)
+    command.add_argument("destination", type=Path)
+    command.set_defaults(func=convert)
+
+    command = commands.add_parser(
+        "ingest", help="Add or update code snippets from files in a local checkout"
+    )
+    command.add_argument("checkout", type=Path, help="The checkout to read from")
+    command.add_argument(
+        "specs",
+        nargs="+",
+        metavar="spec",
+        help="A glob relative to the checkout, optionally with lines: schema.gel:1-40",
+    )
+    command.add_argument("--workflow", required=True, help="Workflow id or prefix")
+    target = command.add_mutually_exclusive_group(required=True)
+    target.add_argument("--test", help="Add the snippets to a test's initial state")
+    target.add_argument("--example", help="Add the snippets to the code of an example")
+    target.add_argument(
+        "--new-example", metavar="NAME", help="Add the snippets to a new example"
+    )
+    command.add_argument(
+        "--force", action="store_true", help="Overwrite snippets edited by hand"
+    )
+    command.add_argument(
+        "--jobs", type=int, default=None, help="Reader threads (default: automatic)"
+    )
+    command.set_defaults(func=ingest_snippets)
+
+    command = commands.add_parser(
+        "refresh", help="Update ingested code snippets whose files have changed"
+    )
+    command.add_argument("checkout", type=Path, help="The checkout to read from")
+    command.add_argument("--workflow", help="Only refresh this workflow")
+    command.add_argument(
+        "--force",
+        action="store_true",
+        help="Reread every file and overwrite snippets edited by hand",
+    )
+    command.add_argument(
+        "--jobs", type=int, default=None, help="Reader threads (default: automatic)"
+    )
+    command.set_defaults(func=refresh_snippets)
+
+    command = commands.add_parser(
+        "duplicates", help="List examples and example snippets that nearly duplicate"
+    )
+    command.add_argument(
+        "--threshold",
+        type=float,
+        default=0.8,
+        help="Minimum estimated similarity, from 0 to 1 (default: 0.8)",
+    )
+    command.add_argument("--json", action="store_true", help="Print JSON lines")
+    command.set_defaults(func=duplicates)
+
+    command = commands.add_parser(
+        "budget", help="Estimate the tokens that each workflow's examples cost"
+    )
+    command.add_argument(
+        "--workflow-budget",
+        type=int,
+        help="Tokens allowed for the examples of a workflow "
+        "(default: $WORKFLOWS_TOKEN_BUDGET or 8000)",
+    )
+    command.add_argument(
+        "--example-budget",
+        type=int,
+        help="Tokens allowed per example "
+        "(default: $WORKFLOWS_EXAMPLE_TOKEN_BUDGET or 2000)",
+    )
+    command.add_argument(
+        "--over", action="store_true", help="Only list workflows over budget"
+    )
+    command.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if any workflow is over budget",
+    )
+    command.add_argument("--json", action="store_true", help="Print JSON lines")
+    command.set_defaults(func=budget)
+
+    command = commands.add_parser("stats", help="Print corpus statistics")
+    command.set_defaults(func=stats)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    # ValueError includes pydantic's ValidationError, for invalid workflows.
+    except (FileNotFoundError, FileExistsError, ValueError) as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import mmap
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from pydantic import PrivateAttr
+
+from .serialization import dump_workflow, load_record
+from .store import WorkflowSummary, _parse_record_id
+from .types import CodeSnippet, Workflow
+
+
+WORKFLOWS_FILE = "workflows.jsonl"
+BLOBS_FILE = "blobs.bin"
+BLOB_INDEX_FILE = "blobs.json"
+# How many snippet bodies are kept once read.
+LOADED_CACHE_SIZE = 1024
+
+
+def snippet_digest(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def _snippet_lists(record: dict):
+    for test in record.get("tests") or []:
+        yield test.get("initial_state") or []
+    for example in record.get("examples") or []:
+        yield example.get("code") or []
+
+
+class BlobTable:
+    """Code snippet bodies stored once per content hash.
+
+    Bodies are read from the memory-mapped blob file when they are asked for.
+    The last ones read are kept, so snippets with the same body nearby share
+    one string.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._index: dict[str, tuple[int, int]] = {
+            digest: (offset, length)
+            for digest, (offset, length) in json.loads(
+                (self.directory / BLOB_INDEX_FILE).read_bytes()
+            ).items()
+        }
+        self._loaded: dict[str, str] = {}
+        self._file = None
+        self._mmap = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._index
+
+    def get(self, digest: str) -> str:
+        body = self._loaded.get(digest)
+        if body is None:
+            offset, length = self._index[digest]
+            if length == 0:
+                body = ""
+            else:
+                if self._mmap is None:
+                    self._file = (self.directory / BLOBS_FILE).open("rb")
+                    self._mmap = mmap.mmap(
+                        self._file.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+                body = self._mmap[offset : offset + length].decode()
+            self._loaded[digest] = body
+            if len(self._loaded) > LOADED_CACHE_SIZE:
+                self._loaded.pop(next(iter(self._loaded)))
+        return body
+
+    def __deepcopy__(self, memo) -> "BlobTable":
+        # Shared by the snippets read from it, and their copies.
+        return self
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+
+class PackedSnippet(CodeSnippet):
+    """A code snippet whose code is read from a blob table when first used.
+
+    Until then, it only holds the digest of its code. Serializing it reads
+    the code (see `CodeSnippet`), so it is written like any other snippet.
+    """
+
+    _blobs: BlobTable = PrivateAttr()
+    _digest: str = PrivateAttr()
+
+    @classmethod
+    def from_record(cls, record: dict, blobs: BlobTable) -> "PackedSnippet":
+        fields = {name: value for name, value in record.items() if name != "code"}
+        snippet = cls.model_construct(_fields_set={*record}, **fields)
+        del snippet.__dict__["code"]
+        snippet._blobs = blobs
+        snippet._digest = record["code"]["blob"]
+        return snippet
+
+    def __getattr__(self, name: str):
+        if name != "code":
+            return super().__getattr__(name)
+        fields = self.__dict__
+        fields["code"] = self._blobs.get(self._digest)
+        # Fields are serialized in the order they are stored in.
+        ordered = {name: fields[name] for name in type(self).model_fields}
+        fields.clear()
+        fields.update(ordered)
+        return fields["code"]
+
+
+class PackedWorkflows:
+    """Workflows stored with deduplicated code snippets, read-only.
+
+    The directory holds `workflows.jsonl`, in which the `code` of every snippet
+    is replaced by `{"blob": "<sha256>"}`, and the blob table the digests point
+    into. Opening it only indexes the lines by workflow id. Workflows are
+    parsed when they are asked for, one at a time, and their snippets only
+    read their code from the blob table when it is used.
+
+    It has the read methods of `WorkflowStore` that the CLI's `list`, `show`,
+    `stats` and `export` use, so they work on a packed directory too; the
+    sizes in its summaries are those of the packed lines.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.blobs = BlobTable(self.directory)
+        self._file = (self.directory / WORKFLOWS_FILE).open("rb")
+        self._index: dict[str, tuple[int, int]] = {}
+        offset = 0
+        for line in self._file:
+            if line.strip():
+                workflow_id, _ = _parse_record_id(line)
+                self._index[workflow_id] = (offset, len(line))
+            offset += len(line)
+
+    def _line(self, workflow_id: str) -> bytes:
+        offset, length = self._index[workflow_id]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def _load(self, line: bytes) -> Workflow:
+        record = load_record(line)
+        for snippets in _snippet_lists(record):
+            for i, snippet in enumerate(snippets):
+                if isinstance(snippet.get("code"), dict):
+                    snippets[i] = PackedSnippet.from_record(snippet, self.blobs)
+        return Workflow.model_validate(record)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, workflow_id: str) -> bool:
+        return workflow_id in self._index
+
+    def __iter__(self) -> Iterator[Workflow]:
+        for workflow_id in self._index:
+            yield self._load(self._line(workflow_id))
+
+    def ids(self) -> list[str]:
+        return list(self._index)
+
+    def get(self, workflow_id: str) -> Workflow | None:
+        if workflow_id not in self._index:
+            return None
+        return self._load(self._line(workflow_id))
+
+    def get_raw(self, workflow_id: str) -> bytes | None:
+        """The workflow as a line of workflows.jsonl, with its code read."""
+        workflow = self.get(workflow_id)
+        return None if workflow is None else dump_workflow(workflow) + b"\n"
+
+    def iter_raw(self):
+        for workflow_id in self._index:
+            yield workflow_id, self.get_raw(workflow_id)
+
+    def summaries(self) -> list[WorkflowSummary]:
+        return [
+            WorkflowSummary.from_json(self._line(workflow_id))
+            for workflow_id in self._index
+        ]
+
+    def close(self):
+        self._file.close()
+        self.blobs.close()
+
+
+def pack(workflows: Iterable[Workflow], directory: Path) -> tuple[int, int]:
+    """Write workflows in the packed format.
+
+    Returns the number of snippet bodies written and the number of snippets
+    that referenced an already written body.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    index: dict[str, tuple[int, int]] = {}
+    reused = 0
+    offset = 0
+
+    with (
+        (directory / WORKFLOWS_FILE).open("w") as workflows_file,
+        (directory / BLOBS_FILE).open("wb") as blobs_file,
+    ):
+        for workflow in workflows:
+            record = workflow.model_dump(mode="json")
+            for snippets in _snippet_lists(record):
+                for snippet in snippets:
+                    if snippet.get("code") is None:
+                        continue
+                    digest = snippet_digest(snippet["code"])
+                    if digest in index:
+                        reused += 1
+                    else:
+                        data = snippet["code"].encode()
+                        blobs_file.write(data)
+                        index[digest] = (offset, len(data))
+                        offset += len(data)
+                    snippet["code"] = {"blob": digest}
+            workflows_file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    (directory / BLOB_INDEX_FILE).write_text(json.dumps(index))
+
+    return len(index), reused
+
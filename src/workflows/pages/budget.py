@@ -0,0 +1,166 @@
+import hashlib
+import os
+import re
+import threading
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+from .profiling import timed
+from .serialization import load_record
+from .store import WorkflowStore
+
+
+# What an example, and all the examples of a workflow, may cost in an agent's
+# context before authors are warned.
+EXAMPLE_BUDGET = int(os.environ.get("WORKFLOWS_EXAMPLE_TOKEN_BUDGET", 2000))
+WORKFLOW_BUDGET = int(os.environ.get("WORKFLOWS_TOKEN_BUDGET", 8000))
+
+# Tokenizers mostly keep words, punctuation and line breaks apart, and split
+# longer words. So a text is estimated to cost a token per four characters of
+# each word, per two characters of each run of punctuation, and per line.
+TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]{1,2}|\n")
+ESTIMATE_CACHE_SIZE = 65536
+STALE_READ_ALL = 16
+
+_estimates: dict[bytes, int] = {}
+
+
+def estimate_tokens(text: str | None) -> int:
+    """A rough, offline estimate of how many tokens a text costs an agent.
+
+    Estimates are cached by a hash of the text, so unchanged examples are
+    not measured again on every rerun.
+    """
+    if not text:
+        return 0
+    key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    tokens = _estimates.get(key)
+    if tokens is None:
+        tokens = _estimates[key] = len(TOKEN_RE.findall(text))
+        if len(_estimates) > ESTIMATE_CACHE_SIZE:
+            _estimates.pop(next(iter(_estimates)), None)
+    return tokens
+
+
+def _get(item, field: str):
+    return item.get(field) if isinstance(item, dict) else getattr(item, field)
+
+
+def _example_texts(example) -> Iterator[str | None]:
+    # An example is served with its name, description, instructions and code.
+    yield _get(example, "name")
+    yield _get(example, "description")
+    yield _get(example, "instructions")
+    for snippet in _get(example, "code") or []:
+        yield _get(snippet, "url")
+        yield _get(snippet, "language")
+        yield _get(snippet, "code")
+
+
+def example_tokens(example) -> int:
+    """The estimated tokens of an example, given as a model or as a record."""
+    return sum(estimate_tokens(text) for text in _example_texts(example))
+
+
+class WorkflowTokens(NamedTuple):
+    """The estimated tokens of the examples of a workflow"""
+
+    total: int
+    # Example id -> tokens, in the order of the workflow's examples.
+    examples: dict[str, int]
+
+    @classmethod
+    def of(cls, workflow) -> "WorkflowTokens":
+        examples = {
+            _get(example, "id"): example_tokens(example)
+            for example in _get(workflow, "examples") or []
+        }
+        return cls(sum(examples.values()), examples)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.total > WORKFLOW_BUDGET
+
+    @property
+    def examples_over_budget(self) -> list[str]:
+        return [
+            example_id
+            for example_id, tokens in self.examples.items()
+            if tokens > EXAMPLE_BUDGET
+        ]
+
+
+def format_tokens(tokens: int) -> str:
+    if tokens < 1000:
+        return f"~{tokens} tokens"
+    return f"~{tokens / 1000:.1f}k tokens"
+
+
+class TokenIndex:
+    """The estimated tokens of every workflow in a store.
+
+    Like the search index it follows the store lazily: only workflows whose
+    line changed since they were measured are read again, and without
+    validating them.
+    """
+
+    def __init__(self, store: WorkflowStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._tokens: dict[str, tuple[int, WorkflowTokens]] = {}
+
+    @timed()
+    def get(
+        self, workflow_ids: Iterable[str] | None = None
+    ) -> dict[str, WorkflowTokens]:
+        """The tokens of some workflows (by default all), measuring only those."""
+        versions = self.store.versions()
+        if workflow_ids is not None:
+            versions = {
+                workflow_id: versions[workflow_id]
+                for workflow_id in workflow_ids
+                if workflow_id in versions
+            }
+        with self._lock:
+            stale = {
+                workflow_id: version
+                for workflow_id, version in versions.items()
+                if self._tokens.get(workflow_id, (None,))[0] != version
+            }
+            # A few changed workflows are read one by one, many in one pass.
+            if len(stale) > STALE_READ_ALL:
+                lines = (
+                    (workflow_id, raw)
+                    for workflow_id, raw in self.store.iter_raw()
+                    if workflow_id in stale
+                )
+            else:
+                lines = (
+                    (workflow_id, self.store.get_raw(workflow_id))
+                    for workflow_id in stale
+                )
+            for workflow_id, raw in lines:
+                if raw is not None:
+                    tokens = WorkflowTokens.of(load_record(raw))
+                    self._tokens[workflow_id] = (stale[workflow_id], tokens)
+            if workflow_ids is None:
+                for workflow_id in self._tokens.keys() - versions.keys():
+                    del self._tokens[workflow_id]
+            return {
+                workflow_id: self._tokens[workflow_id][1]
+                for workflow_id in versions
+                if workflow_id in self._tokens
+            }
+
+
+_indexes: dict[Path, TokenIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_token_index(store: WorkflowStore) -> TokenIndex:
+    """Return the process-wide token index for a store."""
+    with _indexes_lock:
+        if store.path not in _indexes:
+            _indexes[store.path] = TokenIndex(store)
+        return _indexes[store.path]
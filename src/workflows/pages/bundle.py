@@ -0,0 +1,371 @@
+import hashlib
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from .text import tokenize
+
+
+MAGIC = b"GELWFBDL"
+FORMAT_VERSION = 1
+
+# magic, format version, checksum of everything after the header, the number
+# of examples, snippets, terms and postings, then the offsets of the tables.
+HEADER = struct.Struct("<8sI32s4I5Q")
+# A string is an offset and a length into the string heap.
+STRING = "QI"
+EXAMPLE = struct.Struct("<" + STRING * 6 + "II")
+SNIPPET = struct.Struct("<" + STRING * 4)
+TERM = struct.Struct("<" + STRING + "II")
+POSTING = struct.Struct("<I")
+
+NONE_LENGTH = 0xFFFFFFFF
+
+
+class BundleError(Exception):
+    """A file that is not a valid workflows bundle"""
+
+
+class _Heap:
+    """All the strings of a bundle, each stored once."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self._offsets: dict[bytes, int] = {}
+
+    def add(self, text: str | None) -> tuple[int, int]:
+        if text is None:
+            return 0, NONE_LENGTH
+        data = text.encode()
+        offset = self._offsets.get(data)
+        if offset is None:
+            offset = self._offsets[data] = len(self.data)
+            self.data += data
+        return offset, len(data)
+
+
+def build_bundle(records: Iterable[dict], path: Path) -> int:
+    """Compile workflow records into a bundle file and return its example count.
+
+    The bundle has a table of examples sorted by id, a table of their code
+    snippets, an inverted index of the terms in example names and descriptions
+    and a heap holding every string once, all at fixed offsets so a reader can
+    use them straight from a memory map.
+    """
+    heap = _Heap()
+    rows = []
+    for record in records:
+        for example in record.get("examples") or []:
+            rows.append((example["id"], record["id"], record.get("name"), example))
+    rows.sort(key=lambda row: row[0].encode())
+
+    examples = bytearray()
+    snippets = bytearray()
+    snippet_count = 0
+    postings: dict[str, list[int]] = {}
+    for i, (example_id, workflow_id, workflow_name, example) in enumerate(rows):
+        code = example.get("code") or []
+        examples += EXAMPLE.pack(
+            *heap.add(example_id),
+            *heap.add(workflow_id),
+            *heap.add(workflow_name),
+            *heap.add(example.get("name")),
+            *heap.add(example.get("description")),
+            *heap.add(example.get("instructions")),
+            snippet_count,
+            len(code),
+        )
+        for snippet in code:
+            snippets += SNIPPET.pack(
+                *heap.add(snippet["id"]),
+                *heap.add(snippet.get("url")),
+                *heap.add(snippet.get("language")),
+                *heap.add(snippet.get("code")),
+            )
+        snippet_count += len(code)
+        terms = tokenize(example.get("name")) + tokenize(example.get("description"))
+        for term in dict.fromkeys(terms):
+            postings.setdefault(term, []).append(i)
+
+    terms = bytearray()
+    posting_data = bytearray()
+    posting_count = 0
+    for term in sorted(postings, key=str.encode):
+        terms += TERM.pack(*heap.add(term), posting_count, len(postings[term]))
+        for i in postings[term]:
+            posting_data += POSTING.pack(i)
+        posting_count += len(postings[term])
+
+    offset = HEADER.size
+    offsets = []
+    for table in (examples, snippets, terms, posting_data):
+        offsets.append(offset)
+        offset += len(table)
+    offsets.append(offset)
+
+    body = b"".join((examples, snippets, terms, posting_data, heap.data))
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        hashlib.sha256(body).digest(),
+        len(rows),
+        snippet_count,
+        len(postings),
+        posting_count,
+        *offsets,
+    )
+
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+def read_checksum(path: Path) -> str:
+    """The checksum of a bundle, read from its header without loading it."""
+    with Path(path).open("rb") as f:
+        return _unpack_header(f.read(HEADER.size))[2].hex()
+
+
+def _unpack_header(data: bytes) -> tuple:
+    if len(data) < HEADER.size:
+        raise BundleError("File is too short for a bundle header")
+    header = HEADER.unpack_from(data)
+    if header[0] != MAGIC:
+        raise BundleError("Not a workflows bundle")
+    if header[1] != FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format version {header[1]}")
+    return header
+
+
+class BundleSnippet:
+    """A code snippet read from a bundle."""
+
+    __slots__ = ("_bundle", "_fields")
+
+    def __init__(self, bundle: "Bundle", fields: tuple):
+        self._bundle = bundle
+        self._fields = fields
+
+    @property
+    def id(self) -> str:
+        return self._bundle._string(self._fields, 0)
+
+    @property
+    def url(self) -> str | None:
+        return self._bundle._string(self._fields, 1)
+
+    @property
+    def language(self) -> str | None:
+        return self._bundle._string(self._fields, 2)
+
+    @property
+    def code(self) -> str | None:
+        return self._bundle._string(self._fields, 3)
+
+    @property
+    def code_bytes(self) -> memoryview | None:
+        """The UTF-8 code, as a view into the bundle rather than a copy."""
+        return self._bundle._view(self._fields, 3)
+
+
+class BundleExample:
+    """An example read from a bundle, decoding each field only when asked for."""
+
+    __slots__ = ("_bundle", "_fields")
+
+    def __init__(self, bundle: "Bundle", fields: tuple):
+        self._bundle = bundle
+        self._fields = fields
+
+    @property
+    def id(self) -> str:
+        return self._bundle._string(self._fields, 0)
+
+    @property
+    def workflow_id(self) -> str:
+        return self._bundle._string(self._fields, 1)
+
+    @property
+    def workflow_name(self) -> str | None:
+        return self._bundle._string(self._fields, 2)
+
+    @property
+    def name(self) -> str | None:
+        return self._bundle._string(self._fields, 3)
+
+    @property
+    def description(self) -> str | None:
+        return self._bundle._string(self._fields, 4)
+
+    @property
+    def instructions(self) -> str | None:
+        return self._bundle._string(self._fields, 5)
+
+    @property
+    def code(self) -> list[BundleSnippet]:
+        start, count = self._fields[12:14]
+        return [self._bundle._snippet(i) for i in range(start, start + count)]
+
+    def to_dict(self) -> dict:
+        """The example in the same shape as in workflows.jsonl."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "instructions": self.instructions,
+            "code": [
+                {
+                    "id": snippet.id,
+                    "url": snippet.url,
+                    "code": snippet.code,
+                    "language": snippet.language,
+                }
+                for snippet in self.code
+            ],
+        }
+
+
+class Bundle:
+    """A memory-mapped workflows bundle written by `build_bundle`.
+
+    Opening a bundle only reads its header; examples are looked up by binary
+    search over the mapped tables, so nothing is parsed up front.
+    """
+
+    def __init__(self, path: Path, verify: bool = False):
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise BundleError("File is too short for a bundle header") from None
+        self._view_all = memoryview(self._mmap)
+        try:
+            (
+                _,
+                _,
+                checksum,
+                self._example_count,
+                self._snippet_count,
+                self._term_count,
+                _,
+                self._examples_offset,
+                self._snippets_offset,
+                self._terms_offset,
+                self._postings_offset,
+                self._heap_offset,
+            ) = _unpack_header(self._mmap)
+            self.checksum = checksum.hex()
+            if verify:
+                body = self._view_all[HEADER.size :]
+                actual = hashlib.sha256(body).digest()
+                body.release()
+                if actual != checksum:
+                    raise BundleError("Bundle checksum does not match its contents")
+        except BundleError:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Unmap the bundle. Views from `code_bytes` must be released first."""
+        if self._mmap is not None:
+            self._view_all.release()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+    def __len__(self) -> int:
+        return self._example_count
+
+    def _view(self, fields: tuple, i: int) -> memoryview | None:
+        offset, length = fields[2 * i : 2 * i + 2]
+        if length == NONE_LENGTH:
+            return None
+        start = self._heap_offset + offset
+        return self._view_all[start : start + length]
+
+    def _string(self, fields: tuple, i: int) -> str | None:
+        view = self._view(fields, i)
+        return None if view is None else str(view, "utf-8")
+
+    def _example_fields(self, i: int) -> tuple:
+        offset = self._examples_offset + i * EXAMPLE.size
+        return EXAMPLE.unpack_from(self._mmap, offset)
+
+    def _snippet(self, i: int) -> BundleSnippet:
+        offset = self._snippets_offset + i * SNIPPET.size
+        return BundleSnippet(self, SNIPPET.unpack_from(self._mmap, offset))
+
+    def _find(self, key: bytes, count: int, fields_at) -> int | None:
+        # The tables are sorted by the bytes of their first string.
+        keys = _Keys(self, count, fields_at)
+        i = bisect_left(keys, key)
+        return i if i < count and keys[i] == key else None
+
+    def example(self, example_id: str) -> BundleExample | None:
+        i = self._find(example_id.encode(), self._example_count, self._example_fields)
+        return None if i is None else BundleExample(self, self._example_fields(i))
+
+    def examples(self) -> Iterator[BundleExample]:
+        for i in range(self._example_count):
+            yield BundleExample(self, self._example_fields(i))
+
+    def _term_fields(self, i: int) -> tuple:
+        return TERM.unpack_from(self._mmap, self._terms_offset + i * TERM.size)
+
+    def search(self, query: str, limit: int = 10) -> list[BundleExample]:
+        """Examples whose name or description has the most of the query's terms."""
+        matches = Counter()
+        for term in dict.fromkeys(tokenize(query)):
+            i = self._find(term.encode(), self._term_count, self._term_fields)
+            if i is None:
+                continue
+            start, count = self._term_fields(i)[2:]
+            start = self._postings_offset + start * POSTING.size
+            postings = self._view_all[start : start + count * POSTING.size]
+            for (example,) in POSTING.iter_unpack(postings):
+                matches[example] += 1
+            postings.release()
+        return [
+            BundleExample(self, self._example_fields(i))
+            for i, _ in matches.most_common(limit)
+        ]
+
+
+class _Keys:
+    """The first strings of a bundle table, as a sequence for `bisect`."""
+
+    def __init__(self, bundle: Bundle, count: int, fields_at):
+        self._bundle = bundle
+        self._count = count
+        self._fields_at = fields_at
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._bundle._view(self._fields_at(i), 0).tobytes()
+
+
+def open_if_changed(path: Path, bundle: Bundle | None = None) -> Bundle:
+    """Open the bundle at `path`, or keep `bundle` if its checksum is unchanged."""
+    if bundle is not None and bundle.checksum == read_checksum(path):
+        return bundle
+    if bundle is not None:
+        bundle.close()
+    return Bundle(path)
@@ -0,0 +1,316 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from .serialization import dump_record, load_record
+from .sharded import is_sharded
+from .store import _FileLock
+from .types import CodeSnippet, Example, Test, Workflow
+
+
+FLUSH_DELAY = 1.0
+# Fold the journal into one snapshot per draft once it grows past this size.
+CHECKPOINT_SIZE = 256 * 1024
+# Drafts that were opened but never edited only keep a reference to their base.
+MAX_UNWRITTEN_DRAFTS = 256
+
+# The editor keeps the item being edited in these session state keys, which
+# may hold a test, example or snippet that is not part of the workflow yet.
+SLOTS = {
+    "edit_test": Test,
+    "edit_example": Example,
+    "edit_code_snippet": CodeSnippet,
+}
+
+_UPSERT_METHODS = {
+    "tests": ("upsert_test", "remove_test", Test),
+    "examples": ("upsert_example", "remove_example", Example),
+    "initial_state": ("upsert_code_snippet", "remove_code_snippet", CodeSnippet),
+    "code": ("upsert_code_snippet", "remove_code_snippet", CodeSnippet),
+}
+
+
+class Draft(BaseModel):
+    """Unsaved changes to a workflow, rebuilt from the journal"""
+
+    id: str
+    workflow: Workflow
+    version: int
+    updated: float
+    edit_test: Test | None = None
+    edit_example: Example | None = None
+    edit_code_snippet: CodeSnippet | None = None
+
+
+def _find(workflow: Workflow, item_id: str):
+    if workflow.id == item_id:
+        return workflow
+    for test in workflow.tests:
+        if test.id == item_id:
+            return test
+        for snippet in test.initial_state:
+            if snippet.id == item_id:
+                return snippet
+    for example in workflow.examples:
+        if example.id == item_id:
+            return example
+        for snippet in example.code:
+            if snippet.id == item_id:
+                return snippet
+    return None
+
+
+class _Replay:
+    """The state of one draft while its journal entries are applied in order."""
+
+    def __init__(self, draft_id: str, workflow: Workflow, version: int):
+        self.draft_id = draft_id
+        self.workflow = workflow
+        self.version = version
+        self.updated = 0.0
+        # Items edited in a slot but not added to the workflow (yet), and the
+        # ids of the items open in each slot.
+        self.loose: dict[str, object] = {}
+        self.slots: dict[str, str | None] = dict.fromkeys(SLOTS)
+
+    def _item(self, item_id: str):
+        item = self.loose.get(item_id)
+        return item if item is not None else _find(self.workflow, item_id)
+
+    def apply(self, entry: dict):
+        op = entry["op"]
+        if op == "set":
+            item = self._item(entry["item"])
+            slot = entry.get("slot")
+            if slot in SLOTS:
+                # Like the editor, edit a copy of an item opened in a slot.
+                if entry["item"] not in self.loose:
+                    item = self.loose[entry["item"]] = (
+                        item.model_copy(deep=True)
+                        if item is not None
+                        else SLOTS[slot](id=entry["item"])
+                    )
+                self.slots[slot] = entry["item"]
+            if item is not None:
+                setattr(item, entry["field"], entry["value"])
+        elif op in ("upsert", "remove"):
+            parent = self._item(entry["parent"])
+            if parent is None:
+                return
+            upsert, remove, model = _UPSERT_METHODS[entry["list"]]
+            if op == "upsert":
+                item = model.model_validate(entry["item"])
+                self.loose.pop(item.id, None)
+                getattr(parent, upsert)(item)
+            else:
+                getattr(parent, remove)(model(id=entry["item"]))
+        elif op == "close":
+            item_id = self.slots.get(entry["slot"])
+            if item_id is not None:
+                self.loose.pop(item_id, None)
+            self.slots[entry["slot"]] = None
+        self.updated = entry.get("time", self.updated)
+
+    def draft(self) -> Draft:
+        slots = {
+            slot: self._item(item_id)
+            for slot, item_id in self.slots.items()
+            if item_id is not None
+        }
+        return Draft(
+            id=self.draft_id,
+            workflow=self.workflow,
+            version=self.version,
+            updated=self.updated,
+            **slots,
+        )
+
+
+class DraftJournal:
+    """An append-only journal of unsaved edits made in the editor.
+
+    Every edit is a small JSON line: a field set to a value, a test, example or
+    snippet added or removed, or a draft saved or discarded. Lines are written
+    in batches shortly after the last edit, and a draft's base workflow is only
+    written before its first edit. Replaying the journal restores the drafts
+    after a browser refresh or a restart. When the journal grows large, it is
+    checkpointed: rewritten with a single snapshot line per unsaved draft.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._locked = _FileLock(self.path.with_name(f"{self.path.name}.lock"))
+        self._lock = threading.Lock()
+        self._pending: list[bytes] = []
+        self._unwritten: OrderedDict[str, tuple[Workflow, int, float]] = OrderedDict()
+        self._flush_timer: threading.Timer | None = None
+        self._drafts: dict[str, Draft] | None = None
+        self._stat = None
+        self.checkpoint()
+
+    def begin(self, workflow: Workflow, version: int) -> str:
+        """Start a draft of a workflow and return the draft's id.
+
+        The workflow is only written with the first edit, and must not change
+        until then: pass the shared instance that the editor copies from.
+        """
+        draft_id = str(uuid.uuid4())
+        with self._lock:
+            self._unwritten[draft_id] = (workflow, version, time.time())
+            while len(self._unwritten) > MAX_UNWRITTEN_DRAFTS:
+                self._unwritten.popitem(last=False)
+        return draft_id
+
+    def _line(self, draft_id: str, op: str, **fields) -> bytes:
+        entry = {"draft": draft_id, "op": op, "time": time.time(), **fields}
+        return dump_record(entry) + b"\n"
+
+    def record(self, draft_id: str, op: str, **fields):
+        """Add an edit to a draft; it is written to disk shortly after."""
+        with self._lock:
+            base = self._unwritten.pop(draft_id, None)
+            if base is not None:
+                workflow, version, opened = base
+                self._pending.append(
+                    self._line(
+                        draft_id,
+                        "open",
+                        workflow=workflow.model_dump(),
+                        version=version,
+                        time=opened,
+                    )
+                )
+            self._pending.append(self._line(draft_id, op, **fields))
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            self._flush_timer = threading.Timer(FLUSH_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def finish(self, draft_id: str, saved: bool):
+        """End a draft whose changes were saved to the store or thrown away."""
+        with self._lock:
+            if self._unwritten.pop(draft_id, None) is not None:
+                return
+        self.record(draft_id, "saved" if saved else "discarded")
+        self.flush()
+
+    def flush(self):
+        # Written while holding the lock, so batches can't overtake each other.
+        with self._lock:
+            if not self._pending:
+                return
+            with self._locked(exclusive=True):
+                with self.path.open("a+b") as f:
+                    # Don't glue the first line onto one torn by a crash.
+                    if f.seek(0, os.SEEK_END) and self._torn(f):
+                        f.write(b"\n")
+                    f.write(b"".join(self._pending))
+                size = self.path.stat().st_size
+            self._pending = []
+        if size > CHECKPOINT_SIZE:
+            self.checkpoint()
+
+    def _torn(self, f) -> bool:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+    def _stat_key(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _replay(self) -> dict[str, Draft]:
+        replays: dict[str, _Replay] = {}
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                for line in f:
+                    try:
+                        entry = load_record(line)
+                    except ValueError:
+                        continue  # torn by a crash in the middle of a write
+                    draft_id = entry.get("draft")
+                    if entry.get("op") in ("open", "snapshot"):
+                        replay = replays[draft_id] = _Replay(
+                            draft_id,
+                            Workflow.model_validate(entry["workflow"]),
+                            entry["version"],
+                        )
+                        for slot, item in (entry.get("slots") or {}).items():
+                            replay.loose[item["id"]] = SLOTS[slot].model_validate(item)
+                            replay.slots[slot] = item["id"]
+                        replay.updated = entry["time"]
+                    elif entry.get("op") in ("saved", "discarded"):
+                        replays.pop(draft_id, None)
+                    elif draft_id in replays:
+                        replays[draft_id].apply(entry)
+        return {draft_id: replay.draft() for draft_id, replay in replays.items()}
+
+    def drafts(self) -> list[Draft]:
+        """All unsaved drafts, most recently edited first."""
+        self.flush()
+        with self._locked():
+            if self._drafts is None or self._stat_key() != self._stat:
+                self._drafts = self._replay()
+                self._stat = self._stat_key()
+            return sorted(self._drafts.values(), key=lambda draft: -draft.updated)
+
+    def checkpoint(self):
+        """Rewrite the journal as one snapshot line per unsaved draft."""
+        with self._locked(exclusive=True):
+            drafts = self._replay()
+            if not drafts:
+                self.path.unlink(missing_ok=True)
+                self._drafts = drafts
+                self._stat = self._stat_key()
+                return
+
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            with tmp_path.open("wb") as f:
+                for draft in drafts.values():
+                    f.write(
+                        self._line(
+                            draft.id,
+                            "snapshot",
+                            workflow=draft.workflow.model_dump(),
+                            version=draft.version,
+                            time=draft.updated,
+                            slots={
+                                slot: getattr(draft, slot).model_dump()
+                                for slot in SLOTS
+                                if getattr(draft, slot) is not None
+                            },
+                        )
+                    )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._drafts = drafts
+            self._stat = self._stat_key()
+
+
+def journal_path(workflows_path: Path) -> Path:
+    workflows_path = Path(workflows_path)
+    if is_sharded(workflows_path):
+        return workflows_path / ".journal"
+    return workflows_path.with_name(f".{workflows_path.name}.journal")
+
+
+_journals: dict[Path, DraftJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(workflows_path: Path) -> DraftJournal:
+    """Return the process-wide draft journal for a workflows file or directory."""
+    path = journal_path(Path(workflows_path).resolve())
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = DraftJournal(path)
+        return _journals[path]
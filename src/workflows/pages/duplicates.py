@@ -0,0 +1,236 @@
+import threading
+import zlib
+from collections.abc import Iterable
+from itertools import combinations
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from .profiling import timed
+from .store import WorkflowStore
+from .text import tokenize
+from .types import Workflow
+
+
+# Documents are compared as sets of overlapping runs of this many tokens.
+SHINGLE_SIZE = 5
+# Shorter documents (a one line snippet, an example with just a name) would
+# match too much by chance, so they are left out.
+MIN_SHINGLES = 5
+NUM_HASHES = 128
+# The signature is split into bands of rows; two documents become a candidate
+# pair when all the rows of any band agree. 16 bands of 8 rows catch most
+# pairs above ~0.7 similarity, which candidates are then checked against.
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+THRESHOLD = 0.8
+
+# Larger than any hash, and the step between values borrowed from further bins.
+_HASH_MASK = (1 << 64) - 1
+
+
+def shingles(text: str | None) -> set[int]:
+    # Tokens are hashed once each, and a shingle's hash is the hash of the
+    # tuple of its tokens' hashes: both stay the same from one run to the next.
+    tokens = list(map(zlib.crc32, map(str.encode, tokenize(text))))
+    return set(map(hash, zip(*(tokens[i:] for i in range(SHINGLE_SIZE)))))
+
+
+def signature(hashes: set[int]) -> tuple[int, ...]:
+    """A MinHash signature of a set of shingle hashes.
+
+    Rather than hashing every shingle once per signature value, each hash is
+    put in one of `NUM_HASHES` bins and only the smallest hash of each bin is
+    kept (one permutation hashing). Empty bins borrow from the next bin that
+    isn't, so that sparse sets still have comparable signatures.
+    """
+    # Going from largest to smallest, the last hash written to a bin is its
+    # smallest.
+    smallest = {value % NUM_HASHES: value for value in sorted(hashes, reverse=True)}
+    if len(smallest) == NUM_HASHES or not smallest:
+        return tuple(smallest.get(i, _HASH_MASK) for i in range(NUM_HASHES))
+
+    bins = [0] * NUM_HASHES
+    donor = min(smallest) + NUM_HASHES  # wraps around past the last bin
+    for i in reversed(range(NUM_HASHES)):
+        if i in smallest:
+            bins[i] = smallest[i]
+            donor = i
+        else:
+            # Offset by the distance, so that borrowed values rarely match
+            # values that were borrowed from further away.
+            bins[i] = smallest[donor % NUM_HASHES] + (donor - i) * _HASH_MASK
+    return tuple(bins)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """The estimated Jaccard similarity of the sets two signatures were made of."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+def _bands(sig: tuple[int, ...]):
+    for band in range(BANDS):
+        yield band, hash(sig[band * ROWS : (band + 1) * ROWS])
+
+
+class Duplicate(BaseModel):
+    """Two examples, or two example code snippets, that are nearly the same"""
+
+    similarity: float
+    workflow_id: str
+    kind: str
+    item_id: str
+    title: str
+    other_workflow_id: str
+    other_item_id: str
+    other_title: str
+
+
+def _documents(workflow: Workflow):
+    # Examples and their snippets are what the MCP server serves; tests are
+    # left out, as they often repeat the same schema on purpose.
+    for example in workflow.examples:
+        title = example.name or "Untitled example"
+        text = "\n".join(
+            filter(None, [example.name, example.description, example.instructions])
+        )
+        yield "example", example.id, title, text
+        for snippet in example.code:
+            yield "snippet", snippet.id, snippet.url or f"code of {title}", snippet.code
+
+
+class DuplicateIndex:
+    """A MinHash/LSH index of the examples and example snippets in a store.
+
+    Finding all near-duplicate pairs only compares documents that share an
+    LSH bucket, instead of every pair. Like the search index, it follows the
+    store lazily, reindexing workflows whose line changed.
+    """
+
+    def __init__(self, store: WorkflowStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._versions: dict[str, int] = {}
+        self._keys: dict[str, list[tuple[str, str, str]]] = {}
+        self._signatures: dict[tuple[str, str, str], tuple[int, ...]] = {}
+        self._titles: dict[tuple[str, str, str], str] = {}
+        self._buckets: dict[tuple[int, int], set[tuple[str, str, str]]] = {}
+
+    @timed()
+    def update(self, workflow: Workflow, version: int | None = None):
+        documents = [
+            ((workflow.id, kind, item_id), title, signature(hashes))
+            for kind, item_id, title, text in _documents(workflow)
+            if len(hashes := shingles(text)) >= MIN_SHINGLES
+        ]
+        with self._lock:
+            self._remove(workflow.id)
+            for key, title, sig in documents:
+                self._signatures[key] = sig
+                self._titles[key] = title
+                for bucket in _bands(sig):
+                    self._buckets.setdefault(bucket, set()).add(key)
+            self._keys[workflow.id] = [key for key, _, _ in documents]
+            if version is not None:
+                self._versions[workflow.id] = version
+
+    def remove(self, workflow_id: str):
+        with self._lock:
+            self._remove(workflow_id)
+            self._versions.pop(workflow_id, None)
+
+    def _remove(self, workflow_id: str):
+        for key in self._keys.pop(workflow_id, []):
+            for bucket in _bands(self._signatures.pop(key)):
+                keys = self._buckets[bucket]
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[bucket]
+            del self._titles[key]
+
+    @timed()
+    def sync(self):
+        versions = self.store.versions()
+
+        for workflow_id in self._versions.keys() - versions.keys():
+            self.remove(workflow_id)
+
+        for workflow_id, version in versions.items():
+            if self._versions.get(workflow_id) == version:
+                continue
+            # Only read, so the instance shared with the store's cache will do.
+            workflow = self.store.checkout_shared(workflow_id)[0]
+            if workflow is None:
+                continue
+            self.update(workflow, version)
+
+    def _duplicate(self, key, other, score: float) -> Duplicate:
+        return Duplicate(
+            similarity=score,
+            workflow_id=key[0],
+            kind=key[1],
+            item_id=key[2],
+            title=self._titles[key],
+            other_workflow_id=other[0],
+            other_item_id=other[2],
+            other_title=self._titles[other],
+        )
+
+    def _matches(self, pairs: Iterable, threshold: float) -> list[Duplicate]:
+        duplicates = []
+        for key, other in pairs:
+            score = similarity(self._signatures[key], self._signatures[other])
+            if score >= threshold:
+                duplicates.append(self._duplicate(key, other, score))
+        duplicates.sort(key=lambda duplicate: -duplicate.similarity)
+        return duplicates
+
+    @timed()
+    def pairs(self, threshold: float = THRESHOLD) -> list[Duplicate]:
+        """All pairs of near-duplicates in the store, most similar first."""
+        self.sync()
+        with self._lock:
+            candidates = set()
+            for keys in self._buckets.values():
+                if len(keys) > 1:
+                    candidates.update(
+                        pair
+                        for pair in combinations(sorted(keys), 2)
+                        # Only examples are compared to examples, and
+                        # snippets to snippets.
+                        if pair[0][1] == pair[1][1]
+                    )
+            return self._matches(candidates, threshold)
+
+    @timed()
+    def similar(
+        self, workflow: Workflow, threshold: float = THRESHOLD
+    ) -> list[Duplicate]:
+        """Near-duplicates of a workflow's examples and snippets in the store.
+
+        The workflow is expected to have been indexed, for instance with
+        `update` right after saving it.
+        """
+        self.sync()
+        with self._lock:
+            candidates = set()
+            for key in self._keys.get(workflow.id, []):
+                for bucket in _bands(self._signatures[key]):
+                    candidates.update(
+                        (key, other)
+                        for other in self._buckets[bucket]
+                        if other != key and other[1] == key[1]
+                    )
+            return self._matches(candidates, threshold)
+
+
+_indexes: dict[Path, DuplicateIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_duplicate_index(store: WorkflowStore) -> DuplicateIndex:
+    """Return the process-wide near-duplicate index for a store."""
+    with _indexes_lock:
+        if store.path not in _indexes:
+            _indexes[store.path] = DuplicateIndex(store)
+        return _indexes[store.path]
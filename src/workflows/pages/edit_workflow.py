@@ -1,26 +1,76 @@
 import streamlit as st
 from pathlib import Path
-from pages.types import Workflow, Test, Example, CodeSnippet
+from pages.types import Test, Example, CodeSnippet
+from pages.store import MISSING_VERSION, WorkflowConflict, get_store
+from pages.search import get_search_index
+from pages.budget import (
+    EXAMPLE_BUDGET,
+    WORKFLOW_BUDGET,
+    WorkflowTokens,
+    example_tokens,
+    format_tokens,
+)
+from pages.profiling import timed
+from pages.preview import render_snippet
+from pages.drafts import get_journal
+from pages.session import own, start_editing
+from pages.watcher import NOTIFY_INTERVAL, changes
+
+
+MAX_SHOWN_DUPLICATES = 5
+
+
+def begin_draft():
+    # The base doesn't change, so the journal can hold on to it until the
+    # first edit instead of copying it.
+    base = st.session_state.get("edit_base") or st.session_state.edit_workflow
+    st.session_state.draft_id = get_journal(st.session_state.workflows_file).begin(
+        base, st.session_state.edit_workflow_version
+    )
+
+
+def record_edit(op: str, **fields):
+    """Journal an unsaved change, so that it survives a refresh or a restart."""
+    get_journal(st.session_state.workflows_file).record(
+        st.session_state.draft_id, op, **fields
+    )
+
+
+def finish_draft(saved: bool):
+    get_journal(st.session_state.workflows_file).finish(
+        st.session_state.draft_id, saved
+    )
 
 
 if "edit_workflow" not in st.session_state or not st.session_state.edit_workflow:
-    st.session_state.edit_workflow = Workflow()
+    start_editing(st.session_state, None, MISSING_VERSION)
+    begin_draft()
 
 
 if "reset_editor" in st.session_state and st.session_state.reset_editor:
-    st.session_state.edit_test = None
-    st.session_state.edit_example = None
-    st.session_state.edit_code_snippet = None
+    # A draft resumed from the list page brings back the items being edited.
+    draft = st.session_state.pop("resume_draft", None)
+    st.session_state.edit_test = draft.edit_test if draft else None
+    st.session_state.edit_example = draft.edit_example if draft else None
+    st.session_state.edit_code_snippet = draft.edit_code_snippet if draft else None
+    st.session_state.save_conflict = False
+    st.session_state.changed_elsewhere = False
+    st.session_state.save_duplicates = []
+    if draft:
+        st.session_state.draft_id = draft.id
+    else:
+        begin_draft()
     for key in st.session_state:
         if key.startswith("tmp_"):
             del st.session_state[key]
     st.session_state.reset_editor = False
 
+if "draft_id" not in st.session_state:
+    begin_draft()
+
 
 def clear_tmp_state(key: str):
     for tmp_key in st.session_state:
-        if tmp_key.startswith(f"tmp_state_key_{key}"):
-            del st.session_state[tmp_key]
         if tmp_key.startswith(f"tmp_widget_key_{key}"):
             del st.session_state[tmp_key]
 
@@ -38,55 +88,101 @@ st.markdown(
 )
 
 
+def close_item(slot: str):
+    st.session_state[slot] = None
+    record_edit("close", slot=slot)
+
+
 def upsert_test(edit_test: Test):
-    for i, test in enumerate(st.session_state.edit_workflow.tests):
-        if test.id == edit_test.id:
-            st.session_state.edit_workflow.tests[i] = edit_test
-            break
-    else:
-        st.session_state.edit_workflow.tests.append(edit_test)
+    st.session_state.edit_workflow.upsert_test(edit_test)
+    record_edit(
+        "upsert",
+        parent=st.session_state.edit_workflow.id,
+        list="tests",
+        item=edit_test.model_dump(),
+    )
+
+
+def remove_test(test: Test):
+    st.session_state.edit_workflow.remove_test(test)
+    record_edit(
+        "remove", parent=st.session_state.edit_workflow.id, list="tests", item=test.id
+    )
 
 
 def upsert_test_code_snippet(edit_code_snippet: CodeSnippet):
-    for i, code_snippet in enumerate(st.session_state.edit_test.initial_state):
-        if code_snippet.id == edit_code_snippet.id:
-            st.session_state.edit_test.initial_state[i] = edit_code_snippet
-            break
-    else:
-        st.session_state.edit_test.initial_state.append(edit_code_snippet)
+    st.session_state.edit_test.upsert_code_snippet(edit_code_snippet)
+    record_edit(
+        "upsert",
+        parent=st.session_state.edit_test.id,
+        list="initial_state",
+        item=edit_code_snippet.model_dump(),
+    )
 
 
+def remove_test_code_snippet(code_snippet: CodeSnippet):
+    st.session_state.edit_test.remove_code_snippet(code_snippet)
+    record_edit(
+        "remove",
+        parent=st.session_state.edit_test.id,
+        list="initial_state",
+        item=code_snippet.id,
+    )
+
+
+# The edited item keeps the text of a field, so the widget's own state is the
+# only other copy of it.
 def get_text_input(name: str, value, key: str, label_visibility: str = "visible"):
-    state_key = f"tmp_state_key_{key}"
     widget_key = f"tmp_widget_key_{key}"
     return st.text_input(
         name,
-        value=st.session_state[state_key] if state_key in st.session_state else value,
+        value=value,
         key=widget_key,
         label_visibility=label_visibility,
-        on_change=save_text(state_key=state_key, widget_key=widget_key),
+        on_change=save_text(widget_key=widget_key),
     )
 
 
 def get_text_area(name: str, value, key: str, label_visibility: str = "visible"):
-    state_key = f"tmp_state_key_{key}"
     widget_key = f"tmp_widget_key_{key}"
     return st.text_area(
         name,
-        value=st.session_state[state_key] if state_key in st.session_state else value,
+        value=value,
         key=widget_key,
-        on_change=save_text(state_key=state_key, widget_key=widget_key),
+        on_change=save_text(widget_key=widget_key),
         label_visibility=label_visibility,
     )
 
 
-def save_text(state_key: str, widget_key: str):
+# The item a text field edits, by the prefix of the field's key.
+FIELD_SLOTS = [
+    ("edit_test_code_snippet_", "edit_code_snippet"),
+    ("edit_example_code_snippet_", "edit_code_snippet"),
+    ("edit_test_", "edit_test"),
+    ("edit_example_", "edit_example"),
+    ("edit_workflow_", "edit_workflow"),
+]
+
+
+def record_field(key: str, value):
+    for prefix, slot in FIELD_SLOTS:
+        if key.startswith(prefix):
+            item = st.session_state.get(slot)
+            if item is not None:
+                field = key[len(prefix) :]
+                record_edit("set", item=item.id, slot=slot, field=field, value=value)
+            return
+
+
+def save_text(widget_key: str):
     def save_text_callback():
-        st.session_state[state_key] = st.session_state[widget_key]
+        key = widget_key.removeprefix("tmp_widget_key_")
+        record_field(key, st.session_state[widget_key])
 
     return save_text_callback
 
 
+@timed()
 def render_list_tests():
     tests = st.session_state.edit_workflow.tests
 
@@ -98,12 +194,12 @@ def render_list_tests():
                 if st.button(
                     "", key=f"delete_test_{test.id}", icon=":material/delete:"
                 ):
-                    st.session_state.edit_workflow.tests.remove(test)
+                    remove_test(test)
                     st.rerun()
             with col2:
 
                 def set_edit_test(edit_test: Test):
-                    st.session_state.edit_test = edit_test
+                    st.session_state.edit_test = own(edit_test)
 
                 st.button(
                     "",
@@ -113,11 +209,14 @@ def render_list_tests():
                     args=[test],
                 )
 
-            st.json(test.model_dump())
+            st.json(test.model_dump(exclude={"initial_state"}))
+            for code_snippet in test.initial_state:
+                render_snippet(code_snippet, key=f"test_{code_snippet.id}")
     if not tests:
         st.info("No tests have been added yet")
 
 
+@timed()
 def render_list_initial_state():
     initial_state = st.session_state.edit_test.initial_state
 
@@ -131,13 +230,13 @@ def render_list_initial_state():
                     key=f"delete_code_snippet_{code_snippet.id}",
                     icon=":material/delete:",
                 ):
-                    st.session_state.edit_test.initial_state.remove(code_snippet)
+                    remove_test_code_snippet(code_snippet)
                     st.rerun()
 
             with col2:
 
                 def set_edit_code_snippet(edit_code_snippet: CodeSnippet):
-                    st.session_state.edit_code_snippet = edit_code_snippet
+                    st.session_state.edit_code_snippet = own(edit_code_snippet)
 
                 st.button(
                     "",
@@ -147,11 +246,12 @@ def render_list_initial_state():
                     args=[code_snippet],
                 )
 
-            st.json(code_snippet.model_dump())
+            render_snippet(code_snippet, key=f"edit_test_{code_snippet.id}")
     if not initial_state:
         st.info("No code snippets have been added yet")
 
 
+@timed()
 def render_edit_test():
     with st.container(border=True):
         st.session_state.edit_test.test_prompt = get_text_area(
@@ -196,10 +296,10 @@ def render_edit_test():
                     upsert_test_code_snippet(st.session_state.edit_code_snippet)
                     upsert_test(st.session_state.edit_test)
                     clear_tmp_state(key="edit_test_code_snippet")
-                    st.session_state.edit_code_snippet = None
+                    close_item("edit_code_snippet")
 
                 def cancel_code_snippet():
-                    st.session_state.edit_code_snippet = None
+                    close_item("edit_code_snippet")
                     clear_tmp_state(key="edit_test_code_snippet")
 
                 col1, col2 = st.columns([0.5, 0.5])
@@ -236,13 +336,13 @@ def render_edit_test():
 
         def submit_test():
             upsert_test(st.session_state.edit_test)
-            st.session_state.edit_test = None
-            st.session_state.edit_code_snippet = None
+            close_item("edit_test")
+            close_item("edit_code_snippet")
             clear_tmp_state(key="edit_test")
 
         def cancel_test():
-            st.session_state.edit_test = None
-            st.session_state.edit_code_snippet = None
+            close_item("edit_test")
+            close_item("edit_code_snippet")
             clear_tmp_state(key="edit_test")
 
         _, col1, col2 = st.columns([0.68, 0.15, 0.17])
@@ -261,6 +361,7 @@ def render_edit_test():
             )
 
 
+@timed()
 def render_tests():
     if "edit_test" in st.session_state and st.session_state.edit_test is not None:
         render_edit_test()
@@ -274,23 +375,46 @@ def render_tests():
 
 
 def upsert_example(edit_example: Example):
-    for i, example in enumerate(st.session_state.edit_workflow.examples):
-        if example.id == edit_example.id:
-            st.session_state.edit_workflow.examples[i] = edit_example
-            break
-    else:
-        st.session_state.edit_workflow.examples.append(edit_example)
+    st.session_state.edit_workflow.upsert_example(edit_example)
+    record_edit(
+        "upsert",
+        parent=st.session_state.edit_workflow.id,
+        list="examples",
+        item=edit_example.model_dump(),
+    )
+
+
+def remove_example(example: Example):
+    st.session_state.edit_workflow.remove_example(example)
+    record_edit(
+        "remove",
+        parent=st.session_state.edit_workflow.id,
+        list="examples",
+        item=example.id,
+    )
 
 
 def upsert_example_code_snippet(edit_code_snippet: CodeSnippet):
-    for i, code_snippet in enumerate(st.session_state.edit_example.code):
-        if code_snippet.id == edit_code_snippet.id:
-            st.session_state.edit_example.code[i] = edit_code_snippet
-            break
-    else:
-        st.session_state.edit_example.code.append(edit_code_snippet)
+    st.session_state.edit_example.upsert_code_snippet(edit_code_snippet)
+    record_edit(
+        "upsert",
+        parent=st.session_state.edit_example.id,
+        list="code",
+        item=edit_code_snippet.model_dump(),
+    )
+
+
+def remove_example_code_snippet(code_snippet: CodeSnippet):
+    st.session_state.edit_example.remove_code_snippet(code_snippet)
+    record_edit(
+        "remove",
+        parent=st.session_state.edit_example.id,
+        list="code",
+        item=code_snippet.id,
+    )
 
 
+@timed()
 def render_list_examples():
     examples = st.session_state.edit_workflow.examples
 
@@ -302,12 +426,12 @@ def render_list_examples():
                 if st.button(
                     "", key=f"delete_example_{example.id}", icon=":material/delete:"
                 ):
-                    st.session_state.edit_workflow.examples.remove(example)
+                    remove_example(example)
                     st.rerun()
             with col2:
 
                 def set_edit_example(edit_example: Example):
-                    st.session_state.edit_example = edit_example
+                    st.session_state.edit_example = own(edit_example)
 
                 st.button(
                     "",
@@ -317,11 +441,22 @@ def render_list_examples():
                     args=[example],
                 )
 
-            st.json(example.model_dump())
+            tokens = example_tokens(example)
+            if tokens > EXAMPLE_BUDGET:
+                st.caption(
+                    f":orange[:material/warning: {format_tokens(tokens)}, over the "
+                    f"budget of {format_tokens(EXAMPLE_BUDGET)} per example]"
+                )
+            else:
+                st.caption(format_tokens(tokens))
+            st.json(example.model_dump(exclude={"code"}))
+            for code_snippet in example.code:
+                render_snippet(code_snippet, key=f"example_{code_snippet.id}")
     if not examples:
         st.info("No examples have been added yet")
 
 
+@timed()
 def render_edit_example():
     with st.container(border=True):
         st.session_state.edit_example.name = get_text_input(
@@ -386,10 +521,10 @@ def render_edit_example():
                     upsert_example_code_snippet(st.session_state.edit_code_snippet)
                     upsert_example(st.session_state.edit_example)
                     clear_tmp_state(key="edit_example_code_snippet")
-                    st.session_state.edit_code_snippet = None
+                    close_item("edit_code_snippet")
 
                 def cancel_code_snippet():
-                    st.session_state.edit_code_snippet = None
+                    close_item("edit_code_snippet")
                     clear_tmp_state(key="edit_example_code_snippet")
 
                 col1, col2 = st.columns([0.5, 0.5])
@@ -424,13 +559,13 @@ def render_edit_example():
                             key=f"delete_code_snippet_{code_snippet.id}",
                             icon=":material/delete:",
                         ):
-                            st.session_state.edit_example.code.remove(code_snippet)
+                            remove_example_code_snippet(code_snippet)
                             st.rerun()
 
                     with col2:
 
                         def set_edit_code_snippet(edit_code_snippet: CodeSnippet):
-                            st.session_state.edit_code_snippet = edit_code_snippet
+                            st.session_state.edit_code_snippet = own(edit_code_snippet)
 
                         st.button(
                             "",
@@ -440,7 +575,7 @@ def render_edit_example():
                             args=[code_snippet],
                         )
 
-                    st.json(code_snippet.model_dump())
+                    render_snippet(code_snippet, key=f"edit_example_{code_snippet.id}")
             if not code:
                 st.info("No code snippets have been added yet")
 
@@ -454,15 +589,25 @@ def render_edit_example():
             on_click=add_code_snippet,
         )
 
+        tokens = example_tokens(st.session_state.edit_example)
+        if tokens > EXAMPLE_BUDGET:
+            st.warning(
+                f"This example costs {format_tokens(tokens)}, over the budget of "
+                f"{format_tokens(EXAMPLE_BUDGET)} per example.",
+                icon=":material/warning:",
+            )
+        else:
+            st.caption(f"This example costs {format_tokens(tokens)}")
+
         def submit_example():
             upsert_example(st.session_state.edit_example)
-            st.session_state.edit_example = None
-            st.session_state.edit_code_snippet = None
+            close_item("edit_example")
+            close_item("edit_code_snippet")
             clear_tmp_state(key="edit_example")
 
         def cancel_example():
-            st.session_state.edit_example = None
-            st.session_state.edit_code_snippet = None
+            close_item("edit_example")
+            close_item("edit_code_snippet")
             clear_tmp_state(key="edit_example")
 
         _, col1, col2 = st.columns([0.68, 0.15, 0.17])
@@ -484,7 +629,24 @@ def render_edit_example():
             )
 
 
+@timed()
+def render_examples_budget():
+    tokens = WorkflowTokens.of(st.session_state.edit_workflow)
+    st.caption(
+        f"The examples cost {format_tokens(tokens.total)} of the "
+        f"{format_tokens(WORKFLOW_BUDGET)} budget per workflow"
+    )
+    if tokens.over_budget:
+        st.warning(
+            "The examples of this workflow are over the token budget. The agent "
+            "gets less context for everything else; consider trimming them.",
+            icon=":material/warning:",
+        )
+
+
+@timed()
 def render_examples():
+    render_examples_budget()
     if "edit_example" in st.session_state and st.session_state.edit_example is not None:
         render_edit_example()
     else:
@@ -501,23 +663,156 @@ def render_examples():
 st.title("Edit workflow")
 
 
-def upsert_workflow():
-    workflows_file = st.session_state.workflows_file
-    with workflows_file.open("r") as f:
-        all_workflows = [Workflow.model_validate_json(line) for line in f]
+@timed()
+def upsert_workflow(overwrite: bool = False):
+    # Loaded on the first save rather than with the page.
+    from pages.duplicates import get_duplicate_index
+
+    store = get_store(st.session_state.workflows_file)
+    expected_version = None if overwrite else st.session_state.edit_workflow_version
+    try:
+        version = store.put(st.session_state.edit_workflow, expected_version)
+    except WorkflowConflict:
+        st.session_state.save_conflict = True
+        return
+
+    st.session_state.edit_workflow_version = version
+    st.session_state.save_conflict = False
+    st.session_state.changed_elsewhere = False
+    get_search_index(store).update(st.session_state.edit_workflow, version)
+    duplicate_index = get_duplicate_index(store)
+    duplicate_index.update(st.session_state.edit_workflow, version)
+    st.session_state.save_duplicates = duplicate_index.similar(
+        st.session_state.edit_workflow
+    )
+    # Share the saved workflow with the store again, unless it was already
+    # changed by someone else.
+    base, current = store.checkout_shared(st.session_state.edit_workflow.id)
+    if current == version:
+        start_editing(st.session_state, base, version)
+    finish_draft(saved=True)
+    begin_draft()
 
-    for i, workflow in enumerate(all_workflows):
-        if workflow.id == st.session_state.edit_workflow.id:
-            all_workflows[i] = st.session_state.edit_workflow
-            break
-    else:
-        all_workflows.append(st.session_state.edit_workflow)
+    st.toast("Workflow saved!", icon=":material/check:")
 
-    with workflows_file.open("w") as f:
-        for workflow in all_workflows:
-            f.write(workflow.model_dump_json() + "\n")
 
-    st.toast("Workflow saved!", icon=":material/check:")
+@timed()
+def reload_workflow():
+    store = get_store(st.session_state.workflows_file)
+    base, version = store.checkout_shared(st.session_state.edit_workflow.id)
+    finish_draft(saved=False)
+    start_editing(st.session_state, base, version)
+    st.session_state.reset_editor = True
+
+
+@timed()
+def render_save_conflict():
+    with st.container(border=True):
+        st.warning(
+            "This workflow was changed somewhere else (another tab or another editor) "
+            "since you opened it. Saving would overwrite those changes.",
+            icon=":material/warning:",
+        )
+
+        col1, col2, col3 = st.columns([0.4, 0.4, 0.2])
+
+        with col1:
+            st.button(
+                "Overwrite with my changes",
+                icon=":material/save:",
+                key="overwrite_workflow",
+                on_click=upsert_workflow,
+                kwargs={"overwrite": True},
+                use_container_width=True,
+            )
+
+        with col2:
+            st.button(
+                "Discard mine, load theirs",
+                icon=":material/refresh:",
+                key="reload_workflow",
+                on_click=reload_workflow,
+                use_container_width=True,
+            )
+
+        with col3:
+
+            def dismiss_conflict():
+                st.session_state.save_conflict = False
+
+            st.button(
+                "Cancel",
+                icon=":material/cancel:",
+                key="dismiss_conflict",
+                on_click=dismiss_conflict,
+                use_container_width=True,
+            )
+
+
+@st.fragment(run_every=NOTIFY_INTERVAL)
+def render_changed_elsewhere():
+    store = get_store(st.session_state.workflows_file)
+    workflow_id = st.session_state.edit_workflow.id
+    changed = changes(st.session_state, store, "editor")
+    if changed is None or workflow_id in changed:
+        current = store.versions().get(workflow_id, MISSING_VERSION)
+        st.session_state.changed_elsewhere = (
+            current != st.session_state.edit_workflow_version
+        )
+    # A failed save already says so.
+    if not st.session_state.get("changed_elsewhere"):
+        return
+    if st.session_state.get("save_conflict"):
+        return
+
+    with st.container(border=True):
+        st.warning(
+            "This workflow was changed or deleted somewhere else (another tab, "
+            "another editor or git) since you opened it. Saving will ask before "
+            "overwriting those changes.",
+            icon=":material/sync_problem:",
+        )
+        if st.button(
+            "Discard mine, load theirs",
+            icon=":material/refresh:",
+            key="reload_changed_workflow",
+        ):
+            reload_workflow()
+            st.rerun()
+
+
+@timed()
+def render_save_duplicates():
+    duplicates = st.session_state.save_duplicates
+    with st.container(border=True):
+        st.warning(
+            "Some examples or code snippets of this workflow nearly duplicate "
+            "others. Consider reusing or merging them.",
+            icon=":material/content_copy:",
+        )
+        for duplicate in duplicates[:MAX_SHOWN_DUPLICATES]:
+            where = (
+                "this workflow"
+                if duplicate.other_workflow_id == st.session_state.edit_workflow.id
+                else f"workflow {duplicate.other_workflow_id}"
+            )
+            st.caption(
+                f"{duplicate.kind.capitalize()} “{duplicate.title}” is "
+                f"{duplicate.similarity:.0%} similar to “{duplicate.other_title}” "
+                f"in {where}"
+            )
+        if len(duplicates) > MAX_SHOWN_DUPLICATES:
+            st.caption(f"… and {len(duplicates) - MAX_SHOWN_DUPLICATES} more")
+
+        def dismiss_duplicates():
+            st.session_state.save_duplicates = []
+
+        st.button(
+            "Dismiss",
+            icon=":material/close:",
+            key="dismiss_duplicates",
+            on_click=dismiss_duplicates,
+        )
 
 
 col1, col2, col3 = st.columns([0.07, 0.15, 0.78], vertical_alignment="center")
@@ -529,6 +824,8 @@ with col1:
         help="Discard unsaved changes and go back to the list",
         key="back_to_list",
     ):
+        finish_draft(saved=False)
+        st.session_state.edit_base = None
         st.session_state.edit_workflow = None
         st.session_state.edit_test = None
         st.session_state.edit_example = None
@@ -547,6 +844,14 @@ with col2:
 with col3:
     st.write(f"**Workflow ID**: {st.session_state.edit_workflow.id}")
 
+if "save_conflict" in st.session_state and st.session_state.save_conflict:
+    render_save_conflict()
+
+render_changed_elsewhere()
+
+if st.session_state.get("save_duplicates"):
+    render_save_duplicates()
+
 
 st.session_state.edit_workflow.name = get_text_input(
     "Name", value=st.session_state.edit_workflow.name, key="edit_workflow_name"
@@ -1,5 +1,4 @@
 import streamlit as st
-from pages.types import Workflow
 
 st.title("Welcome to the Workflow Editor 👋")
 
@@ -23,7 +22,12 @@ col1, col2 = st.columns([0.23, 0.77])
 
 with col1:
     if st.button("New workflow", icon=":material/add:", key="new_workflow"):
-        st.session_state.edit_workflow = Workflow()
+        # Only imported when needed, so that this page, usually the first one
+        # opened, doesn't wait for the models.
+        from pages.session import start_editing
+        from pages.store import MISSING_VERSION
+
+        start_editing(st.session_state, None, MISSING_VERSION)
         st.session_state.reset_editor = True
         st.switch_page("pages/edit_workflow.py")
 
@@ -0,0 +1,336 @@
+import os
+import re
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+from .blobs import snippet_digest
+from .serialization import dump_record, load_record
+from .sharded import is_sharded
+from .types import CodeSnippet, Example, Test, Workflow
+
+
+LANGUAGES = {
+    ".gel": "gel",
+    ".esdl": "gel",
+    ".edgeql": "edgeql",
+    ".py": "python",
+    ".pyi": "python",
+    ".ts": "typescript",
+    ".tsx": "tsx",
+    ".js": "javascript",
+    ".jsx": "jsx",
+    ".mjs": "javascript",
+    ".json": "json",
+    ".toml": "toml",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".sql": "sql",
+    ".sh": "bash",
+    ".md": "markdown",
+    ".html": "html",
+    ".css": "css",
+    ".rs": "rust",
+    ".go": "go",
+    ".java": "java",
+    ".rb": "ruby",
+    ".ex": "elixir",
+    ".exs": "elixir",
+}
+LANGUAGES_BY_NAME = {"Dockerfile": "dockerfile", "Makefile": "makefile"}
+
+# A line range at the end of a spec (`schema.gel:10-40`) or a url (`#L10-L40`).
+SPEC_RANGE_RE = re.compile(r":(\d+)(?:-(\d+))?$")
+URL_RANGE_RE = re.compile(r"#L(\d+)(?:-L(\d+))?$")
+
+
+class Source(NamedTuple):
+    """A file in a checkout, or some of its lines, that a snippet is a copy of"""
+
+    path: str
+    start: int | None = None
+    end: int | None = None
+
+    @classmethod
+    def from_url(cls, url: str | None) -> "Source | None":
+        if not url or "://" in url:
+            return None
+        match = URL_RANGE_RE.search(url)
+        if match is None:
+            return cls(url)
+        start, end = match.groups()
+        return cls(url[: match.start()], int(start), int(end or start))
+
+    @property
+    def url(self) -> str:
+        """The path relative to the checkout, with GitHub style line anchors."""
+        if self.start is None:
+            return self.path
+        if self.start == self.end:
+            return f"{self.path}#L{self.start}"
+        return f"{self.path}#L{self.start}-L{self.end}"
+
+    def extract(self, text: str) -> str:
+        if self.start is None:
+            return text
+        lines = text.splitlines(keepends=True)
+        return "".join(lines[self.start - 1 : self.end])
+
+
+def detect_language(path: str) -> str | None:
+    name = os.path.basename(path)
+    return LANGUAGES_BY_NAME.get(name) or LANGUAGES.get(os.path.splitext(name)[1])
+
+
+def _is_inside(root: Path, path: Path) -> bool:
+    # Also catches `..` and symlinks out of the checkout.
+    return path.resolve().is_relative_to(root.resolve())
+
+
+def expand_spec(root: Path, spec: str) -> list[Source]:
+    """The files matched by a glob, optionally followed by a `:start-end` range."""
+    start = end = None
+    match = SPEC_RANGE_RE.search(spec)
+    if match is not None:
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid line range in {spec}")
+        spec = spec[: match.start()]
+
+    paths = sorted(path for path in root.glob(spec) if path.is_file())
+    for path in paths:
+        if not _is_inside(root, path):
+            raise ValueError(f"{spec} matches {path}, which is outside {root}")
+    return [Source(path.relative_to(root).as_posix(), start, end) for path in paths]
+
+
+def cache_path(workflows_path: Path) -> Path:
+    workflows_path = Path(workflows_path)
+    if is_sharded(workflows_path):
+        return workflows_path / ".sources"
+    return workflows_path.with_name(f".{workflows_path.name}.sources")
+
+
+class SourceCache:
+    """What was read from every file by the last ingestions and refreshes.
+
+    For each file, it keeps its mtime and size, and the digest of the code of
+    every source (the whole file or some lines) taken from it. A refresh only
+    reads a file again if it changed since, or if some snippet taken from it
+    doesn't have that code yet, like one in a workflow that couldn't be saved.
+    The cache lives next to the workflows file and is only meaningful on the
+    machine that wrote it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: dict[str, list] = {}
+        if self.path.exists():
+            self._entries = load_record(self.path.read_bytes())
+
+    def digests(self, path: Path, stat: os.stat_result) -> dict[str, str]:
+        """The digests of the sources read from a file by url, if it didn't change."""
+        entry = self._entries.get(str(path))
+        # Caches written before digests were kept have only the mtime and size.
+        if entry is None or len(entry) < 3:
+            return {}
+        if entry[:2] != [stat.st_mtime_ns, stat.st_size]:
+            return {}
+        return entry[2]
+
+    def update(self, path: Path, stat: os.stat_result, digests: dict[str, str]):
+        known = self.digests(path, stat)
+        self._entries[str(path)] = [stat.st_mtime_ns, stat.st_size, known | digests]
+
+    def save(self):
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_bytes(dump_record(self._entries))
+        os.replace(tmp_path, self.path)
+
+
+_FRESH = object()
+
+
+def read_sources(
+    root: Path,
+    sources: Iterable[Source],
+    cache: SourceCache,
+    is_current: Callable[[str, dict[str, str]], bool] | None = None,
+    jobs: int | None = None,
+) -> dict[str, str | None]:
+    """Read the files of some sources in a checkout in a thread pool.
+
+    The digest of every source read is recorded in the cache. `is_current` is
+    given the path of each file and the digests recorded for it (if it didn't
+    change since), and the files for which it returns `True` are left out.
+    Files that can't be read, aren't text or are outside the checkout map to
+    `None`.
+    """
+    root = root.resolve()
+    by_path: dict[str, list[Source]] = {}
+    for source in sources:
+        by_path.setdefault(source.path, []).append(source)
+
+    def read(path: str) -> str | None:
+        full_path = root / path
+        # Urls come from the workflows, which anyone may have edited.
+        if not _is_inside(root, full_path):
+            return None
+        try:
+            if is_current is not None and is_current(
+                path, cache.digests(full_path, full_path.stat())
+            ):
+                return _FRESH
+            with full_path.open("rb") as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+        except OSError:
+            return None
+        if b"\0" in data:
+            return None
+        try:
+            text = data.decode()
+        except UnicodeDecodeError:
+            return None
+        cache.update(
+            full_path,
+            stat,
+            {
+                source.url: snippet_digest(source.extract(text))
+                for source in by_path[path]
+            },
+        )
+        return text
+
+    paths = list(by_path)
+    # Reading is mostly waiting on the disk, so threads are enough.
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        texts = pool.map(read, paths)
+        return {path: text for path, text in zip(paths, texts) if text is not _FRESH}
+
+
+class IngestResult(NamedTuple):
+    added: int = 0
+    updated: int = 0
+    # Snippets left alone because they were edited by hand since being read.
+    edited: int = 0
+
+    def __add__(self, other: "IngestResult") -> "IngestResult":
+        return IngestResult(*(a + b for a, b in zip(self, other)))
+
+
+def _snippets(parent: Test | Example) -> list[CodeSnippet]:
+    return parent.initial_state if isinstance(parent, Test) else parent.code
+
+
+def ingest(
+    parent: Test | Example,
+    sources: Iterable[Source],
+    texts: dict[str, str | None],
+    force: bool = False,
+) -> IngestResult:
+    """Add or update the snippets of a test or example from the files read.
+
+    Snippets are matched to their sources by url. A snippet whose code was
+    changed by hand after it was read is only overwritten with `force`.
+    """
+    by_url = {snippet.url: snippet for snippet in _snippets(parent)}
+    added = updated = edited = 0
+    for source in sources:
+        text = texts.get(source.path)
+        if text is None:
+            continue
+        code = source.extract(text)
+        digest = snippet_digest(code)
+        snippet = by_url.get(source.url)
+        if snippet is None:
+            snippet = CodeSnippet(
+                url=source.url,
+                code=code,
+                language=detect_language(source.path),
+                source_hash=digest,
+            )
+            parent.upsert_code_snippet(snippet)
+            by_url[source.url] = snippet
+            added += 1
+        elif snippet.source_hash == digest and snippet.code == code:
+            continue
+        elif (
+            not force
+            and snippet.source_hash is not None
+            and snippet_digest(snippet.code or "") != snippet.source_hash
+        ):
+            edited += 1
+        else:
+            snippet.code = code
+            snippet.language = snippet.language or detect_language(source.path)
+            snippet.source_hash = digest
+            updated += 1
+    return IngestResult(added, updated, edited)
+
+
+def _ingested(parent: Test | Example) -> list[tuple[Source, CodeSnippet]]:
+    return [
+        (source, snippet)
+        for snippet in _snippets(parent)
+        if snippet.source_hash is not None
+        and (source := Source.from_url(snippet.url)) is not None
+    ]
+
+
+def refresh(
+    workflows: Iterable[Workflow],
+    root: Path,
+    cache: SourceCache,
+    force: bool = False,
+    jobs: int | None = None,
+) -> tuple[list[Workflow], IngestResult]:
+    """Update the snippets that were ingested from files of a checkout.
+
+    A file is only read again if it changed since it was last read, or if a
+    snippet taken from it doesn't have the code read then. Returns the
+    workflows that changed, and what changed in them.
+    """
+    workflows = list(workflows)
+    ingested = {
+        workflow.id: [
+            (parent, _ingested(parent))
+            for parent in [*workflow.tests, *workflow.examples]
+        ]
+        for workflow in workflows
+    }
+    # The digest of its source that each snippet has, by file and url.
+    expected: dict[str, set[tuple[str, str]]] = {}
+    for parents in ingested.values():
+        for _, snippets in parents:
+            for source, snippet in snippets:
+                expected.setdefault(source.path, set()).add(
+                    (source.url, snippet.source_hash)
+                )
+
+    def is_current(path: str, digests: dict[str, str]) -> bool:
+        return all(digests.get(url) == digest for url, digest in expected[path])
+
+    sources = [
+        source
+        for parents in ingested.values()
+        for _, snippets in parents
+        for source, _ in snippets
+    ]
+    texts = read_sources(
+        root, sources, cache, is_current=None if force else is_current, jobs=jobs
+    )
+
+    changed = []
+    total = IngestResult()
+    for workflow in workflows:
+        result = IngestResult()
+        for parent, snippets in ingested[workflow.id]:
+            sources = [source for source, _ in snippets]
+            result += ingest(parent, sources, texts, force=force)
+        if result.updated:
+            changed.append(workflow)
+        total += result
+    return changed, total
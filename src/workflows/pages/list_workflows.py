@@ -1,5 +1,17 @@
 import streamlit as st
-from pages.types import Workflow
+from datetime import datetime
+from itertools import islice
+from pages.store import MISSING_VERSION, get_store
+from pages.search import SearchHit, search
+from pages.drafts import get_journal
+from pages.session import start_editing
+from pages.budget import format_tokens, get_token_index
+from pages.watcher import NOTIFY_INTERVAL, changes, watch
+
+
+PAGE_SIZES = [10, 25, 50, 100]
+SEARCH_LIMIT = 200
+MAX_SHOWN_ERRORS = 20
 
 
 st.title("List of all workflows")
@@ -14,24 +26,76 @@ st.markdown(
 
 st.divider()
 
+def show_invalid_workflows():
+    """Show where the store has invalid workflows, and stop the page."""
+    from pages.sharded import is_sharded
+    from pages.validate import validate_directory, validate_file
+
+    if is_sharded(st.session_state.workflows_file):
+        st.error(
+            "Some files of the workflows directory are not valid workflows. "
+            "Fix them and reload the page.",
+            icon=":material/error:",
+        )
+        errors = validate_directory(st.session_state.workflows_file)
+    else:
+        st.error(
+            "Some lines of `workflows.jsonl` are not valid workflows. "
+            "Fix them and reload the page.",
+            icon=":material/error:",
+        )
+        errors = validate_file(st.session_state.workflows_file, jobs=1)
+    st.code("\n".join(str(error) for error in islice(errors, MAX_SHOWN_ERRORS)))
+    st.stop()
+
+
+try:
+    store = get_store(st.session_state.workflows_file)
+    watch(st.session_state, store, "list")
+    summaries = store.summaries()
+    workflow_count = len(summaries)
+except (ValueError, KeyError, TypeError):
+    show_invalid_workflows()
+
 col1, col2, col3 = st.columns([0.23, 0.07, 0.7])
 
 with col1:
     if st.button("New workflow", key="new_workflow", icon=":material/add:"):
-        st.session_state.edit_workflow = Workflow()
+        start_editing(st.session_state, None, MISSING_VERSION)
         st.session_state.reset_editor = True
         st.switch_page("pages/edit_workflow.py")
 
 with col2:
-    st.download_button(
-        "",
-        key="export_workflows",
-        icon=":material/download:",
-        data=st.session_state.workflows_file.read_bytes(),
-        file_name="workflows.jsonl",
-        mime="application/jsonl",
-        help="Download workflows.jsonl",
-    )
+    # Exporting reads every workflow, so it is only done when asked for rather
+    # than on every rerun of the page.
+    if st.session_state.get("export_requested"):
+
+        def end_export():
+            st.session_state.export_requested = False
+
+        st.download_button(
+            "",
+            key="export_workflows",
+            icon=":material/download:",
+            data=store.export_bytes(),
+            file_name="workflows.jsonl",
+            mime="application/jsonl",
+            help="Download workflows.jsonl",
+            on_click=end_export,
+            type="primary",
+        )
+    else:
+
+        def request_export():
+            st.session_state.export_requested = True
+
+        st.button(
+            "",
+            key="request_export",
+            icon=":material/download:",
+            help="Export workflows.jsonl for download",
+            on_click=request_export,
+        )
 with col3:
 
     def show_workflows_path():
@@ -54,39 +118,169 @@ with col3:
 if "show_workflows_path" in st.session_state and st.session_state.show_workflows_path:
     st.code(st.session_state.workflows_file, language="bash")
 
+st.session_state.edit_base = None
 st.session_state.edit_workflow = None
 
-workflows = []
+drafts = get_journal(st.session_state.workflows_file).drafts()
+if drafts:
+    with st.expander(f"Unsaved drafts ({len(drafts)})", icon=":material/history:"):
+        for draft in drafts:
+            col1, col2, col3 = st.columns([0.86, 0.07, 0.07])
+            with col1:
+                st.write(f"{draft.workflow.name or 'Untitled'} ({draft.workflow.id})")
+                updated = datetime.fromtimestamp(draft.updated)
+                st.caption(f"Last edited {updated:%Y-%m-%d %H:%M}")
+            with col2:
+                if st.button("", icon=":material/edit:", key=f"resume_{draft.id}"):
+                    draft = draft.model_copy(deep=True)
+                    st.session_state.edit_base = None
+                    st.session_state.edit_workflow = draft.workflow
+                    st.session_state.edit_workflow_version = draft.version
+                    st.session_state.resume_draft = draft
+                    st.session_state.reset_editor = True
+                    st.switch_page("pages/edit_workflow.py")
+            with col3:
+                if st.button("", icon=":material/delete:", key=f"discard_{draft.id}"):
+                    get_journal(st.session_state.workflows_file).finish(
+                        draft.id, saved=False
+                    )
+                    st.rerun()
+
+query = st.text_input(
+    "Search",
+    key="workflows_search",
+    placeholder="Search workflow names, examples, test prompts and code",
+    label_visibility="collapsed",
+)
+
+matches: dict[str, list[SearchHit]] = {}
+if query:
+    # Summaries only need each line to be JSON; search parses whole workflows.
+    try:
+        hits = search(store, query, limit=SEARCH_LIMIT)
+    except ValueError:  # pydantic's ValidationError
+        show_invalid_workflows()
+    for hit in hits:
+        matches.setdefault(hit.workflow_id, []).append(hit)
+    summaries_by_id = {summary.id: summary for summary in summaries}
+    summaries = [
+        summaries_by_id[workflow_id]
+        for workflow_id in matches
+        if workflow_id in summaries_by_id
+    ]
+
+if "open_workflows" not in st.session_state:
+    st.session_state.open_workflows = set()
+
+
+def toggle_workflow(workflow_id: str):
+    st.session_state.open_workflows ^= {workflow_id}
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
 
-with open(st.session_state.workflows_file, "r") as f:
-    for line in f:
-        workflows.append(Workflow.model_validate_json(line))
+shown = []
+if summaries:
+    col1, col2, col3 = st.columns([0.6, 0.2, 0.2], vertical_alignment="bottom")
 
+    with col2:
+        page_size = st.selectbox("Per page", PAGE_SIZES, key="workflows_page_size")
 
-def save_all_workflows(workflows):
-    with open(st.session_state.workflows_file, "w") as f:
-        for workflow in workflows:
-            f.write(workflow.model_dump_json() + "\n")
+    page_count = -(-len(summaries) // page_size)
+    if st.session_state.get("workflows_page", 1) > page_count:
+        st.session_state.workflows_page = page_count
 
+    with col3:
+        page = st.number_input(
+            f"Page (of {page_count})",
+            min_value=1,
+            max_value=page_count,
+            key="workflows_page",
+        )
+
+    with col1:
+        st.caption(f"{len(summaries)} workflows")
+
+    shown = summaries[(page - 1) * page_size : page * page_size]
+    tokens = get_token_index(store).get(summary.id for summary in shown)
+
+    for summary in shown:
+        is_open = summary.id in st.session_state.open_workflows
 
-if workflows:
-    for i, workflow in enumerate(workflows):
         col1, col2, col3 = st.columns([0.86, 0.07, 0.07])
         with col1:
-            with st.expander(
-                f"{workflow.name or 'Untitled'} ({workflow.id})", icon=":material/code:"
-            ):
-                st.json(workflow.model_dump())
+            st.button(
+                f"{summary.name or 'Untitled'} ({summary.id})",
+                icon=":material/expand_less:" if is_open else ":material/expand_more:",
+                key=f"open_{summary.id}",
+                on_click=toggle_workflow,
+                args=[summary.id],
+                type="tertiary",
+            )
+            caption = (
+                f"{summary.tests} tests · {summary.examples} examples · "
+                f"{format_size(summary.size)}"
+            )
+            if summary.id in tokens:
+                workflow_tokens = tokens[summary.id]
+                caption += f" · {format_tokens(workflow_tokens.total)} of examples"
+                if workflow_tokens.over_budget:
+                    caption += " · :orange[:material/warning: over budget]"
+                elif workflow_tokens.examples_over_budget:
+                    caption += (
+                        f" · :orange[:material/warning: "
+                        f"{len(workflow_tokens.examples_over_budget)} examples "
+                        "over budget]"
+                    )
+            st.caption(caption)
+            if summary.id in matches:
+                st.caption(
+                    "Matches: "
+                    + ", ".join(
+                        f"{hit.kind} “{hit.title}”" for hit in matches[summary.id]
+                    )
+                )
+            if is_open:
+                # Only the opened rows pay for sending the whole workflow.
+                raw = store.get_raw(summary.id)
+                if raw is not None:
+                    st.json(raw.decode())
 
         with col2:
-            if st.button("", icon=":material/edit:", key=f"edit_{i}"):
-                st.session_state.edit_workflow = workflow
+            if st.button("", icon=":material/edit:", key=f"edit_{summary.id}"):
+                try:
+                    checkout = store.checkout_shared(summary.id)
+                except ValueError:  # pydantic's ValidationError
+                    show_invalid_workflows()
+                start_editing(st.session_state, *checkout)
                 st.session_state.reset_editor = True
                 st.switch_page("pages/edit_workflow.py")
         with col3:
-            if st.button("", icon=":material/delete:", key=f"delete_{i}"):
-                del workflows[i]
-                save_all_workflows(workflows)
+            if st.button("", icon=":material/delete:", key=f"delete_{summary.id}"):
+                store.delete(summary.id)
+                st.session_state.open_workflows.discard(summary.id)
                 st.rerun()
+elif query:
+    st.info("No workflows match the search.")
 else:
     st.info("No workflows have been added yet.")
+
+
+@st.fragment(run_every=NOTIFY_INTERVAL)
+def refresh_changed(shown_ids: set[str]):
+    # Changes to workflows on other pages of the list don't show, unless
+    # workflows were added or deleted. The rerun only parses the changed lines.
+    changed = changes(st.session_state, store, "list")
+    if changed is None or changed & shown_ids:
+        st.rerun()
+    if changed and len(store) != workflow_count:
+        st.rerun()
+
+
+refresh_changed({summary.id for summary in shown})
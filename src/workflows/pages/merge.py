@@ -0,0 +1,171 @@
+from pathlib import Path
+from typing import BinaryIO
+
+from .serialization import dump_canonical, load_record
+from .store import _parse_record_id
+
+CONFLICT_MARKER_SIZE = 7
+
+# Stands for a workflow, item or field that one side doesn't have.
+_MISSING = object()
+
+
+def read_records(path: Path) -> dict[str, bytes]:
+    """The live line of each workflow in a workflows.jsonl file, in file order.
+
+    Superseded lines and tombstones left by a store that wasn't compacted yet
+    are dropped.
+    """
+    records: dict[str, bytes] = {}
+    with Path(path).open("rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            workflow_id, deleted = _parse_record_id(line)
+            records.pop(workflow_id, None)
+            if not deleted:
+                records[workflow_id] = line if line.endswith(b"\n") else line + b"\n"
+    return records
+
+
+def _merge_order(base: list, ours: list, theirs: list) -> list:
+    # Follow the order of the side that changed it (ours if both did). What
+    # only the other side added goes after what it follows on that side.
+    if ours == base:
+        order, other = list(theirs), ours
+    else:
+        order, other = list(ours), theirs
+    present = set(order)
+    position = 0
+    for key in other:
+        if key in present:
+            position = order.index(key) + 1
+        else:
+            order.insert(position, key)
+            present.add(key)
+            position += 1
+    return order
+
+
+def _is_item_list(value) -> bool:
+    return isinstance(value, list) and all(
+        isinstance(item, dict) and "id" in item for item in value
+    )
+
+
+def merge_values(base, ours, theirs, prefer_ours: bool, conflicts: list, path: str):
+    """Merge two changed versions of a JSON value three-way.
+
+    Objects are merged field by field, and lists of tests, examples or code
+    snippets item by item, by id. Where both sides changed the same thing
+    differently, the path is added to `conflicts` and the value of the
+    preferred side is taken. `_MISSING` stands for a value that was deleted,
+    or never added.
+    """
+    if ours == theirs:
+        return ours
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        for key in _merge_order(list(base), list(ours), list(theirs)):
+            value = merge_values(
+                base.get(key, _MISSING),
+                ours.get(key, _MISSING),
+                theirs.get(key, _MISSING),
+                prefer_ours,
+                conflicts,
+                f"{path}.{key}",
+            )
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+
+    if _is_item_list(ours) and _is_item_list(theirs):
+        base = base if _is_item_list(base) else []
+        base_items = {item["id"]: item for item in base}
+        our_items = {item["id"]: item for item in ours}
+        their_items = {item["id"]: item for item in theirs}
+        order = _merge_order(list(base_items), list(our_items), list(their_items))
+        merged = []
+        for item_id in order:
+            value = merge_values(
+                base_items.get(item_id, _MISSING),
+                our_items.get(item_id, _MISSING),
+                their_items.get(item_id, _MISSING),
+                prefer_ours,
+                conflicts,
+                f"{path}[{item_id}]",
+            )
+            if value is not _MISSING:
+                merged.append(value)
+        return merged
+
+    conflicts.append(path)
+    return ours if prefer_ours else theirs
+
+
+def _dump(record) -> bytes:
+    return b"" if record is _MISSING else dump_canonical(record) + b"\n"
+
+
+def merge_files(
+    base: Path,
+    ours: Path,
+    theirs: Path,
+    out: BinaryIO,
+    marker_size: int = CONFLICT_MARKER_SIZE,
+) -> list[str]:
+    """Merge three versions of a workflows.jsonl file by workflow id.
+
+    Workflows changed on one side only are taken as they are, and the others
+    are merged with `merge_values`. Workflows that conflict are written
+    between git's conflict markers: the whole workflow with the changes of
+    both sides, ours first, then theirs. Returns the paths of the conflicts,
+    like `<workflow id>.tests[<test id>].test_prompt`.
+    """
+    base_lines = read_records(base)
+    our_lines = read_records(ours)
+    their_lines = read_records(theirs)
+
+    order = _merge_order(list(base_lines), list(our_lines), list(their_lines))
+    conflicts: list[str] = []
+    for workflow_id in order:
+        lines = [
+            records.get(workflow_id) for records in (base_lines, our_lines, their_lines)
+        ]
+        base_line, our_line, their_line = lines
+        if our_line == their_line or their_line == base_line:
+            out.write(our_line or b"")
+            continue
+        if our_line == base_line:
+            out.write(their_line or b"")
+            continue
+
+        base_record, our_record, their_record = (
+            _MISSING if line is None else load_record(line) for line in lines
+        )
+        found: list[str] = []
+        merged = merge_values(
+            base_record, our_record, their_record, True, found, workflow_id
+        )
+        if not found:
+            out.write(_dump(merged))
+            continue
+
+        # Merge again the other way, so that each side of the conflict has
+        # all the changes that don't conflict.
+        theirs_merged = merge_values(
+            base_record, our_record, their_record, False, [], workflow_id
+        )
+        out.write(b"<" * marker_size + b" ours\n")
+        out.write(_dump(merged))
+        out.write(b"=" * marker_size + b"\n")
+        out.write(_dump(theirs_merged))
+        out.write(b">" * marker_size + b" theirs\n")
+        conflicts.extend(found)
+    return conflicts
@@ -0,0 +1,93 @@
+import hashlib
+import os
+from typing import NamedTuple
+
+from .types import CodeSnippet
+
+
+# How much of a snippet is shown until it is expanded.
+PREVIEW_LINES = int(os.environ.get("WORKFLOWS_PREVIEW_LINES", 12))
+PREVIEW_CHARS = 2000
+PREVIEW_CACHE_SIZE = 4096
+
+
+class Preview(NamedTuple):
+    """The start of a code snippet, and how much of it there is"""
+
+    lines: int
+    size: int
+    head: str
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.head) < self.size
+
+
+_previews: dict[bytes, Preview] = {}
+
+
+def _preview(code: str) -> Preview:
+    lines = code.count("\n") + (not code.endswith("\n"))
+    end = -1
+    for _ in range(PREVIEW_LINES):
+        end = code.find("\n", end + 1)
+        if end == -1 or end == len(code) - 1:
+            end = len(code)
+            break
+    # A minified file may be a single long line.
+    end = min(end, PREVIEW_CHARS)
+    return Preview(lines, len(code), code[:end])
+
+
+def preview(code: str | None) -> Preview:
+    """The first lines of some code, cached by a hash of the code."""
+    if not code:
+        return Preview(0, 0, "")
+    key = hashlib.blake2b(code.encode(), digest_size=16).digest()
+    result = _previews.get(key)
+    if result is None:
+        result = _previews[key] = _preview(code)
+        if len(_previews) > PREVIEW_CACHE_SIZE:
+            _previews.pop(next(iter(_previews)), None)
+    return result
+
+
+def format_preview(snippet: CodeSnippet, result: Preview) -> str:
+    lines = "1 line" if result.lines == 1 else f"{result.lines} lines"
+    parts = [snippet.language or "plain text", lines]
+    if result.size >= 1024:
+        parts.append(f"{result.size / 1024:.1f} KB")
+    if snippet.url:
+        parts.append(snippet.url)
+    return " · ".join(parts)
+
+
+def render_snippet(snippet: CodeSnippet, key: str):
+    """Show a code snippet's first lines, and the rest only when asked to.
+
+    `key` tells apart the places where the same snippet is shown.
+    """
+    import streamlit as st
+
+    result = preview(snippet.code)
+    st.caption(format_preview(snippet, result))
+    if not result.truncated:
+        if result.head:
+            st.code(result.head, language=snippet.language)
+        return
+
+    if "expanded_snippets" not in st.session_state:
+        st.session_state.expanded_snippets = set()
+    is_expanded = key in st.session_state.expanded_snippets
+    st.code(snippet.code if is_expanded else result.head, language=snippet.language)
+
+    def toggle():
+        st.session_state.expanded_snippets ^= {key}
+
+    st.button(
+        "Show less" if is_expanded else f"Show all {result.lines} lines",
+        icon=":material/unfold_less:" if is_expanded else ":material/unfold_more:",
+        key=f"toggle_snippet_{key}",
+        on_click=toggle,
+        type="tertiary",
+    )
@@ -0,0 +1,172 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import cProfile
+
+
+# Profiling is switched on for the whole process before it starts, so that
+# when it is off `timed` can hand back the functions untouched.
+ENABLED = os.environ.get("WORKFLOWS_PROFILE", "") not in ("", "0")
+# Where to write a cProfile dump of every rerun, if anywhere.
+PROFILE_DIR = os.environ.get("WORKFLOWS_PROFILE_DIR") or None
+HISTORY_SIZE = 30
+
+# Streamlit runs each session's reruns in that session's own thread.
+_local = threading.local()
+
+
+class Rerun:
+    """Timings and counters collected during one run of a page"""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.total = 0.0
+        # name -> [calls, total seconds, seconds not spent in other timed calls]
+        self.timings: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+        self.profile_path: Path | None = None
+        self._children: list[float] = []
+
+    def _record(self, name: str, elapsed: float, own: float):
+        timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += elapsed
+        timing[2] += own
+
+
+def timed(name: str | None = None):
+    """Time every call of the decorated function during a profiled rerun."""
+
+    def decorator(function):
+        if not ENABLED:
+            return function
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            rerun = getattr(_local, "rerun", None)
+            if rerun is None:
+                return function(*args, **kwargs)
+            rerun._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = rerun._children.pop()
+                if rerun._children:
+                    rerun._children[-1] += elapsed
+                rerun._record(label, elapsed, elapsed - children)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    if not ENABLED:
+        return
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun.counters[name] = rerun.counters.get(name, 0) + n
+
+
+def _start_profiler() -> "cProfile.Profile | None":
+    if PROFILE_DIR is None:
+        return None
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Only one profiler can run at a time, and another session has it.
+        return None
+    return profiler
+
+
+def _dump_profile(profiler: "cProfile.Profile", page: str) -> Path:
+    directory = Path(PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = directory / f"{stamp}-{page.lower().replace(' ', '-')}.pstats"
+    profiler.dump_stats(path)
+    return path
+
+
+@contextmanager
+def rerun(page: str):
+    """Collect timings for everything run by the current thread inside the block."""
+    if not ENABLED:
+        yield None
+        return
+
+    current = _local.rerun = Rerun(page)
+    profiler = _start_profiler()
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.total = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            current.profile_path = _dump_profile(profiler, page)
+        _local.rerun = None
+        _local.last = current
+
+
+def render_panel(*sections):
+    """Show the breakdown of the last rerun in a collapsible sidebar panel.
+
+    Each of `sections` is called to add its own elements at the end of it.
+    """
+    last = getattr(_local, "last", None) if ENABLED else None
+    if last is None:
+        return
+
+    import streamlit as st
+
+    history = st.session_state.setdefault("profiling_history", [])
+    history.append({"page": last.page, "ms": last.total * 1000})
+    del history[:-HISTORY_SIZE]
+
+    timings = sorted(last.timings.items(), key=lambda item: -item[1][2])
+    # Time spent in the page itself, outside of any timed function.
+    untimed = last.total - sum(own for _, _, own in last.timings.values())
+    timings.append(("other", [1, untimed, untimed]))
+
+    with st.sidebar.expander("Timings", icon=":material/timer:"):
+        st.caption(f"{last.page}: {last.total * 1000:.1f} ms")
+        st.dataframe(
+            [
+                {
+                    "function": name,
+                    "calls": calls,
+                    "total ms": total * 1000,
+                    "own ms": own * 1000,
+                    "% of rerun": 100 * own / last.total if last.total else 0,
+                }
+                for name, (calls, total, own) in timings
+            ],
+            hide_index=True,
+            column_config={
+                "total ms": st.column_config.NumberColumn(format="%.2f"),
+                "own ms": st.column_config.NumberColumn(format="%.2f"),
+                "% of rerun": st.column_config.NumberColumn(format="%.0f%%"),
+            },
+        )
+        for name, value in sorted(last.counters.items()):
+            st.caption(f"{name}: {value}")
+        st.bar_chart(history, y="ms", height=120)
+        if last.profile_path is not None:
+            st.caption(f"Profile: `{last.profile_path}`")
+        for section in sections:
+            section()
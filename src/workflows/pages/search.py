@@ -0,0 +1,212 @@
+import heapq
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from .profiling import timed
+from .store import WorkflowStore
+from .text import tokenize
+from .types import Workflow
+
+
+class BM25Index:
+    """An inverted index over text documents with BM25 ranking.
+
+    Documents can be added and removed one at a time, so the index can be kept
+    up to date without rebuilding it.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict] = {}
+        self._terms: dict = {}
+        self._lengths: dict = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, key) -> bool:
+        return key in self._terms
+
+    def add(self, key, text: str):
+        if key in self._terms:
+            self.remove(key)
+
+        terms = Counter(tokenize(text))
+        self._terms[key] = terms
+        self._lengths[key] = terms.total()
+        self._total_length += self._lengths[key]
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[key] = frequency
+
+    def remove(self, key):
+        terms = self._terms.pop(key, None)
+        if terms is None:
+            return
+
+        self._total_length -= self._lengths.pop(key)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[key]
+            if not posting:
+                del self._postings[term]
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[object, float]]:
+        """Return up to `limit` (key, score) pairs, best match first."""
+        if not self._terms:
+            return []
+
+        count = len(self._terms)
+        average_length = self._total_length / count or 1
+        base = self.k1 * (1 - self.b)
+        scale = self.k1 * self.b / average_length
+        lengths = self._lengths
+        scores: dict = {}
+
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            weight = idf * (self.k1 + 1)
+            for key, frequency in posting.items():
+                score = weight * frequency / (frequency + base + scale * lengths[key])
+                scores[key] = scores.get(key, 0.0) + score
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+class SearchHit(BaseModel):
+    """A workflow, or a test or example inside it, that matched a search query"""
+
+    workflow_id: str
+    kind: str
+    item_id: str
+    title: str
+    score: float
+
+
+def _documents(workflow: Workflow):
+    yield "workflow", workflow.id, workflow.name or "Untitled", workflow.name
+
+    for example in workflow.examples:
+        text = " ".join(
+            filter(
+                None,
+                [
+                    example.name,
+                    example.description,
+                    example.instructions,
+                    *(code_snippet.code for code_snippet in example.code),
+                ],
+            )
+        )
+        yield "example", example.id, example.name or "Untitled example", text
+
+    for test in workflow.tests:
+        text = " ".join(
+            filter(
+                None,
+                [
+                    test.test_prompt,
+                    *(code_snippet.code for code_snippet in test.initial_state),
+                ],
+            )
+        )
+        title = (test.test_prompt or "Untitled test").splitlines()[0][:80]
+        yield "test", test.id, title, text
+
+
+class WorkflowIndex:
+    """Full-text search over the workflows in a store.
+
+    Each workflow, example and test is a separate document. The index follows
+    the store lazily: before every search, workflows whose line changed since
+    they were indexed are indexed again.
+    """
+
+    def __init__(self, store: WorkflowStore):
+        self.store = store
+        self._bm25 = BM25Index()
+        self._lock = threading.Lock()
+        self._versions: dict[str, int] = {}
+        self._keys: dict[str, list[tuple[str, str, str]]] = {}
+        self._titles: dict[tuple[str, str, str], str] = {}
+
+    @timed()
+    def update(self, workflow: Workflow, version: int | None = None):
+        with self._lock:
+            self._remove(workflow.id)
+            keys = []
+            for kind, item_id, title, text in _documents(workflow):
+                key = (workflow.id, kind, item_id)
+                self._bm25.add(key, text or "")
+                self._titles[key] = title
+                keys.append(key)
+            self._keys[workflow.id] = keys
+            if version is not None:
+                self._versions[workflow.id] = version
+
+    def remove(self, workflow_id: str):
+        with self._lock:
+            self._remove(workflow_id)
+            self._versions.pop(workflow_id, None)
+
+    def _remove(self, workflow_id: str):
+        for key in self._keys.pop(workflow_id, []):
+            self._bm25.remove(key)
+            del self._titles[key]
+
+    @timed()
+    def sync(self):
+        versions = self.store.versions()
+
+        for workflow_id in self._versions.keys() - versions.keys():
+            self.remove(workflow_id)
+
+        for workflow_id, version in versions.items():
+            if self._versions.get(workflow_id) == version:
+                continue
+            # Only read, so the instance shared with the store's cache will do.
+            workflow = self.store.checkout_shared(workflow_id)[0]
+            if workflow is None:
+                continue
+            self.update(workflow, version)
+
+    @timed()
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        self.sync()
+        with self._lock:
+            return [
+                SearchHit(
+                    workflow_id=workflow_id,
+                    kind=kind,
+                    item_id=item_id,
+                    title=self._titles[(workflow_id, kind, item_id)],
+                    score=score,
+                )
+                for (workflow_id, kind, item_id), score in self._bm25.search(
+                    query, limit
+                )
+            ]
+
+
+_indexes: dict[Path, WorkflowIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(store: WorkflowStore) -> WorkflowIndex:
+    """Return the process-wide search index for a store."""
+    with _indexes_lock:
+        if store.path not in _indexes:
+            _indexes[store.path] = WorkflowIndex(store)
+        return _indexes[store.path]
+
+
+def search(store: WorkflowStore, query: str, limit: int = 20) -> list[SearchHit]:
+    return get_search_index(store).search(query, limit)
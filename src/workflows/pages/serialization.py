@@ -0,0 +1,124 @@
+import json
+from collections.abc import Iterable
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+try:
+    import orjson
+except ImportError:  # optional, only makes plain JSON records faster
+    orjson = None
+
+from .profiling import timed
+
+# Like the store, this module only imports pydantic once workflows are
+# actually parsed or dumped, so reading plain records stays cheap.
+if TYPE_CHECKING:
+    from pydantic import TypeAdapter
+
+    from .types import Workflow
+
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+@timed()
+def load_record(data: bytes | str) -> dict:
+    """Parse a JSON record without validating it as a workflow."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_record(record: dict) -> bytes:
+    """A JSON record in the compact form used in workflows.jsonl."""
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+@cache
+def _workflows_adapter() -> "TypeAdapter[list[Workflow]]":
+    from pydantic import TypeAdapter
+
+    from .types import Workflow
+
+    return TypeAdapter(list[Workflow])
+
+
+@timed()
+def load_workflow(line: bytes | str) -> "Workflow":
+    from .types import Workflow
+
+    return Workflow.model_validate_json(line)
+
+
+@timed()
+def load_workflows(lines: Iterable[bytes]) -> list["Workflow"]:
+    """Validate many workflow lines with a single call into pydantic."""
+    lines = [line.rstrip() for line in lines if line.strip()]
+    if not lines:
+        return []
+    return _workflows_adapter().validate_json(b"[" + b",".join(lines) + b"]")
+
+
+@timed()
+def dump_workflow(workflow: "Workflow") -> bytes:
+    """A workflow as a line of compact JSON, without the trailing newline.
+
+    The bytes are the same as `model_dump_json()` would give, but come straight
+    from the serializer without a round trip through `str`. They are canonical
+    (see `dump_canonical`) unless some text has Windows line endings.
+    """
+    data = workflow.__pydantic_serializer__.to_json(workflow)
+    if b"\\r\\n" in data:
+        return dump_canonical(load_record(data))
+    return data
+
+
+def _normalize_newlines(value):
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n")
+    if isinstance(value, list):
+        return [_normalize_newlines(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize_newlines(item) for key, item in value.items()}
+    return value
+
+
+@timed()
+def dump_canonical(record: dict) -> bytes:
+    """A workflow record as a line in canonical form, without the newline.
+
+    Fields come in the order of the models (whatever the order of the record),
+    missing fields get their defaults (but snippets that weren't ingested have
+    no `source_hash`) and Windows line endings in the text are made Unix ones.
+    The same workflow always gives the same bytes, so tools that rewrite it
+    don't show up in diffs.
+    """
+    from .types import Workflow
+
+    return dump_workflow(Workflow.model_validate(_normalize_newlines(record)))
+
+
+def is_canonical(line: bytes) -> bool:
+    return line.rstrip(b"\r\n") == dump_canonical(load_record(line))
+
+
+@timed()
+def write_workflows(file: Path | BinaryIO, workflows: Iterable["Workflow"]) -> int:
+    """Write workflows as JSON lines and return the number of bytes written.
+
+    A path is opened with a large buffer so that each workflow doesn't cost a
+    write call; an open file is written as is.
+    """
+    if isinstance(file, (str, Path)):
+        with open(file, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            return write_workflows(f, workflows)
+
+    written = 0
+    for workflow in workflows:
+        data = dump_workflow(workflow) + b"\n"
+        file.write(data)
+        written += len(data)
+    return written
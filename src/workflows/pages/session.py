@@ -0,0 +1,98 @@
+import os
+import sys
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+from .drafts import SLOTS
+from .types import Workflow
+
+
+# How much memory a session may hold on top of what it shares with the store.
+# Only reported in the timings panel (see profiling.py), nothing is evicted.
+MEMORY_BUDGET = int(os.environ.get("WORKFLOWS_SESSION_BUDGET", 4 * 1024 * 1024))
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+def own(item: Model) -> Model:
+    """A copy of a workflow, test, example or snippet that is safe to edit.
+
+    Only the model and its lists are copied. The tests, examples and snippets
+    in the lists, and all the strings, stay shared with the original until
+    they are opened for editing and copied in turn, so a session holds the
+    parts it changed and little else.
+    """
+    fields = {
+        name: list(value) if isinstance(value, list) else value
+        for name, value in item.__dict__.items()
+    }
+    return type(item).model_construct(_fields_set=item.model_fields_set, **fields)
+
+
+def start_editing(state, base: Workflow | None, version: int):
+    """Point the editor of a session at a workflow shared with the store.
+
+    `base` is never changed; the session edits its own copy of it. Without a
+    base, the session starts a new workflow.
+    """
+    state.edit_base = base if base is not None else Workflow()
+    state.edit_workflow = own(state.edit_base)
+    state.edit_workflow_version = version
+
+
+def _walk(value, seen: set[int]):
+    # Every model, list and string reachable from a value that isn't in `seen`.
+    if value is None or id(value) in seen:
+        return
+    seen.add(id(value))
+    yield value
+    if isinstance(value, BaseModel):
+        yield value.__dict__
+        for field in value.__dict__.values():
+            yield from _walk(field, seen)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _walk(item, seen)
+
+
+def memory_usage(state) -> dict[str, int]:
+    """Bytes held by a session's editor, leaving out what it shares with the store.
+
+    Objects reachable from the base are shared, and anything reachable twice
+    is only counted the first time.
+    """
+    seen: set[int] = set()
+    for _ in _walk(state.get("edit_base"), seen):
+        pass
+
+    def size(*values) -> int:
+        return sum(sys.getsizeof(part) for v in values for part in _walk(v, seen))
+
+    return {
+        "workflow": size(state.get("edit_workflow")),
+        "open items": size(*(state.get(slot) for slot in SLOTS)),
+        "widgets": size(
+            *(value for key, value in state.items() if key.startswith("tmp_widget_"))
+        ),
+    }
+
+
+def render_memory():
+    """Show a session's memory against the budget, in the timings panel."""
+    import streamlit as st
+
+    usage = memory_usage(st.session_state)
+    total = sum(usage.values())
+    st.progress(
+        min(total / MEMORY_BUDGET, 1.0),
+        text=f"Session memory: {total / 1024:.1f} of {MEMORY_BUDGET / 1024:.0f} KB",
+    )
+    st.caption(
+        " · ".join(f"{kind}: {size / 1024:.1f} KB" for kind, size in usage.items())
+    )
+    if total > MEMORY_BUDGET:
+        st.warning(
+            "This session holds more than its memory budget.",
+            icon=":material/memory:",
+        )
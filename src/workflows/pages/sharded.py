@@ -0,0 +1,474 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .profiling import timed
+from .serialization import dump_record, load_record
+from .store import (
+    MISSING_VERSION,
+    WorkflowConflict,
+    WorkflowSummary,
+    _FileLock,
+    content_version,
+)
+
+if TYPE_CHECKING:
+    from .types import Workflow
+
+
+MANIFEST_FILE = "manifest.jsonl"
+# Marks a directory as a workflows directory. Unlike the manifest, it is
+# committed, so a fresh checkout of the directory is recognized too.
+MARKER_FILE = ".workflows"
+MARKER = "A workflows directory: one <id>.json file per workflow.\n"
+
+# What a store keeps in its directory besides the workflows: only the
+# workflow files are meant to be committed.
+GITIGNORE = f"""\
+# Local to each checkout, rebuilt from the workflow files.
+{MANIFEST_FILE}
+.lock
+.journal
+.journal.*
+.sources
+.*.tmp
+"""
+
+_SAFE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def is_sharded(path: Path) -> bool:
+    """Whether a path is a directory of workflows rather than a .jsonl file.
+
+    Only a directory that a store wrote to is, which has its marker (or at
+    least a manifest, in directories written before there was a marker). Any
+    other directory, like a checkout or a packed export, is not a store.
+    """
+    path = Path(path)
+    return (path / MARKER_FILE).is_file() or (path / MANIFEST_FILE).is_file()
+
+
+def _shard_name(workflow_id: str) -> str:
+    if _SAFE_ID_RE.match(workflow_id):
+        return f"{workflow_id}.json"
+    return f"{hashlib.sha1(workflow_id.encode()).hexdigest()}.json"
+
+
+def _workflow_record(data: bytes) -> dict | None:
+    """The record in a workflow file, or `None` for other JSON files.
+
+    Raises `ValueError` if the file isn't JSON at all, like a workflow file
+    left broken by a merge.
+    """
+    record = load_record(data)
+    if isinstance(record, dict) and isinstance(record.get("id"), str):
+        return record
+    return None
+
+
+def _compact(data: bytes) -> bytes:
+    # The same bytes dump_workflow() would produce for the workflow.
+    return dump_record(load_record(data)) + b"\n"
+
+
+def _pretty(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, indent=2).encode() + b"\n"
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ShardedWorkflowStore:
+    """Workflows stored one per file in a directory, with a manifest.
+
+    Each workflow lives in its own indented `<id>.json`, so an edit touches
+    only that file and produces a small diff. `manifest.jsonl` keeps the
+    order of the workflows and, for each one, its file, name, test and example
+    counts, mtime, size and content hash, which is enough to list the
+    workflows without opening their files.
+
+    The manifest is local to the checkout and ignored by git, so it can't
+    conflict. Every read checks the mtime and size of the files, and files
+    changed, added or removed by anything else (an editor, a merge, a `git
+    pull`) are read into it again. A fresh checkout lists the workflows in
+    the order of their file names. Other JSON files in the directory are left
+    out.
+
+    Reading a directory doesn't write anything to it but the manifest, and
+    only once it has its `.gitignore`: the marker, `.gitignore` and lock are
+    created by the first write.
+
+    It has the same interface as `WorkflowStore`.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._manifest_path = self.path / MANIFEST_FILE
+        self._locked = _FileLock(self.path / ".lock", create_for_reads=False)
+        self._lock = self._locked.thread_lock
+        self._entries: dict[str, dict] = {}
+        # Other JSON files, so that they are only read again when they change.
+        self._skipped: dict[str, tuple[int, int]] = {}
+        self._parsed: dict[str, tuple[int, "Workflow"]] = {}
+        self._stat = None
+        with self._locked():
+            self._load_manifest()
+
+    @timed()
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        """The mtime and size of every workflow file, by name."""
+        shards = {}
+        if not self.path.is_dir():
+            return shards
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    shards[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return shards
+
+    def _stat_key(self, shards: dict[str, tuple[int, int]] | None = None):
+        return tuple(sorted((shards if shards is not None else self._scan()).items()))
+
+    @timed()
+    def _load_manifest(self, shards: dict[str, tuple[int, int]] | None = None):
+        entries = {}
+        if self._manifest_path.exists():
+            try:
+                with self._manifest_path.open("rb") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries[entry["id"]] = entry
+            except (ValueError, KeyError, TypeError):
+                # Only a cache of the files, so it is rebuilt from them.
+                entries = {}
+        self._entries = entries
+        self._check_shards(shards if shards is not None else self._scan())
+
+    def _check_shards(self, shards: dict[str, tuple[int, int]]):
+        # Files edited, added or removed by anything but a store (by hand, a
+        # merge, a checkout) aren't in the manifest, so catch up with them.
+        changed = False
+        names = set()
+        for workflow_id, entry in list(self._entries.items()):
+            names.add(entry["file"])
+            stat = shards.get(entry["file"])
+            if stat is None:
+                del self._entries[workflow_id]
+                changed = True
+            elif stat != (entry.get("mtime"), entry["size"]):
+                data = (self.path / entry["file"]).read_bytes()
+                updated = self._entry(data, entry["file"], stat)
+                if updated is None:
+                    del self._entries[workflow_id]
+                    self._skipped[entry["file"]] = stat
+                else:
+                    self._entries[workflow_id] = updated
+                changed = True
+        for name in sorted(shards.keys() - names):
+            if self._skipped.get(name) == shards[name]:
+                continue
+            data = (self.path / name).read_bytes()
+            entry = self._entry(data, name, shards[name])
+            if entry is None:
+                self._skipped[name] = shards[name]
+                continue
+            self._entries[entry["id"]] = entry
+            changed = True
+        if changed and (self.path / ".gitignore").exists():
+            with self._locked(exclusive=True):
+                self._write_manifest()
+        self._stat = self._stat_key(shards)
+
+    def _entry(self, data: bytes, name: str, stat: tuple[int, int]) -> dict | None:
+        record = _workflow_record(data)
+        if record is None:
+            return None
+        return {
+            "id": record["id"],
+            "file": name,
+            "name": record.get("name"),
+            "tests": len(record.get("tests") or []),
+            "examples": len(record.get("examples") or []),
+            "mtime": stat[0],
+            "size": len(data),
+            "hash": f"{content_version(data):016x}",
+        }
+
+    def _set_up(self):
+        # Before the first write, make the directory a store (see is_sharded).
+        self.path.mkdir(parents=True, exist_ok=True)
+        for name, text in ((MARKER_FILE, MARKER), (".gitignore", GITIGNORE)):
+            if not (self.path / name).exists():
+                (self.path / name).write_text(text)
+
+    def _write_manifest(self):
+        _write_atomic(
+            self._manifest_path,
+            b"".join(
+                json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+                for entry in self._entries.values()
+            ),
+        )
+        self._stat = self._stat_key()
+
+    def _refresh(self):
+        shards = self._scan()
+        if self._stat_key(shards) != self._stat:
+            self._load_manifest(shards)
+
+    def _read_shard(self, workflow_id: str) -> bytes:
+        return (self.path / self._entries[workflow_id]["file"]).read_bytes()
+
+    def __len__(self) -> int:
+        with self._locked():
+            self._refresh()
+            return len(self._entries)
+
+    def __contains__(self, workflow_id: str) -> bool:
+        with self._locked():
+            self._refresh()
+            return workflow_id in self._entries
+
+    def ids(self) -> list[str]:
+        with self._locked():
+            self._refresh()
+            return list(self._entries)
+
+    def versions(self) -> dict[str, int]:
+        with self._locked():
+            self._refresh()
+            return {
+                workflow_id: int(entry["hash"], 16)
+                for workflow_id, entry in self._entries.items()
+            }
+
+    def get_raw(self, workflow_id: str) -> bytes | None:
+        return self.checkout_raw(workflow_id)[0]
+
+    def checkout_raw(self, workflow_id: str) -> tuple[bytes | None, int]:
+        with self._locked():
+            self._refresh()
+            if workflow_id not in self._entries:
+                return None, MISSING_VERSION
+            version = int(self._entries[workflow_id]["hash"], 16)
+            return _compact(self._read_shard(workflow_id)), version
+
+    def iter_raw(self):
+        with self._locked():
+            self._refresh()
+            for workflow_id in list(self._entries):
+                yield workflow_id, _compact(self._read_shard(workflow_id))
+
+    @timed()
+    def get(self, workflow_id: str) -> "Workflow | None":
+        return self.checkout(workflow_id)[0]
+
+    @timed()
+    def checkout(self, workflow_id: str) -> tuple["Workflow | None", int]:
+        from .serialization import load_workflow
+
+        with self._locked():
+            self._refresh()
+            if workflow_id not in self._entries:
+                return None, MISSING_VERSION
+            version = int(self._entries[workflow_id]["hash"], 16)
+            workflow = load_workflow(self._read_shard(workflow_id))
+            return workflow, version
+
+    @timed()
+    def checkout_shared(self, workflow_id: str) -> tuple["Workflow | None", int]:
+        from .serialization import load_workflow
+
+        with self._locked():
+            self._refresh()
+            if workflow_id not in self._entries:
+                return None, MISSING_VERSION
+            version = int(self._entries[workflow_id]["hash"], 16)
+            cached = self._parsed.get(workflow_id)
+            if cached is None or cached[0] != version:
+                workflow = load_workflow(self._read_shard(workflow_id))
+                cached = self._parsed[workflow_id] = (version, workflow)
+            return cached[1], version
+
+    def forget(self, workflow_ids):
+        """Drop cached versions of workflows that are no longer current."""
+        with self._locked():
+            self._refresh()
+            for workflow_id in workflow_ids:
+                entry = self._entries.get(workflow_id)
+                current = int(entry["hash"], 16) if entry else MISSING_VERSION
+                cached = self._parsed.get(workflow_id)
+                if cached is not None and cached[0] != current:
+                    del self._parsed[workflow_id]
+
+    @timed()
+    def all(self) -> list["Workflow"]:
+        """All workflows in manifest order, shared and read-only (see WorkflowStore)."""
+        from .serialization import load_workflow
+
+        with self._locked():
+            self._refresh()
+            workflows = []
+            for workflow_id, entry in self._entries.items():
+                version = int(entry["hash"], 16)
+                cached = self._parsed.get(workflow_id)
+                if cached is None or cached[0] != version:
+                    raw = self._read_shard(workflow_id)
+                    workflow = load_workflow(raw)
+                    cached = self._parsed[workflow_id] = (version, workflow)
+                workflows.append(cached[1])
+            for workflow_id in self._parsed.keys() - self._entries.keys():
+                del self._parsed[workflow_id]
+            return workflows
+
+    @timed()
+    def summaries(self) -> list[WorkflowSummary]:
+        with self._locked():
+            self._refresh()
+            return [
+                WorkflowSummary(
+                    id=entry["id"],
+                    name=entry["name"],
+                    tests=entry["tests"],
+                    examples=entry["examples"],
+                    size=entry["size"],
+                )
+                for entry in self._entries.values()
+            ]
+
+    @timed()
+    def export_bytes(self) -> bytes:
+        return b"".join(raw for _, raw in self.iter_raw())
+
+    def _write_shard(self, record: dict) -> dict:
+        entry = self._entries.get(record["id"])
+        name = entry["file"] if entry else _shard_name(record["id"])
+        data = _pretty(record)
+        if entry is not None and entry["hash"] == f"{content_version(data):016x}":
+            # Unchanged, so the file is left alone.
+            return entry
+        _write_atomic(self.path / name, data)
+        stat = (self.path / name).stat()
+        self._entries[record["id"]] = self._entry(
+            data, name, (stat.st_mtime_ns, stat.st_size)
+        )
+        return self._entries[record["id"]]
+
+    @timed()
+    def put(self, workflow: "Workflow", expected_version: int | None = None) -> int:
+        """Save a workflow and return its new version, see `WorkflowStore.put`."""
+        from .serialization import dump_workflow
+
+        record = load_record(dump_workflow(workflow))
+        self._set_up()
+        with self._locked(exclusive=True):
+            self._refresh()
+            if expected_version is not None:
+                entry = self._entries.get(workflow.id)
+                current = int(entry["hash"], 16) if entry else MISSING_VERSION
+                if current != expected_version:
+                    raise WorkflowConflict(workflow.id, current)
+
+            entry = self._entries.get(workflow.id)
+            if self._write_shard(record) is not entry:
+                entry = self._entries[workflow.id]
+                self._write_manifest()
+            return int(entry["hash"], 16)
+
+    @timed()
+    def put_raw_many(self, lines):
+        """Save workflows given as JSON lines, writing the manifest once."""
+        self._set_up()
+        with self._locked(exclusive=True):
+            self._refresh()
+            for line in lines:
+                self._write_shard(load_record(line))
+            self._write_manifest()
+
+    @timed()
+    def delete(self, workflow_id: str) -> bool:
+        self._set_up()
+        with self._locked(exclusive=True):
+            self._refresh()
+            entry = self._entries.pop(workflow_id, None)
+            if entry is None:
+                return False
+            (self.path / entry["file"]).unlink(missing_ok=True)
+            self._write_manifest()
+            return True
+
+    @timed()
+    def normalize(self) -> int:
+        """Rewrite the workflows that aren't in canonical form.
+
+        See `WorkflowStore.normalize`.
+        """
+        from .serialization import dump_canonical
+
+        self._set_up()
+        with self._locked(exclusive=True):
+            self._refresh()
+            before = dict(self._entries)
+            for workflow_id in list(self._entries):
+                record = load_record(self._read_shard(workflow_id))
+                self._write_shard(load_record(dump_canonical(record)))
+            changed = sum(
+                entry is not before[workflow_id]
+                for workflow_id, entry in self._entries.items()
+            )
+            if changed:
+                self._write_manifest()
+            return changed
+
+    def compact(self):
+        """Nothing to compact: every save rewrites just its own file."""
+
+
+def convert(source: Path, destination: Path):
+    """Copy all workflows between a workflows.jsonl file and a sharded directory.
+
+    The source is a directory if it is one, and the destination unless its
+    name ends in `.jsonl`, so this converts in either direction. A destination
+    directory must be new, empty or a workflows directory already.
+    """
+    from .store import WorkflowStore
+
+    source, destination = Path(source), Path(destination)
+    if not source.exists():
+        raise FileNotFoundError(f"{source} doesn't exist")
+    if source.is_dir() and not is_sharded(source):
+        raise FileNotFoundError(
+            f"{source} is a directory, but not a workflows directory"
+        )
+    to_directory = destination.suffix != ".jsonl"
+    if (
+        to_directory
+        and destination.is_dir()
+        and not is_sharded(destination)
+        and any(destination.iterdir())
+    ):
+        raise FileExistsError(
+            f"{destination} is a directory, but not a workflows directory"
+        )
+
+    source_store = (
+        ShardedWorkflowStore(source) if is_sharded(source) else WorkflowStore(source)
+    )
+    if to_directory:
+        destination_store = ShardedWorkflowStore(destination)
+        destination_store.put_raw_many(raw for _, raw in source_store.iter_raw())
+    else:
+        with destination.open("wb") as f:
+            for _, raw in source_store.iter_raw():
+                f.write(raw)
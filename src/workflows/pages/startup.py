@@ -0,0 +1,90 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+# Loading the workflows before the first page view can be switched off, for
+# instance to measure a cold page view.
+PREWARM = os.environ.get("WORKFLOWS_PREWARM", "1") not in ("", "0")
+
+# The modules the pages need, most needed first: the list page is usually
+# opened before the editor.
+PAGE_MODULES = [
+    "types",
+    "store",
+    "budget",
+    "search",
+    "drafts",
+    "session",
+    "watcher",
+    "validate",
+    "duplicates",
+]
+
+
+def workflows_path() -> Path:
+    """The workflows file or directory the editor works on."""
+    return Path(os.environ.get("WORKFLOWS_PATH", "workflows.jsonl")).resolve()
+
+
+def report_timing(step: str, seconds: float):
+    print(f"startup: {step:<32} {seconds * 1000:8.1f} ms", file=sys.stderr)
+
+
+def _step(report: Callable[[str, float], None] | None, step: str, function):
+    start = time.perf_counter()
+    result = function()
+    if report is not None:
+        report(step, time.perf_counter() - start)
+    return result
+
+
+def prewarm(path: Path, report: Callable[[str, float], None] | None = None):
+    """Import what the pages need, then load and index the workflows.
+
+    Everything ends up in the process-wide caches and indexes that sessions
+    share, so the first page view after a restart finds them ready. `report`
+    is called with the name and duration of each step.
+    """
+    start = time.perf_counter()
+    for name in PAGE_MODULES:
+        _step(
+            report,
+            f"import pages.{name}",
+            lambda: importlib.import_module(f"{__package__}.{name}"),
+        )
+
+    from .budget import get_token_index
+    from .duplicates import get_duplicate_index
+    from .search import get_search_index
+    from .store import get_store
+    from .watcher import get_watcher
+
+    store = _step(report, "open store", lambda: get_store(path))
+    _step(report, "read summaries", store.summaries)
+    _step(report, "parse workflows", store.all)
+    _step(report, "estimate tokens", get_token_index(store).get)
+    _step(report, "build search index", get_search_index(store).sync)
+    _step(report, "start watcher", lambda: get_watcher(store))
+    # Only needed on the first save, and the slowest, so it goes last.
+    _step(report, "build duplicate index", get_duplicate_index(store).sync)
+    if report is not None:
+        report("prewarm", time.perf_counter() - start)
+
+
+def start_prewarm(path: Path, report: Callable[[str, float], None] | None = None):
+    """Run `prewarm` in a background thread, unless it is switched off."""
+    if not PREWARM:
+        return
+
+    def run():
+        try:
+            prewarm(path, report)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # The pages show what is wrong with the file when they get to it.
+            print(f"Couldn't load {path} ahead of time: {e}", file=sys.stderr)
+
+    threading.Thread(target=run, name="prewarm", daemon=True).start()
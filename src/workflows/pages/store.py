@@ -0,0 +1,548 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .profiling import count, timed
+from .serialization import load_record
+
+# pydantic is only imported once workflows are actually parsed, which keeps the
+# store cheap to import for the command line.
+if TYPE_CHECKING:
+    from .types import Workflow
+
+
+TOMBSTONE_KEY = "_deleted"
+COMPACT_DELAY = 2.0
+
+# The version to expect when saving a workflow that must not exist yet.
+MISSING_VERSION = 0
+
+_ID_RE = re.compile(rb'^\{"id":\s*"([^"\\]*)"')
+_TOMBSTONE_SUFFIX = f',"{TOMBSTONE_KEY}":true}}'.encode()
+
+
+def _parse_record_id(line: bytes) -> tuple[str, bool]:
+    """Return the id of a record line and whether it is a tombstone."""
+    stripped = line.rstrip()
+    match = _ID_RE.match(stripped)
+    if match is not None:
+        return match.group(1).decode(), stripped.endswith(_TOMBSTONE_SUFFIX)
+
+    record = load_record(stripped)
+    return record["id"], bool(record.get(TOMBSTONE_KEY))
+
+
+def content_version(line: bytes) -> int:
+    digest = hashlib.blake2b(line.rstrip(b"\r\n"), digest_size=8).digest()
+    return int.from_bytes(digest) or 1
+
+
+def is_tombstone(line: bytes) -> bool:
+    try:
+        return _parse_record_id(line)[1]
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
+def _tombstone(workflow_id: str) -> bytes:
+    return json.dumps(
+        {"id": workflow_id, TOMBSTONE_KEY: True}, separators=(",", ":")
+    ).encode() + b"\n"
+
+
+class WorkflowSummary(NamedTuple):
+    """What the list of workflows shows about a workflow without loading it"""
+
+    id: str
+    name: str | None
+    tests: int
+    examples: int
+    size: int
+
+    @classmethod
+    def from_json(cls, raw: bytes) -> "WorkflowSummary":
+        record = load_record(raw)
+        return cls(
+            id=record["id"],
+            name=record.get("name"),
+            tests=len(record.get("tests") or []),
+            examples=len(record.get("examples") or []),
+            size=len(raw),
+        )
+
+
+class _FileLock:
+    """A reentrant advisory lock on a file, shared for reads, exclusive for writes
+
+    Without `create_for_reads`, the lock file is only created by the first
+    write, and reads before that aren't locked: until something was written,
+    there is nothing for them to be kept from reading half-way.
+    """
+
+    def __init__(self, path: Path, create_for_reads: bool = True):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self._create_for_reads = create_for_reads
+        self._file = None
+        self._depth = 0
+
+    @contextmanager
+    def __call__(self, exclusive: bool = False):
+        with self.thread_lock:
+            if fcntl is not None:
+                if self._file is None and (
+                    exclusive or self._create_for_reads or self.path.exists()
+                ):
+                    self._file = self.path.open("a+b")
+                if self._file is not None and (self._depth == 0 or exclusive):
+                    mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                    fcntl.flock(self._file.fileno(), mode)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._file is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+
+class WorkflowConflict(Exception):
+    """The workflow was changed by someone else since it was read"""
+
+    def __init__(self, workflow_id: str, version: int):
+        super().__init__(f"Workflow {workflow_id} was changed since it was read")
+        self.workflow_id = workflow_id
+        self.version = version
+
+
+class WorkflowStore:
+    """An append-only workflows.jsonl with an in-memory index of byte ranges by id.
+
+    Saves and deletes append a single line (a new version of the workflow or a
+    tombstone). Superseded lines are dropped by a compaction that runs in the
+    background shortly after the last write, and replaces the file with a
+    rename. Where a line is being appended is noted in a file next to it until
+    the line is written, so a line torn by a crash in the middle of a write is
+    recognized, ignored and cut off by the next write. Any other line that
+    isn't valid, such as an unfinished line added by hand, is an error.
+
+    Parsed workflows are cached by the hash of their line, so when the file
+    changes (a save, or an edit from outside) only the changed lines are parsed
+    again. The same hash is the version that saves can be checked against.
+
+    Other processes working on the same file are kept out with an advisory
+    lock next to it: shared for reads, exclusive for writes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._locked = _FileLock(self.path.with_name(f".{self.path.name}.lock"))
+        self._pending_path = self.path.with_name(f".{self.path.name}.pending")
+        self._lock = self._locked.thread_lock
+        self._index: dict[str, tuple[int, int, int]] = {}
+        self._parsed: dict[str, tuple[int, "Workflow"]] = {}
+        self._summaries: dict[str, tuple[int, WorkflowSummary]] = {}
+        self._garbage = 0
+        self._size = 0
+        self._stat = None
+        self._compact_timer: threading.Timer | None = None
+        with self._locked():
+            self._load_index()
+
+    def _stat_key(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    @timed()
+    def _load_index(self):
+        index: dict[str, tuple[int, int, int]] = {}
+        garbage = 0
+        offset = 0
+
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                for line in f:
+                    length = len(line)
+                    if not line.endswith(b"\n") and not self._is_complete(line):
+                        if not self._is_torn(offset, length):
+                            raise ValueError(
+                                f"The last line of {self.path} is incomplete, "
+                                "and wasn't left by an interrupted save"
+                            )
+                        # Torn by a crash while appending: _append cuts it off.
+                        break
+                    if line.strip():
+                        workflow_id, deleted = _parse_record_id(line)
+                        if workflow_id in index:
+                            garbage += 1
+                        if deleted:
+                            index.pop(workflow_id, None)
+                            garbage += 1
+                        else:
+                            version = content_version(line)
+                            index[workflow_id] = (offset, length, version)
+                    offset += length
+
+        self._index = index
+        self._garbage = garbage
+        self._size = offset
+        self._stat = self._stat_key()
+
+        if garbage:
+            self._schedule_compaction()
+
+    def _is_complete(self, line: bytes) -> bool:
+        try:
+            load_record(line)
+        except ValueError:
+            return False
+        return True
+
+    def _is_torn(self, offset: int, length: int) -> bool:
+        # Whether a save was appending a longer line there when it stopped.
+        try:
+            start, expected = map(int, self._pending_path.read_bytes().split())
+        except (FileNotFoundError, ValueError):
+            return False
+        return start == offset and length < expected
+
+    def _refresh(self):
+        # The file may have been changed behind our back (git checkout, another
+        # process, a manual edit), in which case the offsets are stale.
+        if self._stat_key() != self._stat:
+            self._load_index()
+
+    def _append(self, data: bytes) -> int:
+        with self.path.open("ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset > self._size:
+                f.truncate(self._size)
+                offset = self._size
+            if offset and self._needs_newline(offset):
+                f.write(b"\n")
+                offset += 1
+            self._pending_path.write_bytes(f"{offset} {len(data)}".encode())
+            f.write(data)
+            f.flush()
+            self._pending_path.unlink()
+            self._size = offset + len(data)
+        self._stat = self._stat_key()
+        return offset
+
+    def _needs_newline(self, size: int) -> bool:
+        with self.path.open("rb") as f:
+            f.seek(size - 1)
+            return f.read(1) != b"\n"
+
+    def _read(self, f, offset: int, length: int) -> bytes:
+        f.seek(offset)
+        data = f.read(length)
+        return data if data.endswith(b"\n") else data + b"\n"
+
+    def __len__(self) -> int:
+        with self._locked():
+            self._refresh()
+            return len(self._index)
+
+    def __contains__(self, workflow_id: str) -> bool:
+        with self._locked():
+            self._refresh()
+            return workflow_id in self._index
+
+    def ids(self) -> list[str]:
+        with self._locked():
+            self._refresh()
+            return list(self._index)
+
+    def versions(self) -> dict[str, int]:
+        """A hash of the current line of every workflow, by id."""
+        with self._locked():
+            self._refresh()
+            return {
+                workflow_id: digest
+                for workflow_id, (_, _, digest) in self._index.items()
+            }
+
+    def get_raw(self, workflow_id: str) -> bytes | None:
+        return self.checkout_raw(workflow_id)[0]
+
+    def checkout_raw(self, workflow_id: str) -> tuple[bytes | None, int]:
+        """The line of a workflow and its version, to check against when saving."""
+        with self._locked():
+            self._refresh()
+            if workflow_id not in self._index:
+                return None, MISSING_VERSION
+            offset, length, version = self._index[workflow_id]
+            with self.path.open("rb") as f:
+                return self._read(f, offset, length), version
+
+    def iter_raw(self):
+        """Yield (id, line) for every live workflow, in file order."""
+        with self._locked():
+            self._refresh()
+            index = list(self._index.items())
+            if not index:
+                return
+            with self.path.open("rb") as f:
+                for workflow_id, (offset, length, _) in index:
+                    yield workflow_id, self._read(f, offset, length)
+
+    @timed()
+    def get(self, workflow_id: str) -> "Workflow | None":
+        """A private copy of the workflow that is safe to edit."""
+        from .serialization import load_workflow
+
+        # Parsing the line again is cheaper than deep-copying a cached model.
+        raw = self.get_raw(workflow_id)
+        return load_workflow(raw) if raw is not None else None
+
+    @timed()
+    def checkout(self, workflow_id: str) -> tuple["Workflow | None", int]:
+        """Like `get`, but also return the version to check against when saving."""
+        from .serialization import load_workflow
+
+        raw, version = self.checkout_raw(workflow_id)
+        workflow = load_workflow(raw) if raw is not None else None
+        return workflow, version
+
+    @timed()
+    def checkout_shared(self, workflow_id: str) -> tuple["Workflow | None", int]:
+        """Like `checkout`, but return the shared instance that `all` returns.
+
+        It must not be mutated; editors copy the parts that they change.
+        """
+        from .serialization import load_workflow
+
+        with self._locked():
+            self._refresh()
+            if workflow_id not in self._index:
+                return None, MISSING_VERSION
+            offset, length, version = self._index[workflow_id]
+            cached = self._parsed.get(workflow_id)
+            if cached is None or cached[0] != version:
+                with self.path.open("rb") as f:
+                    workflow = load_workflow(self._read(f, offset, length))
+                cached = self._parsed[workflow_id] = (version, workflow)
+            return cached[1], version
+
+    def _cached(self, cache: dict, build) -> list:
+        # Build an item for every live line, reusing the ones built from an
+        # identical line before.
+        with self._locked():
+            self._refresh()
+            items = []
+            f = None
+            try:
+                for workflow_id, (offset, length, digest) in self._index.items():
+                    cached = cache.get(workflow_id)
+                    if cached is None or cached[0] != digest:
+                        if f is None:
+                            f = self.path.open("rb")
+                        item = build(self._read(f, offset, length))
+                        count("lines parsed")
+                        cached = cache[workflow_id] = (digest, item)
+                    items.append(cached[1])
+            finally:
+                if f is not None:
+                    f.close()
+
+            if len(cache) > len(self._index):
+                for workflow_id in cache.keys() - self._index.keys():
+                    del cache[workflow_id]
+
+            return items
+
+    def forget(self, workflow_ids):
+        """Drop cached versions of workflows that are no longer current."""
+        with self._locked():
+            self._refresh()
+            for workflow_id in workflow_ids:
+                current = self._index.get(workflow_id, (0, 0, MISSING_VERSION))[2]
+                for cache in (self._parsed, self._summaries):
+                    cached = cache.get(workflow_id)
+                    if cached is not None and cached[0] != current:
+                        del cache[workflow_id]
+
+    @timed()
+    def all(self) -> list["Workflow"]:
+        """All workflows in file order.
+
+        The returned objects are shared by every session and must not be
+        mutated. Use `get` to obtain a copy for editing.
+        """
+        from .serialization import load_workflow
+
+        return self._cached(self._parsed, load_workflow)
+
+    @timed()
+    def summaries(self) -> list[WorkflowSummary]:
+        """Names and sizes of all workflows in file order, without validating them."""
+        return self._cached(self._summaries, WorkflowSummary.from_json)
+
+    @timed()
+    def export_bytes(self) -> bytes:
+        """The compacted contents of the file, without waiting for compaction."""
+        return b"".join(raw for _, raw in self.iter_raw())
+
+    @timed()
+    def put(self, workflow: "Workflow", expected_version: int | None = None) -> int:
+        """Save a workflow and return its new version (see `versions`).
+
+        If `expected_version` is given and the stored version differs (use
+        `MISSING_VERSION` for a workflow that shouldn't exist yet), nothing is
+        saved and `WorkflowConflict` is raised.
+        """
+        from .serialization import dump_workflow
+
+        data = dump_workflow(workflow) + b"\n"
+        with self._locked(exclusive=True):
+            self._refresh()
+            if expected_version is not None:
+                current = self._index.get(workflow.id, (0, 0, MISSING_VERSION))[2]
+                if current != expected_version:
+                    raise WorkflowConflict(workflow.id, current)
+
+            version = content_version(data)
+            if self._index.get(workflow.id, (0, 0, MISSING_VERSION))[2] == version:
+                # Unchanged, so the line is left alone.
+                return version
+
+            offset = self._append(data)
+            if workflow.id in self._index:
+                self._garbage += 1
+            # The caller keeps editing its instance, so it can't be cached as is.
+            self._index[workflow.id] = (offset, len(data), version)
+            if self._garbage:
+                self._schedule_compaction()
+            return self._index[workflow.id][2]
+
+    @timed()
+    def delete(self, workflow_id: str) -> bool:
+        with self._locked(exclusive=True):
+            self._refresh()
+            if workflow_id not in self._index:
+                return False
+            self._append(_tombstone(workflow_id))
+            del self._index[workflow_id]
+            self._garbage += 2
+            self._schedule_compaction()
+            return True
+
+    @timed()
+    def compact(self):
+        """Rewrite the file keeping only the live version of each workflow."""
+        with self._locked(exclusive=True):
+            self._refresh()
+            if not self._garbage:
+                return
+
+            with self.path.open("rb") as src:
+                self._rewrite(
+                    (workflow_id, self._read(src, offset, length), digest)
+                    for workflow_id, (offset, length, digest) in self._index.items()
+                )
+
+    @timed()
+    def normalize(self) -> int:
+        """Rewrite the workflows that aren't in canonical form.
+
+        See `dump_canonical`. Returns how many workflows were rewritten; if
+        none were, the file is left alone.
+        """
+        from .serialization import dump_canonical
+
+        with self._locked(exclusive=True):
+            self._refresh()
+            lines = []
+            changed = 0
+            with self.path.open("rb") as f:
+                for workflow_id, (offset, length, digest) in self._index.items():
+                    data = self._read(f, offset, length)
+                    canonical = dump_canonical(load_record(data)) + b"\n"
+                    if canonical != data:
+                        digest = content_version(canonical)
+                        changed += 1
+                    lines.append((workflow_id, canonical, digest))
+            if changed:
+                self._rewrite(lines)
+            return changed
+
+    def _rewrite(self, lines):
+        # Replace the file with the given (id, line, version) triples, which
+        # may be read from the file itself until it is replaced.
+        tmp_path = self.path.with_name(f".{self.path.name}.compact")
+        index: dict[str, tuple[int, int, int]] = {}
+        with tmp_path.open("wb") as dst:
+            for workflow_id, data, digest in lines:
+                index[workflow_id] = (dst.tell(), len(data), digest)
+                dst.write(data)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, self.path)
+
+        self._index = index
+        self._garbage = 0
+        self._size = sum(length for _, length, _ in index.values())
+        self._stat = self._stat_key()
+
+    def _schedule_compaction(self):
+        with self._lock:
+            if self._compact_timer is not None:
+                self._compact_timer.cancel()
+            self._compact_timer = threading.Timer(COMPACT_DELAY, self.compact)
+            self._compact_timer.daemon = True
+            self._compact_timer.start()
+
+
+_stores: dict[Path, WorkflowStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: Path) -> WorkflowStore:
+    """Return the process-wide store for a workflows file or directory.
+
+    A workflows directory has a file per workflow (see `ShardedWorkflowStore`),
+    anything else is a single file. Other directories are refused, including
+    packed exports (see `PackedWorkflows`), and so is a path that doesn't exist
+    unless it ends in `.jsonl`, so that a mistyped path isn't taken for a new,
+    empty store.
+    """
+    from .sharded import MARKER_FILE, ShardedWorkflowStore, is_sharded
+
+    path = Path(path).resolve()
+    with _stores_lock:
+        if path not in _stores:
+            if is_sharded(path):
+                _stores[path] = ShardedWorkflowStore(path)
+            elif path.is_dir():
+                from .blobs import BLOB_INDEX_FILE
+
+                if (path / BLOB_INDEX_FILE).exists():
+                    raise FileNotFoundError(
+                        f"{path} is a packed export, which can only be read "
+                        "(import it into a workflows file to edit it)"
+                    )
+                raise FileNotFoundError(
+                    f"{path} is a directory, but not a workflows directory "
+                    f"(it has no {MARKER_FILE} file)"
+                )
+            elif path.exists() or path.suffix == ".jsonl":
+                _stores[path] = WorkflowStore(path)
+            else:
+                raise FileNotFoundError(
+                    f"{path} is neither a workflows directory nor a .jsonl file"
+                )
+        return _stores[path]
@@ -0,0 +1,8 @@
+import re
+
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str | None) -> list[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
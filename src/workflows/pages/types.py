@@ -1,7 +1,65 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, model_serializer
 import uuid
 
 
+class _Positions:
+    """The position of every item of a list by id.
+
+    They follow the list through `_upsert` and `_remove`, so looking up an id
+    that isn't there means a new item, which is appended without looking at
+    the others. A list that was replaced, or grew or shrank behind their back,
+    is indexed again on the next lookup, and so is one with a stale entry:
+    removing an item leaves the positions of the items after it to be fixed
+    when one of them is looked up.
+    """
+
+    __slots__ = ("items", "by_id")
+
+    def __init__(self):
+        self.items: list | None = None
+        self.by_id: dict[str, int] = {}
+
+    def __deepcopy__(self, memo) -> "_Positions":
+        # A copy of a model has copies of its lists, indexed when first used.
+        return _Positions()
+
+    def __eq__(self, other) -> bool:
+        # Only a cache: models are equal whatever their positions.
+        return isinstance(other, _Positions)
+
+    __hash__ = None
+
+    def _rebuild(self, items: list):
+        self.items = items
+        self.by_id = {item.id: i for i, item in enumerate(items)}
+
+    def find(self, items: list, item_id: str) -> int | None:
+        if items is not self.items or len(self.by_id) != len(items):
+            self._rebuild(items)
+        i = self.by_id.get(item_id)
+        if i is None or (i < len(items) and items[i].id == item_id):
+            return i
+        self._rebuild(items)
+        return self.by_id.get(item_id)
+
+
+def _upsert(items: list, positions: _Positions, item):
+    i = positions.find(items, item.id)
+    if i is None:
+        positions.by_id[item.id] = len(items)
+        items.append(item)
+    else:
+        items[i] = item
+
+
+def _remove(items: list, positions: _Positions, item):
+    i = positions.find(items, item.id)
+    if i is None:
+        return
+    del items[i]
+    del positions.by_id[item.id]
+
+
 class CodeSnippet(BaseModel):
     """A piece of code. Can be an entire file or a snippet from a file."""
 
@@ -9,6 +67,22 @@ class CodeSnippet(BaseModel):
     url: str | None = None
     code: str | None = None
     language: str | None = None
+    # Hash of the code as it was last read from the file in `url`, for
+    # snippets that were ingested from a checkout (see ingest.py).
+    source_hash: str | None = None
+
+    @model_serializer(mode="wrap")
+    def _leave_out_source_hash(self, handler):
+        # Snippets read from a packed directory only read their code when it is
+        # first used (see blobs.py), so it may still have to be read here.
+        if "code" not in self.__dict__:
+            self.__dict__["code"] = self.code
+        # Only ingested snippets have one, so the others are written as they
+        # were before snippets could be ingested.
+        data = handler(self)
+        if data.get("source_hash", "") is None:
+            del data["source_hash"]
+        return data
 
 
 class Example(BaseModel):
@@ -20,6 +94,14 @@ class Example(BaseModel):
     instructions: str | None = None
     code: list[CodeSnippet] = Field(default_factory=list)
 
+    _code_positions: _Positions = PrivateAttr(default_factory=_Positions)
+
+    def upsert_code_snippet(self, code_snippet: CodeSnippet):
+        _upsert(self.code, self._code_positions, code_snippet)
+
+    def remove_code_snippet(self, code_snippet: CodeSnippet):
+        _remove(self.code, self._code_positions, code_snippet)
+
 
 class Test(BaseModel):
     """A test case to manually run against the agent"""
@@ -29,6 +111,14 @@ class Test(BaseModel):
     expected_outcome: str | None = None
     initial_state: list[CodeSnippet] = Field(default_factory=list)
 
+    _initial_state_positions: _Positions = PrivateAttr(default_factory=_Positions)
+
+    def upsert_code_snippet(self, code_snippet: CodeSnippet):
+        _upsert(self.initial_state, self._initial_state_positions, code_snippet)
+
+    def remove_code_snippet(self, code_snippet: CodeSnippet):
+        _remove(self.initial_state, self._initial_state_positions, code_snippet)
+
 
 class Workflow(BaseModel):
     """A workflow that describes implementing an app feature using Gel"""
@@ -36,4 +126,20 @@ class Workflow(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str | None = None
     tests: list[Test] = Field(default_factory=list)
-    examples: list[Example] = Field(default_factory=list)
\ No newline at end of file
+    examples: list[Example] = Field(default_factory=list)
+
+    # Positions of tests and examples by id, which are not serialized.
+    _test_positions: _Positions = PrivateAttr(default_factory=_Positions)
+    _example_positions: _Positions = PrivateAttr(default_factory=_Positions)
+
+    def upsert_test(self, test: Test):
+        _upsert(self.tests, self._test_positions, test)
+
+    def remove_test(self, test: Test):
+        _remove(self.tests, self._test_positions, test)
+
+    def upsert_example(self, example: Example):
+        _upsert(self.examples, self._example_positions, example)
+
+    def remove_example(self, example: Example):
+        _remove(self.examples, self._example_positions, example)
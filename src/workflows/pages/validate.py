@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+from pydantic import ValidationError
+
+from .sharded import _workflow_record
+from .store import is_tombstone
+from .types import Workflow
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class LineError(NamedTuple):
+    """A validation error on a line of a workflows file"""
+
+    line: int
+    location: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.line}: {self.location or '<line>'}: {self.message}"
+
+
+class FileError(NamedTuple):
+    """A validation error in a workflow file of a workflows directory"""
+
+    file: str
+    location: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.file}: {self.location or '<file>'}: {self.message}"
+
+
+def _errors(data: bytes) -> Iterator[tuple[str, str]]:
+    try:
+        Workflow.model_validate_json(data)
+    except ValidationError as e:
+        for error in e.errors():
+            yield ".".join(str(part) for part in error["loc"]), error["msg"]
+
+
+def _validate_range(path: str, start: int, end: int) -> tuple[int, list[LineError]]:
+    # Runs in a worker process, so it reads its part of the file by itself
+    # instead of receiving the lines from the parent.
+    errors = []
+    count = 0
+    position = start
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            count += 1
+            if not line.strip() or is_tombstone(line):
+                continue
+            for location, message in _errors(line):
+                errors.append(LineError(count, location, message))
+
+    return count, errors
+
+
+def _ranges(path: Path, chunk_size: int) -> Iterator[tuple[int, int]]:
+    """Split the file into byte ranges of about `chunk_size` that end on a newline."""
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = f.tell()
+            yield start, end
+            start = end
+
+
+def _submit_in_order(
+    executor: ProcessPoolExecutor, path: Path, chunk_size: int, limit: int
+) -> Iterator[tuple[int, list[LineError]]]:
+    pending = deque()
+    for start, end in _ranges(path, chunk_size):
+        pending.append(executor.submit(_validate_range, str(path), start, end))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _number_lines(results) -> Iterator[LineError]:
+    # Workers count lines from the start of their range.
+    line_offset = 0
+    for count, errors in results:
+        for error in errors:
+            yield error._replace(line=line_offset + error.line)
+        line_offset += count
+
+
+def validate_file(
+    path: Path, jobs: int | None = None, chunk_size: int = CHUNK_SIZE
+) -> Iterator[LineError]:
+    """Validate every line of a workflows file and yield the errors in line order.
+
+    The file is validated in chunks across `jobs` processes (all cores by
+    default). Only a couple of chunks per process are in flight at a time, so
+    memory use doesn't grow with the size of the file.
+    """
+    path = Path(path)
+    jobs = jobs or os.cpu_count() or 1
+
+    if jobs == 1 or path.stat().st_size <= chunk_size:
+        yield from _number_lines(
+            _validate_range(str(path), start, end)
+            for start, end in _ranges(path, chunk_size)
+        )
+        return
+
+    # Forking a process with threads (like the editor's) can deadlock the child.
+    context = None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+        yield from _number_lines(
+            _submit_in_order(executor, path, chunk_size, limit=2 * jobs)
+        )
+
+
+def validate_directory(path: Path) -> Iterator[FileError]:
+    """Validate every workflow file of a workflows directory, in name order.
+
+    Other JSON files are skipped, like the store does.
+    """
+    for shard in sorted(Path(path).glob("*.json")):
+        if shard.name.startswith("."):
+            continue
+        data = shard.read_bytes()
+        try:
+            if _workflow_record(data) is None:
+                continue
+        except ValueError:
+            pass  # not even JSON, which _errors reports
+        for location, message in _errors(data):
+            yield FileError(shard.name, location, message)
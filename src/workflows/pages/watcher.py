@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional, the file is polled without it
+    FileSystemEventHandler = object
+    Observer = None
+
+from .profiling import timed
+from .sharded import is_sharded
+from .store import WorkflowStore
+
+# How often the file is checked when it can't be watched.
+POLL_INTERVAL = float(os.environ.get("WORKFLOWS_POLL_INTERVAL", 1.0))
+# How often each open page asks the watcher whether anything changed. It is
+# only a look at a counter, so it can be frequent.
+NOTIFY_INTERVAL = float(os.environ.get("WORKFLOWS_NOTIFY_INTERVAL", 2.0))
+# Writes come in bursts (a save and its compaction), which are checked once.
+DEBOUNCE = 0.1
+HISTORY_SIZE = 256
+
+
+class _Wake(FileSystemEventHandler):
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def on_any_event(self, event):
+        self.event.set()
+
+
+class WorkflowWatcher:
+    """Tells open pages which workflows changed, whoever changed them.
+
+    A single thread per store waits for the file (or the files of a
+    workflows directory) to change, with inotify or whatever watchdog uses on
+    the platform, or by polling it. It then finds the workflows whose version
+    changed, drops them from the store's caches and records their ids under
+    a new generation. Pages remember the last generation they saw and ask for
+    the ids changed since, which doesn't touch the file.
+    """
+
+    def __init__(self, store: WorkflowStore):
+        self.store = store
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._changes: deque[tuple[int, frozenset[str]]] = deque(maxlen=HISTORY_SIZE)
+        self._stat = store._stat_key()
+        self._versions = store.versions()
+        self._wake = threading.Event()
+        self._observer = self._watch()
+        self.polling = self._observer is None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _watch(self):
+        if Observer is None:
+            return None
+        path = Path(self.store.path)
+        directory = path if is_sharded(path) else path.parent
+        observer = Observer()
+        observer.daemon = True
+        try:
+            observer.schedule(_Wake(self._wake), str(directory))
+            observer.start()
+        except OSError:  # for instance, out of inotify watches
+            return None
+        return observer
+
+    def _run(self):
+        while True:
+            self._wake.wait(POLL_INTERVAL if self.polling else None)
+            self._wake.clear()
+            time.sleep(DEBOUNCE)
+            try:
+                self.check()
+            except (OSError, ValueError, KeyError):
+                # Caught halfway through a change made by hand: the next
+                # change, or poll, will do.
+                pass
+
+    @timed()
+    def check(self):
+        """Record the workflows that changed since the last check, if any."""
+        stat = self.store._stat_key()
+        if stat == self._stat:
+            return
+        self._stat = stat
+        versions = self.store.versions()
+        changed = {
+            workflow_id
+            for workflow_id in versions.keys() | self._versions.keys()
+            if versions.get(workflow_id) != self._versions.get(workflow_id)
+        }
+        self._versions = versions
+        if not changed:
+            return
+        self.store.forget(changed)
+        with self._lock:
+            self.generation += 1
+            self._changes.append((self.generation, frozenset(changed)))
+            self._changed.notify_all()
+
+    def wait(self, generation: int, timeout: float | None = None) -> int:
+        """Block until there are changes after a generation, and return the last."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.generation > generation, timeout)
+            return self.generation
+
+    def changes_since(self, generation: int) -> tuple[int, set[str] | None]:
+        """The current generation, and the ids of the workflows changed since.
+
+        The ids are `None` when the generation is too old to know, in which
+        case any workflow may have changed.
+        """
+        with self._lock:
+            if generation >= self.generation:
+                return self.generation, set()
+            if not self._changes or self._changes[0][0] > generation + 1:
+                return self.generation, None
+            changed = set()
+            for change_generation, ids in self._changes:
+                if change_generation > generation:
+                    changed |= ids
+            return self.generation, changed
+
+
+_watchers: dict[Path, WorkflowWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def get_watcher(store: WorkflowStore) -> WorkflowWatcher:
+    """Return the process-wide watcher for a store, starting it if needed."""
+    with _watchers_lock:
+        if store.path not in _watchers:
+            _watchers[store.path] = WorkflowWatcher(store)
+        return _watchers[store.path]
+
+
+def watch(state, store: WorkflowStore, key: str):
+    """Note that a page of a session has just read the store.
+
+    Call it before reading, so that `changes` reports whatever changed after.
+    """
+    state[f"watch_generation_{key}"] = get_watcher(store).generation
+
+
+def changes(state, store: WorkflowStore, key: str) -> set[str] | None:
+    """The ids of the workflows changed since `watch` or `changes` was called.
+
+    `None` means that anything may have changed, for instance the first time.
+    """
+    watcher = get_watcher(store)
+    generation = state.get(f"watch_generation_{key}")
+    if generation is None:
+        state[f"watch_generation_{key}"] = watcher.generation
+        return None
+    generation, changed = watcher.changes_since(generation)
+    state[f"watch_generation_{key}"] = generation
+    return changed
@@ -0,0 +1,146 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from .pages.search import BM25Index
+from .pages.store import get_store
+from .pages.types import Workflow
+
+
+class WorkflowRetrieval(BaseModel):
+    """Retrieval quality of a workflow's examples for its own test prompts"""
+
+    workflow_id: str
+    name: str | None = None
+    queries: int
+    examples: int
+    recall: float
+    mrr: float
+
+
+class RetrievalReport(BaseModel):
+    """Results of a retrieval benchmark run over the whole corpus"""
+
+    k: int
+    queries: int
+    examples: int
+    recall: float
+    mrr: float
+    latency_mean_ms: float
+    latency_p50_ms: float
+    latency_p95_ms: float
+    workflows: list[WorkflowRetrieval]
+
+
+def evaluate(workflows: list[Workflow], k: int = 5) -> RetrievalReport:
+    index = BM25Index()
+    for workflow in workflows:
+        for example in workflow.examples:
+            if example.description:
+                index.add((workflow.id, example.id), example.description)
+
+    results = []
+    latencies = []
+    all_recalls = []
+    all_ranks = []
+
+    for workflow in workflows:
+        relevant = {
+            (workflow.id, example.id)
+            for example in workflow.examples
+            if example.description
+        }
+        prompts = [test.test_prompt for test in workflow.tests if test.test_prompt]
+        if not relevant or not prompts:
+            continue
+
+        recalls = []
+        ranks = []
+        for prompt in prompts:
+            start = time.perf_counter()
+            hits = [key for key, _ in index.search(prompt, limit=k)]
+            latencies.append(time.perf_counter() - start)
+
+            recalls.append(len(relevant.intersection(hits)) / len(relevant))
+            ranks.append(
+                next(
+                    (1 / rank for rank, key in enumerate(hits, 1) if key in relevant),
+                    0.0,
+                )
+            )
+
+        results.append(
+            WorkflowRetrieval(
+                workflow_id=workflow.id,
+                name=workflow.name,
+                queries=len(prompts),
+                examples=len(relevant),
+                recall=statistics.fmean(recalls),
+                mrr=statistics.fmean(ranks),
+            )
+        )
+        all_recalls.extend(recalls)
+        all_ranks.extend(ranks)
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies) or [0.0]
+
+    return RetrievalReport(
+        k=k,
+        queries=len(all_recalls),
+        examples=len(index),
+        recall=statistics.fmean(all_recalls) if all_recalls else 0.0,
+        mrr=statistics.fmean(all_ranks) if all_ranks else 0.0,
+        latency_mean_ms=statistics.fmean(latencies_ms),
+        latency_p50_ms=latencies_ms[len(latencies_ms) // 2],
+        latency_p95_ms=latencies_ms[int(len(latencies_ms) * 0.95)],
+        workflows=results,
+    )
+
+
+def format_report(report: RetrievalReport) -> str:
+    lines = [f"{'recall@' + str(report.k):>10} {'MRR':>6} {'tests':>6}  workflow"]
+    for result in sorted(report.workflows, key=lambda result: result.recall):
+        lines.append(
+            f"{result.recall:>10.2f} {result.mrr:>6.2f} {result.queries:>6}  "
+            f"{result.name or 'Untitled'} ({result.workflow_id})"
+        )
+    lines.append("")
+    lines.append(
+        f"{report.queries} queries over {report.examples} example descriptions: "
+        f"recall@{report.k} {report.recall:.3f}, MRR {report.mrr:.3f}"
+    )
+    lines.append(
+        f"latency: mean {report.latency_mean_ms:.3f} ms, "
+        f"p50 {report.latency_p50_ms:.3f} ms, p95 {report.latency_p95_ms:.3f} ms"
+    )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark retrieval of examples by their descriptions."
+    )
+    parser.add_argument("--file", type=Path, default=Path("workflows.jsonl"))
+    parser.add_argument("-k", type=int, default=5, help="Number of results to score")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument(
+        "--min-recall",
+        type=float,
+        default=None,
+        help="Exit with an error if the overall recall@k is below this value",
+    )
+    args = parser.parse_args()
+
+    report = evaluate(get_store(args.file).all(), k=args.k)
+    print(report.model_dump_json(indent=2) if args.json else format_report(report))
+
+    if args.min_recall is not None and report.recall < args.min_recall:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import BinaryIO
+
+from .pages.search import BM25Index
+from .pages.serialization import dump_record, load_record
+from .pages.store import WorkflowStore, get_store
+from .pages.watcher import get_watcher
+
+PROTOCOL_VERSIONS = ("2025-06-18", "2025-03-26", "2024-11-05")
+SERVER_NAME = "workflows"
+SERVER_VERSION = "0.1.0"
+RESOURCE_PREFIX = "workflows://examples/"
+SEARCH_LIMIT = 5
+LATENCY_HISTORY = 10000
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+TOOLS = [
+    {
+        "name": "list_examples",
+        "description": "List the examples, optionally of one workflow only, "
+        "with their ids, names and descriptions.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "workflow_id": {
+                    "type": "string",
+                    "description": "Only list the examples of this workflow",
+                },
+            },
+        },
+    },
+    {
+        "name": "search_examples",
+        "description": "Find the examples that best match a query, such as a "
+        "task or a feature to implement with Gel.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string"},
+                "limit": {"type": "integer", "default": SEARCH_LIMIT},
+            },
+            "required": ["query"],
+        },
+    },
+    {
+        "name": "fetch_example",
+        "description": "Get the instructions and code of an example by id.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"example_id": {"type": "string"}},
+            "required": ["example_id"],
+        },
+    },
+    {
+        "name": "server_stats",
+        "description": "Latency of the requests served so far, by method and tool.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+]
+
+
+class RequestError(Exception):
+    """A request that can't be served, answered with a JSON-RPC error"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def format_example(example: dict, workflow_name: str | None) -> str:
+    """An example as the markdown an agent reads."""
+    parts = [f"# {example.get('name') or 'Untitled example'}"]
+    if workflow_name:
+        parts.append(f"Part of the workflow “{workflow_name}”.")
+    for field in ("description", "instructions"):
+        if example.get(field):
+            parts.append(example[field])
+    for snippet in example.get("code") or []:
+        if snippet.get("url"):
+            parts.append(f"`{snippet['url']}`")
+        fence = "````" if "```" in (snippet.get("code") or "") else "```"
+        parts.append(
+            f"{fence}{snippet.get('language') or ''}\n"
+            f"{(snippet.get('code') or '').rstrip()}\n{fence}"
+        )
+    return "\n\n".join(parts)
+
+
+class ExampleIndex:
+    """The examples of a store in memory, by id and by their words.
+
+    It follows the store through its watcher: only the workflows that the
+    watcher reports as changed are read again, as plain records.
+    """
+
+    def __init__(self, store: WorkflowStore):
+        self.store = store
+        self.watcher = get_watcher(store)
+        self.generation: int | None = None
+        self._lock = threading.Lock()
+        # example id -> (workflow id, example record)
+        self._examples: dict[str, tuple[str, dict]] = {}
+        # workflow id -> (workflow name, example ids)
+        self._workflows: dict[str, tuple[str | None, list[str]]] = {}
+        self._bm25 = BM25Index()
+
+    def sync(self) -> bool:
+        """Catch up with the store, and return whether anything changed."""
+        with self._lock:
+            try:
+                return self._sync()
+            except Exception:
+                # Partly updated: read it all again the next time.
+                self.generation = None
+                raise
+
+    def _sync(self) -> bool:
+        if self.generation is not None:
+            generation, changed = self.watcher.changes_since(self.generation)
+            if changed is not None:
+                self.generation = generation
+                for workflow_id in changed:
+                    self._remove(workflow_id)
+                    raw = self.store.get_raw(workflow_id)
+                    if raw is not None:
+                        self._add(load_record(raw))
+                return bool(changed)
+
+        # The first time, or after missing too many changes: read it all.
+        self.generation = self.watcher.generation
+        for workflow_id in list(self._workflows):
+            self._remove(workflow_id)
+        for _, raw in self.store.iter_raw():
+            self._add(load_record(raw))
+        return True
+
+    def _add(self, workflow: dict):
+        example_ids = []
+        for example in workflow.get("examples") or []:
+            self._examples[example["id"]] = (workflow["id"], example)
+            self._bm25.add(
+                example["id"],
+                " ".join(
+                    filter(
+                        None,
+                        [
+                            workflow.get("name"),
+                            example.get("name"),
+                            example.get("description"),
+                            example.get("instructions"),
+                            *(
+                                snippet.get("code")
+                                for snippet in example.get("code") or []
+                            ),
+                        ],
+                    )
+                ),
+            )
+            example_ids.append(example["id"])
+        self._workflows[workflow["id"]] = (workflow.get("name"), example_ids)
+
+    def _remove(self, workflow_id: str):
+        _, example_ids = self._workflows.pop(workflow_id, (None, []))
+        for example_id in example_ids:
+            self._examples.pop(example_id, None)
+            self._bm25.remove(example_id)
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    def get(self, example_id: str) -> tuple[dict, str | None] | None:
+        """An example and the name of its workflow."""
+        with self._lock:
+            found = self._examples.get(example_id)
+            if found is None:
+                return None
+            workflow_id, example = found
+            return example, self._workflows[workflow_id][0]
+
+    def examples(self, workflow_id: str | None = None) -> list[tuple[str, dict]]:
+        """(workflow id, example) pairs in file order."""
+        with self._lock:
+            workflow_ids = [workflow_id] if workflow_id else list(self._workflows)
+            return [
+                (workflow_id, self._examples[example_id][1])
+                for workflow_id in workflow_ids
+                if workflow_id in self._workflows
+                for example_id in self._workflows[workflow_id][1]
+            ]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+        with self._lock:
+            return [
+                self._examples[example_id][1]
+                for example_id, _ in self._bm25.search(query, limit=limit)
+            ]
+
+
+class LatencyRecorder:
+    """How long the requests took, by method (and tool for tool calls)."""
+
+    def __init__(self, log: Path | None = None):
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque[float]] = {}
+        self._log = log.open("a", buffering=1) if log is not None else None
+
+    def record(self, name: str, seconds: float, ok: bool):
+        with self._lock:
+            history = self._latencies.setdefault(name, deque(maxlen=LATENCY_HISTORY))
+            history.append(seconds)
+            if self._log is not None:
+                self._log.write(
+                    json.dumps(
+                        {
+                            "time": time.time(),
+                            "request": name,
+                            "ms": seconds * 1000,
+                            "ok": ok,
+                        }
+                    )
+                    + "\n"
+                )
+
+    def summary(self) -> dict[str, dict]:
+        with self._lock:
+            summary = {}
+            for name, history in sorted(self._latencies.items()):
+                latencies = sorted(history)
+                summary[name] = {
+                    "count": len(latencies),
+                    "mean_ms": 1000 * sum(latencies) / len(latencies),
+                    "p50_ms": 1000 * latencies[len(latencies) // 2],
+                    "p95_ms": 1000 * latencies[int(len(latencies) * 0.95)],
+                    "max_ms": 1000 * latencies[-1],
+                }
+            return summary
+
+
+def format_summary(summary: dict[str, dict]) -> str:
+    columns = ("mean", "p50", "p95", "max")
+    lines = [f"{'request':<32} {'count':>7} " + " ".join(f"{c:>9}" for c in columns)]
+    for name, stats in summary.items():
+        lines.append(
+            f"{name:<32} {stats['count']:>7} {stats['mean_ms']:>7.3f}ms "
+            f"{stats['p50_ms']:>7.3f}ms {stats['p95_ms']:>7.3f}ms "
+            f"{stats['max_ms']:>7.3f}ms"
+        )
+    return "\n".join(lines)
+
+
+def _list_line(example: dict) -> str:
+    line = f"- {example['id']}: {example.get('name') or 'Untitled example'}"
+    if example.get("description"):
+        line += f" — {example['description']}"
+    return line
+
+
+def _text(text: str, is_error: bool = False) -> dict:
+    return {"content": [{"type": "text", "text": text}], "isError": is_error}
+
+
+class Server:
+    """An MCP server over stdio that serves the examples of a store.
+
+    Messages are JSON-RPC, one per line. When the store changes, the index
+    catches up and clients are told that the list of resources changed.
+    """
+
+    def __init__(
+        self,
+        store: WorkflowStore,
+        output: BinaryIO | None = None,
+        latency: LatencyRecorder | None = None,
+    ):
+        self.index = ExampleIndex(store)
+        self.index.sync()
+        self.latency = latency or LatencyRecorder()
+        self._output = output
+        self._output_lock = threading.Lock()
+
+    def send(self, message: dict):
+        if self._output is None:
+            return
+        with self._output_lock:
+            self._output.write(dump_record(message) + b"\n")
+            self._output.flush()
+
+    def _watch(self):
+        generation = self.index.generation
+        while True:
+            generation = self.index.watcher.wait(generation)
+            try:
+                changed = self.index.sync()
+            except Exception as e:
+                # For instance a line broken by an edit in progress: the edit
+                # that fixes it wakes the watcher again.
+                print(f"Couldn't reload {self.index.store.path}: {e}", file=sys.stderr)
+                continue
+            if changed:
+                self.send(
+                    {"jsonrpc": "2.0", "method": "notifications/resources/list_changed"}
+                )
+
+    def serve(self, input: BinaryIO):
+        threading.Thread(target=self._watch, daemon=True).start()
+        for line in input:
+            if not line.strip():
+                continue
+            try:
+                message = load_record(line)
+            except ValueError:
+                self.send(self._error(None, PARSE_ERROR, "Invalid JSON"))
+                continue
+            response = self.handle(message)
+            if response is not None:
+                self.send(response)
+
+    def _error(self, request_id, code: int, message: str) -> dict:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {"code": code, "message": message},
+        }
+
+    def handle(self, message: dict) -> dict | None:
+        """The response to a message, or `None` for a notification."""
+        start = time.perf_counter()
+        request_id = message.get("id") if isinstance(message, dict) else None
+        name = "invalid"
+        ok = False
+        try:
+            if not isinstance(message, dict) or not isinstance(
+                message.get("method"), str
+            ):
+                raise RequestError(INVALID_REQUEST, "Not a JSON-RPC request")
+            name = message["method"]
+            if "id" not in message:
+                # Notifications, like notifications/initialized, need no answer.
+                return None
+            params = message.get("params") or {}
+            if not isinstance(params, dict):
+                raise RequestError(INVALID_PARAMS, "The params must be an object")
+            if name == "tools/call":
+                name = f"tools/call {params.get('name')}"
+            result = self._dispatch(message["method"], params)
+            ok = not result.get("isError", False)
+            return {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except RequestError as e:
+            return self._error(request_id, e.code, str(e))
+        except Exception as e:
+            # One bad request mustn't take the server down with it.
+            return self._error(request_id, INTERNAL_ERROR, f"{type(e).__name__}: {e}")
+        finally:
+            if isinstance(message, dict) and "id" in message:
+                self.latency.record(name, time.perf_counter() - start, ok)
+
+    def _dispatch(self, method: str, params: dict) -> dict:
+        if method == "initialize":
+            version = params.get("protocolVersion")
+            return {
+                "protocolVersion": (
+                    version if version in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[0]
+                ),
+                "capabilities": {"tools": {}, "resources": {"listChanged": True}},
+                "serverInfo": {"name": SERVER_NAME, "version": SERVER_VERSION},
+            }
+        if method == "ping":
+            return {}
+        if method == "tools/list":
+            return {"tools": TOOLS}
+        if method == "tools/call":
+            arguments = params.get("arguments") or {}
+            if not isinstance(arguments, dict):
+                raise RequestError(INVALID_PARAMS, "The arguments must be an object")
+            return self._call(params.get("name"), arguments)
+        if method == "resources/list":
+            return {
+                "resources": [
+                    {
+                        "uri": f"{RESOURCE_PREFIX}{example['id']}",
+                        "name": example.get("name") or "Untitled example",
+                        "description": example.get("description") or "",
+                        "mimeType": "text/markdown",
+                    }
+                    for _, example in self.index.examples()
+                ]
+            }
+        if method == "resources/read":
+            uri = params.get("uri")
+            if not isinstance(uri, str):
+                raise RequestError(INVALID_PARAMS, "The uri must be a string")
+            found = self.index.get(uri.removeprefix(RESOURCE_PREFIX))
+            if not uri.startswith(RESOURCE_PREFIX) or found is None:
+                raise RequestError(INVALID_PARAMS, f"Unknown resource {uri}")
+            return {
+                "contents": [
+                    {
+                        "uri": uri,
+                        "mimeType": "text/markdown",
+                        "text": format_example(*found),
+                    }
+                ]
+            }
+        raise RequestError(METHOD_NOT_FOUND, f"Unknown method {method}")
+
+    def _call(self, tool: str | None, arguments: dict) -> dict:
+        if tool == "list_examples":
+            examples = self.index.examples(arguments.get("workflow_id"))
+            if not examples:
+                return _text("No examples.")
+            return _text("\n".join(_list_line(example) for _, example in examples))
+        if tool == "search_examples":
+            query = arguments.get("query")
+            if not isinstance(query, str) or not query.strip():
+                return _text("A query is needed.", is_error=True)
+            limit = arguments.get("limit", SEARCH_LIMIT)
+            if not isinstance(limit, int) or limit < 1:
+                return _text("The limit must be a positive integer.", is_error=True)
+            hits = self.index.search(query, limit=limit)
+            if not hits:
+                return _text("No examples match.")
+            return _text("\n".join(_list_line(example) for example in hits))
+        if tool == "fetch_example":
+            found = self.index.get(arguments.get("example_id") or "")
+            if found is None:
+                return _text(
+                    f"No example with id {arguments.get('example_id')}.", is_error=True
+                )
+            return _text(format_example(*found))
+        if tool == "server_stats":
+            return _text(
+                f"{len(self.index)} examples\n\n"
+                + format_summary(self.latency.summary())
+            )
+        raise RequestError(INVALID_PARAMS, f"Unknown tool {tool}")
+
+
+def benchmark(server: Server, requests: int, seed: int = 0) -> dict[str, dict]:
+    """Serve a mix of requests in-process, as a client would send them.
+
+    Searches use the names of random examples as queries, and fetches use
+    random ids. Returns the latency summary.
+    """
+    rng = random.Random(seed)
+    examples = [example for _, example in server.index.examples()]
+    if not examples:
+        return {}
+    server.handle({"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {}})
+    for i in range(1, requests + 1):
+        example = rng.choice(examples)
+        kind = rng.random()
+        if kind < 0.45:
+            tool, arguments = "search_examples", {"query": example.get("name") or "gel"}
+        elif kind < 0.9:
+            tool, arguments = "fetch_example", {"example_id": example["id"]}
+        else:
+            tool, arguments = "list_examples", {}
+        server.handle(
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "tools/call",
+                "params": {"name": tool, "arguments": arguments},
+            }
+        )
+    return server.latency.summary()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="mcp-server",
+        description="Serve the examples of a workflows file to MCP clients over stdio.",
+    )
+    parser.add_argument(
+        "--workflows-file",
+        type=Path,
+        default=Path("workflows.jsonl"),
+        help="The workflows file or directory (default: workflows.jsonl)",
+    )
+    parser.add_argument(
+        "--latency-log", type=Path, help="Append the latency of each request here"
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="REQUESTS",
+        help="Instead of serving, time this many requests in-process and exit",
+    )
+    args = parser.parse_args(argv)
+
+    store = get_store(args.workflows_file)
+    latency = LatencyRecorder(args.latency_log)
+    if args.benchmark is not None:
+        start = time.perf_counter()
+        server = Server(store, latency=latency)
+        elapsed = time.perf_counter() - start
+        print(f"Indexed {len(server.index)} examples in {elapsed:.2f} s")
+        print(format_summary(benchmark(server, args.benchmark)))
+        return
+
+    # Anything printed by mistake would corrupt the protocol on stdout.
+    output = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    Server(store, output=output, latency=latency).serve(sys.stdin.buffer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import pytest
+
+from workflows.pages import drafts, store
+
+
+@pytest.fixture(autouse=True)
+def no_background_writes(monkeypatch):
+    # Tests compact and flush explicitly, rather than racing the timers.
+    monkeypatch.setattr(store, "COMPACT_DELAY", 3600)
+    monkeypatch.setattr(drafts, "FLUSH_DELAY", 3600)
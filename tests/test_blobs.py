@@ -0,0 +1,93 @@
+import pytest
+
+from workflows import cli
+from workflows.pages import blobs
+from workflows.pages.blobs import PackedSnippet, PackedWorkflows, pack
+from workflows.pages.serialization import dump_workflow
+from workflows.pages.store import WorkflowStore, get_store
+from workflows.pages.types import CodeSnippet, Example, Workflow
+from workflows.pages.types import Test as WorkflowTest  # not a test case
+
+SCHEMA = "module default {\n  type User;\n}\n" * 100
+
+
+def workflows():
+    return [
+        Workflow(
+            name="Auth",
+            tests=[WorkflowTest(initial_state=[CodeSnippet(code=SCHEMA)])],
+            examples=[
+                Example(
+                    code=[
+                        CodeSnippet(code=SCHEMA, source_hash="ab", language="gel"),
+                        CodeSnippet(code=""),
+                        CodeSnippet(code=None),
+                    ]
+                )
+            ],
+        ),
+        Workflow(name="Empty"),
+    ]
+
+
+def test_packed_workflows_round_trip(tmp_path):
+    expected = workflows()
+    assert pack(expected, tmp_path / "packed") == (2, 1)
+    assert len((tmp_path / "packed" / "blobs.bin").read_bytes()) == len(SCHEMA)
+
+    packed = PackedWorkflows(tmp_path / "packed")
+    assert packed.ids() == [workflow.id for workflow in expected]
+    assert [dump_workflow(workflow) for workflow in packed] == [
+        dump_workflow(workflow) for workflow in expected
+    ]
+    assert [raw for _, raw in packed.iter_raw()] == [
+        dump_workflow(workflow) + b"\n" for workflow in expected
+    ]
+    assert [summary.name for summary in packed.summaries()] == ["Auth", "Empty"]
+    assert packed.get("missing") is None
+    packed.close()
+
+
+def test_snippets_read_their_code_when_used(tmp_path):
+    [workflow, _] = expected = workflows()
+    pack(expected, tmp_path / "packed")
+    packed = PackedWorkflows(tmp_path / "packed")
+
+    [snippet] = packed.get(workflow.id).tests[0].initial_state
+    assert isinstance(snippet, PackedSnippet)
+    assert "code" not in snippet.__dict__
+    copy = snippet.model_copy(deep=True)
+    assert snippet.code == SCHEMA
+    assert copy.code == SCHEMA
+    assert snippet.model_dump() == workflow.tests[0].initial_state[0].model_dump()
+
+
+def test_blob_table_keeps_the_last_bodies(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "LOADED_CACHE_SIZE", 2)
+    example = Example(code=[CodeSnippet(code=str(i)) for i in range(5)])
+    pack([Workflow(examples=[example])], tmp_path / "packed")
+    table = blobs.BlobTable(tmp_path / "packed")
+
+    assert [table.get(blobs.snippet_digest(str(i))) for i in range(5)] == list("01234")
+    assert len(table._loaded) == 2
+
+
+def test_export_and_import_round_trip(tmp_path, capsys):
+    source = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(source)
+    for workflow in workflows():
+        store.put(workflow)
+
+    cli.main(["--file", str(source), "export", "--packed", str(tmp_path / "packed")])
+    cli.main(["--file", str(tmp_path / "packed"), "list"])
+    assert "Auth" in capsys.readouterr().out
+    copy = tmp_path / "copy.jsonl"
+    cli.main(["--file", str(copy), "import", str(tmp_path / "packed")])
+
+    assert copy.read_bytes() == source.read_bytes()
+
+
+def test_stores_refuse_packed_directories(tmp_path):
+    pack(workflows(), tmp_path / "packed")
+    with pytest.raises(FileNotFoundError, match="packed export"):
+        get_store(tmp_path / "packed")
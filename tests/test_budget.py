@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from workflows import cli
+from workflows.pages import budget
+from workflows.pages.budget import (
+    TokenIndex,
+    WorkflowTokens,
+    estimate_tokens,
+    format_tokens,
+)
+from workflows.pages.store import WorkflowStore
+from workflows.pages.types import CodeSnippet, Example, Workflow
+
+SMALL = Example(name="Insert", code=[CodeSnippet(code="insert User;")])
+LARGE = Example(name="Schema", code=[CodeSnippet(code="type User;\n" * 300)])
+
+
+def test_estimates_count_words_punctuation_and_lines():
+    assert estimate_tokens(None) == estimate_tokens("") == 0
+    # "sele", "ct", "User", "{", "name", "};", "\n"
+    assert estimate_tokens("select User { name };\n") == 7
+    assert format_tokens(7) == "~7 tokens"
+    assert format_tokens(12345) == "~12.3k tokens"
+
+
+def test_models_and_records_cost_the_same():
+    workflow = Workflow(examples=[SMALL, LARGE])
+    tokens = WorkflowTokens.of(workflow)
+
+    assert WorkflowTokens.of(workflow.model_dump()) == tokens
+    assert list(tokens.examples) == [SMALL.id, LARGE.id]
+    assert tokens.total == sum(tokens.examples.values())
+
+
+def test_budgets(monkeypatch):
+    monkeypatch.setattr(budget, "EXAMPLE_BUDGET", 1000)
+    monkeypatch.setattr(budget, "WORKFLOW_BUDGET", 1500)
+    tokens = WorkflowTokens.of(Workflow(examples=[SMALL, LARGE]))
+    assert tokens.examples_over_budget == [LARGE.id]
+    assert not tokens.over_budget
+
+    monkeypatch.setattr(budget, "WORKFLOW_BUDGET", 1000)
+    assert tokens.over_budget
+
+
+@pytest.mark.parametrize("stale_read_all", [0, 16])
+def test_index_follows_the_store(tmp_path, monkeypatch, stale_read_all):
+    monkeypatch.setattr(budget, "STALE_READ_ALL", stale_read_all)
+    store = WorkflowStore(tmp_path / "workflows.jsonl")
+    small = Workflow(examples=[SMALL])
+    large = Workflow(examples=[LARGE])
+    store.put(small)
+    store.put(large)
+    index = TokenIndex(store)
+
+    assert list(index.get([large.id, "missing"])) == [large.id]
+    assert index.get()[small.id] == WorkflowTokens.of(small)
+
+    small.examples = [SMALL, LARGE]
+    store.put(small)
+    store.delete(large.id)
+    assert index.get() == {small.id: WorkflowTokens.of(small)}
+
+
+def test_cli_checks_the_budgets(tmp_path, monkeypatch, capsys):
+    # The options set the module's budgets.
+    monkeypatch.setattr(budget, "EXAMPLE_BUDGET", budget.EXAMPLE_BUDGET)
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    store.put(Workflow(name="Small", examples=[SMALL]))
+    store.put(Workflow(name="Large", examples=[LARGE]))
+
+    args = ["--file", str(path), "budget", "--example-budget", "1000"]
+    with pytest.raises(SystemExit):
+        cli.main([*args, "--over", "--check", "--json"])
+    [row] = map(json.loads, capsys.readouterr().out.splitlines())
+    assert (row["name"], row["examples_over_budget"]) == ("Large", [LARGE.id])
+
+    cli.main(args)
+    assert "1 workflows over budget" in capsys.readouterr().out
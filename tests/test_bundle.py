@@ -0,0 +1,81 @@
+import pytest
+
+from workflows.pages.bundle import Bundle, BundleError, build_bundle, open_if_changed
+from workflows.pages.types import CodeSnippet, Example, Workflow
+
+
+WORKFLOWS = [
+    Workflow(
+        name="Auth",
+        examples=[
+            Example(
+                name="Sign in with email",
+                description="Send a magic link",
+                instructions="Use the email factor",
+                code=[
+                    CodeSnippet(url="auth.py", code="sign_in() ✓", language="python"),
+                    CodeSnippet(code=None),
+                ],
+            ),
+            Example(name="Sign out"),
+        ],
+    ),
+    Workflow(name=None, examples=[Example(description="Paginate a query")]),
+]
+
+
+@pytest.fixture
+def bundle_path(tmp_path):
+    path = tmp_path / "workflows.bundle"
+    build_bundle((workflow.model_dump() for workflow in WORKFLOWS), path)
+    return path
+
+
+def test_examples_round_trip(bundle_path):
+    expected = {
+        example.id: (workflow, example)
+        for workflow in WORKFLOWS
+        for example in workflow.examples
+    }
+    with Bundle(bundle_path, verify=True) as bundle:
+        assert len(bundle) == 3
+        for example_id, (workflow, example) in expected.items():
+            found = bundle.example(example_id)
+            assert found.workflow_id == workflow.id
+            assert found.workflow_name == workflow.name
+            assert found.to_dict() == example.model_dump()
+        assert sorted(example.id for example in bundle.examples()) == sorted(expected)
+        assert bundle.example("missing") is None
+
+
+def test_search_ranks_by_matching_terms(bundle_path):
+    with Bundle(bundle_path) as bundle:
+        names = [example.name for example in bundle.search("sign in email")]
+        assert names == ["Sign in with email", "Sign out"]
+        assert bundle.search("nothing like it") == []
+
+
+def test_corrupted_bundles_are_refused(bundle_path, tmp_path):
+    data = bytearray(bundle_path.read_bytes())
+    data[-1] ^= 0xFF
+    bundle_path.write_bytes(data)
+    with pytest.raises(BundleError):
+        Bundle(bundle_path, verify=True)
+
+    (tmp_path / "short").write_bytes(b"")
+    with pytest.raises(BundleError):
+        Bundle(tmp_path / "short")
+    (tmp_path / "other").write_bytes(b"{}\n" * 100)
+    with pytest.raises(BundleError):
+        Bundle(tmp_path / "other")
+
+
+def test_open_if_changed_keeps_an_unchanged_bundle(bundle_path):
+    bundle = open_if_changed(bundle_path)
+    assert open_if_changed(bundle_path, bundle) is bundle
+
+    build_bundle([Workflow(examples=[Example()]).model_dump()], bundle_path)
+    reopened = open_if_changed(bundle_path, bundle)
+    assert reopened is not bundle
+    assert len(reopened) == 1
+    reopened.close()
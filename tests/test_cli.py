@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from workflows import cli
+from workflows.pages.serialization import dump_workflow
+from workflows.pages.store import WorkflowStore
+from workflows.pages.types import CodeSnippet, Example, Workflow
+from workflows.pages.types import Test as WorkflowTest  # not a test case
+
+WORKFLOWS = [
+    Workflow(
+        name="Auth",
+        tests=[WorkflowTest(test_prompt="Add auth")],
+        examples=[Example(name="Schema", code=[CodeSnippet(code="type User;")])],
+    ),
+    Workflow(name="Search"),
+    Workflow(name="Search again"),
+]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    for workflow in WORKFLOWS:
+        store.put(workflow)
+    return path
+
+
+def run(path, *args):
+    cli.main(["--file", str(path), *map(str, args)])
+
+
+def test_list_show_and_stats(path, capsys):
+    run(path, "list", "--json")
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [row["name"] for row in rows] == ["Auth", "Search", "Search again"]
+    assert rows[0]["tests"] == rows[0]["examples"] == 1
+
+    run(path, "show", WORKFLOWS[0].id[:8])
+    assert capsys.readouterr().out.encode() == dump_workflow(WORKFLOWS[0]) + b"\n"
+
+    run(path, "stats")
+    out = capsys.readouterr().out
+    assert "workflows: 3\n" in out
+    assert "snippets: 1\n" in out
+
+
+def test_unknown_ids_and_files_exit_with_a_message(path, tmp_path):
+    with pytest.raises(SystemExit, match="No workflow with id nope"):
+        run(path, "show", "nope")
+    with pytest.raises(SystemExit, match="missing.jsonl"):
+        run(path, "import", tmp_path / "missing.jsonl")
+
+
+def test_import_reads_files_in_batches(path, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(cli, "READ_BATCH_SIZE", 2)
+    run(tmp_path / "copy.jsonl", "import", path)
+
+    assert "Imported 3 workflows" in capsys.readouterr().out
+    assert (tmp_path / "copy.jsonl").read_bytes() == path.read_bytes()
+
+
+def test_import_stops_at_the_first_invalid_line(path, tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, "READ_BATCH_SIZE", 2)
+    lines = path.read_bytes().splitlines(keepends=True)
+    lines[2] = b'{"id": "x", "tests": 1}\n'
+    path.write_bytes(b"".join(lines))
+
+    with pytest.raises(SystemExit) as exit:
+        run(tmp_path / "copy.jsonl", "import", path)
+
+    assert str(exit.value).startswith(f"{path}:3: tests: ")
+    assert str(exit.value).endswith("Imported the 2 workflows before it")
+
+
+def test_merge_combines_tests_and_examples(path, tmp_path):
+    other = tmp_path / "other.jsonl"
+    incoming = WORKFLOWS[0].model_copy(
+        update={"tests": [WorkflowTest(test_prompt="Add roles")]}
+    )
+    other.write_bytes(dump_workflow(incoming) + b"\n")
+
+    run(path, "merge", other)
+
+    merged = WorkflowStore(path).get(WORKFLOWS[0].id)
+    assert [test.test_prompt for test in merged.tests] == ["Add auth", "Add roles"]
+
+
+def test_delete(path):
+    run(path, "delete", WORKFLOWS[1].id)
+    assert WorkflowStore(path).ids() == [WORKFLOWS[0].id, WORKFLOWS[2].id]
@@ -0,0 +1,81 @@
+from workflows.pages.drafts import DraftJournal
+from workflows.pages.types import Example, Workflow
+from workflows.pages.types import Test as WorkflowTest  # not a test case
+
+
+def edit(journal: DraftJournal, workflow: Workflow) -> tuple[str, WorkflowTest]:
+    """Make the edits the editor journals while adding and renaming things."""
+    draft_id = journal.begin(workflow, 7)
+    journal.record(draft_id, "set", item=workflow.id, field="name", value="Renamed")
+    test = WorkflowTest(test_prompt="Sign in")
+    journal.record(
+        draft_id, "upsert", parent=workflow.id, list="tests", item=test.model_dump()
+    )
+    journal.record(
+        draft_id, "remove", parent=workflow.id, list="examples", item="old example"
+    )
+    journal.record(
+        draft_id,
+        "set",
+        item="new example",
+        slot="edit_example",
+        field="name",
+        value="Unsaved example",
+    )
+    return draft_id, test
+
+
+def test_replay_restores_the_draft(tmp_path):
+    path = tmp_path / ".workflows.jsonl.journal"
+    workflow = Workflow(name="Auth", examples=[Example(id="old example")])
+    journal = DraftJournal(path)
+    draft_id, test = edit(journal, workflow)
+    journal.flush()
+
+    # The base workflow is journaled as it was when the draft began.
+    assert workflow.name == "Auth"
+    [draft] = DraftJournal(path).drafts()
+    assert draft.id == draft_id
+    assert draft.version == 7
+    assert draft.workflow.name == "Renamed"
+    assert draft.workflow.tests == [test]
+    assert draft.workflow.examples == []
+    assert draft.edit_example.id == "new example"
+    assert draft.edit_example.name == "Unsaved example"
+
+
+def test_checkpoint_keeps_the_drafts(tmp_path):
+    path = tmp_path / ".workflows.jsonl.journal"
+    journal = DraftJournal(path)
+    edit(journal, Workflow(name="Auth", examples=[Example(id="old example")]))
+    drafts = [draft.model_dump() for draft in journal.drafts()]
+
+    journal.checkpoint()
+    assert len(path.read_bytes().splitlines()) == 1
+    assert [draft.model_dump() for draft in DraftJournal(path).drafts()] == drafts
+
+
+def test_finished_drafts_are_dropped(tmp_path):
+    path = tmp_path / ".workflows.jsonl.journal"
+    journal = DraftJournal(path)
+    saved, _ = edit(journal, Workflow())
+    kept, _ = edit(journal, Workflow())
+    journal.finish(saved, saved=True)
+    untouched = journal.begin(Workflow(), 1)
+    journal.finish(untouched, saved=False)
+
+    assert [draft.id for draft in DraftJournal(path).drafts()] == [kept]
+
+
+def test_torn_lines_are_skipped(tmp_path):
+    path = tmp_path / ".workflows.jsonl.journal"
+    journal = DraftJournal(path)
+    draft_id, _ = edit(journal, Workflow())
+    journal.flush()
+    with path.open("ab") as f:
+        f.write(b'{"draft": "torn by a crash", "op": "se')
+
+    journal.record(draft_id, "set", item="new example", field="description", value="x")
+    journal.flush()
+    [draft] = DraftJournal(path).drafts()
+    assert draft.edit_example.description == "x"
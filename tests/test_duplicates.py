@@ -0,0 +1,61 @@
+from workflows.pages.duplicates import (
+    NUM_HASHES,
+    DuplicateIndex,
+    shingles,
+    signature,
+    similarity,
+)
+from workflows.pages.store import WorkflowStore
+from workflows.pages.types import CodeSnippet, Example, Workflow
+
+TEXT = (
+    "Create a schema with a User type that has a unique email property and a "
+    "link to the posts that the user wrote, then migrate the database and "
+    "insert a few users with posts to try the queries on"
+)
+QUERY = (
+    "select Post { title, body, author: { name, email } } filter .author.email "
+    "= <str>$email order by .created_at desc limit 10"
+)
+
+
+def test_signatures_estimate_jaccard_similarity():
+    a = shingles(TEXT)
+    b = shingles(TEXT.replace("database", "instance"))
+    assert len(signature(a)) == NUM_HASHES
+    assert similarity(signature(a), signature(a)) == 1.0
+
+    jaccard = len(a & b) / len(a | b)
+    assert abs(similarity(signature(a), signature(b)) - jaccard) < 0.2
+    assert similarity(signature(a), signature(shingles(QUERY))) < 0.2
+
+
+def test_pairs_and_similar_find_near_duplicates(tmp_path):
+    store = WorkflowStore(tmp_path / "workflows.jsonl")
+    original = Example(name="Schema", description=TEXT)
+    copy = Example(name="Schema", description=TEXT + " later")
+    snippet = CodeSnippet(code=QUERY)
+    first = Workflow(name="First", examples=[original])
+    second = Workflow(
+        name="Second",
+        examples=[
+            copy,
+            Example(name="Query", code=[snippet, CodeSnippet(code="select 1")]),
+        ],
+    )
+    third = Workflow(examples=[Example(code=[CodeSnippet(code=QUERY)])])
+    for workflow in [first, second, third]:
+        store.put(workflow)
+    index = DuplicateIndex(store)
+
+    found = index.pairs()
+    assert sorted((pair.kind, pair.similarity == 1.0) for pair in found) == [
+        ("example", False),
+        ("snippet", True),
+    ]
+    [duplicate] = index.similar(first)
+    assert {duplicate.item_id, duplicate.other_item_id} == {original.id, copy.id}
+    assert duplicate.title == duplicate.other_title == "Schema"
+
+    store.delete(second.id)
+    assert index.pairs() == []
@@ -0,0 +1,114 @@
+import pytest
+
+from workflows.pages.ingest import (
+    IngestResult,
+    SourceCache,
+    expand_spec,
+    ingest,
+    read_sources,
+    refresh,
+)
+from workflows.pages.types import CodeSnippet, Example, Workflow
+
+SCHEMA = "module default {\n  type User;\n  type Post;\n}\n"
+
+
+def ingested(root, cache_file, specs, workflow=None):
+    """Ingest files into a new example of a workflow, like `workflows ingest`."""
+    workflow = workflow or Workflow()
+    sources = [source for spec in specs for source in expand_spec(root, spec)]
+    cache = SourceCache(cache_file)
+    example = Example()
+    ingest(example, sources, read_sources(root, sources, cache))
+    workflow.upsert_example(example)
+    cache.save()
+    return workflow
+
+
+def refreshed(root, cache_file, workflows, force=False):
+    """Refresh some workflows, like `workflows refresh`."""
+    cache = SourceCache(cache_file)
+    changed, result = refresh(workflows, root, cache, force=force)
+    cache.save()
+    return changed, result
+
+
+def code(workflow):
+    return [snippet.code for snippet in workflow.examples[0].code]
+
+
+def test_ingest_reads_files_and_line_ranges(tmp_path):
+    root = tmp_path / "app"
+    (root / "dbschema").mkdir(parents=True)
+    (root / "dbschema" / "default.gel").write_text(SCHEMA)
+    (root / "queries.py").write_text("a = 1\nb = 2\nc = 3\n")
+
+    workflow = ingested(root, tmp_path / "cache", ["dbschema/*.gel", "queries.py:2-3"])
+    [schema, queries] = workflow.examples[0].code
+    assert (schema.url, schema.language, schema.code) == (
+        "dbschema/default.gel",
+        "gel",
+        SCHEMA,
+    )
+    assert (queries.url, queries.language, queries.code) == (
+        "queries.py#L2-L3",
+        "python",
+        "b = 2\nc = 3\n",
+    )
+
+
+def test_refreshing_one_workflow_leaves_the_others_to_refresh(tmp_path):
+    root = tmp_path / "app"
+    root.mkdir()
+    (root / "schema.gel").write_text(SCHEMA)
+    cache_file = tmp_path / "cache"
+    a = ingested(root, cache_file, ["schema.gel"])
+    b = ingested(root, cache_file, ["schema.gel", "schema.gel:2"])
+
+    changed = SCHEMA.replace("Post", "Comment")
+    (root / "schema.gel").write_text(changed)
+    assert refreshed(root, cache_file, [a])[0] == [a]
+    assert code(a) == [changed]
+
+    # The cache now knows the file's new code, but b doesn't have it yet.
+    assert refreshed(root, cache_file, [a, b])[0] == [b]
+    assert code(b) == [changed, "  type User;\n"]
+    _, result = refreshed(root, cache_file, [a, b])
+    assert result.updated == 0
+
+
+def test_snippets_edited_by_hand_are_only_refreshed_with_force(tmp_path):
+    root = tmp_path / "app"
+    root.mkdir()
+    (root / "schema.gel").write_text(SCHEMA)
+    cache_file = tmp_path / "cache"
+    workflow = ingested(root, cache_file, ["schema.gel"])
+    workflow.examples[0].code[0].code = "edited"
+    (root / "schema.gel").write_text(SCHEMA + "\n")
+
+    changed, result = refreshed(root, cache_file, [workflow])
+    assert (changed, result.edited) == ([], 1)
+    assert code(workflow) == ["edited"]
+
+    changed, result = refreshed(root, cache_file, [workflow], force=True)
+    assert (changed, result.updated) == ([workflow], 1)
+    assert code(workflow) == [SCHEMA + "\n"]
+
+
+def test_files_outside_the_checkout_are_not_read(tmp_path):
+    root = tmp_path / "app"
+    root.mkdir()
+    (tmp_path / "secret.txt").write_text("secret")
+    (root / "link.txt").symlink_to(tmp_path / "secret.txt")
+
+    for spec in ["../secret.txt", "link.txt"]:
+        with pytest.raises(ValueError, match="outside"):
+            expand_spec(root, spec)
+
+    urls = ["../secret.txt", str(tmp_path / "secret.txt"), "link.txt#L1"]
+    snippets = [CodeSnippet(url=url, code="", source_hash="0") for url in urls]
+    workflow = Workflow(examples=[Example(code=snippets)])
+
+    changed, result = refreshed(root, tmp_path / "cache", [workflow], force=True)
+    assert (changed, result) == ([], IngestResult())
+    assert code(workflow) == ["", "", ""]
@@ -0,0 +1,81 @@
+import io
+
+from workflows.pages.merge import merge_files
+from workflows.pages.serialization import dump_canonical, load_record
+
+
+def write(path, *records):
+    path.write_bytes(b"".join(dump_canonical(record) + b"\n" for record in records))
+    return path
+
+
+def workflow(workflow_id, name="Auth", tests=()):
+    return {"id": workflow_id, "name": name, "tests": list(tests), "examples": []}
+
+
+def case(test_id, prompt):
+    return {
+        "id": test_id,
+        "test_prompt": prompt,
+        "expected_outcome": None,
+        "initial_state": [],
+    }
+
+
+def merge(tmp_path, base, ours, theirs):
+    out = io.BytesIO()
+    conflicts = merge_files(
+        write(tmp_path / "base", *base),
+        write(tmp_path / "ours", *ours),
+        write(tmp_path / "theirs", *theirs),
+        out,
+    )
+    return out.getvalue(), conflicts
+
+
+def test_changes_to_different_workflows_and_items_merge(tmp_path):
+    base = [workflow("a", tests=[case("t1", "one")]), workflow("b")]
+    ours = [
+        workflow("a", tests=[case("t1", "one edited"), case("t2", "two")]),
+        workflow("b", name="Ours"),
+    ]
+    theirs = [
+        workflow("a", name="Theirs", tests=[case("t1", "one"), case("t3", "three")]),
+        workflow("b"),
+        workflow("c"),
+    ]
+
+    merged, conflicts = merge(tmp_path, base, ours, theirs)
+    assert conflicts == []
+    # What only one side added goes after what it follows on that side.
+    tests = [case("t1", "one edited"), case("t3", "three"), case("t2", "two")]
+    assert [load_record(line) for line in merged.splitlines()] == [
+        workflow("a", name="Theirs", tests=tests),
+        workflow("b", name="Ours"),
+        workflow("c"),
+    ]
+
+
+def test_deletions_merge_with_unchanged_workflows(tmp_path):
+    base = [workflow("a"), workflow("b")]
+    merged, conflicts = merge(tmp_path, base, [workflow("b")], base)
+    assert conflicts == []
+    assert merged == dump_canonical(workflow("b")) + b"\n"
+
+
+def test_conflicting_edits_are_left_between_markers(tmp_path):
+    base = [workflow("a", tests=[case("t1", "one")])]
+    ours = [workflow("a", name="Ours", tests=[case("t1", "ours")])]
+    theirs = [workflow("a", tests=[case("t1", "theirs"), case("t2", "two")])]
+
+    merged, conflicts = merge(tmp_path, base, ours, theirs)
+    assert conflicts == ["a.tests[t1].test_prompt"]
+    lines = merged.splitlines()
+    assert lines[0] == b"<<<<<<< ours"
+    assert lines[2] == b"======="
+    assert lines[4] == b">>>>>>> theirs"
+    # Each side has its own value of the conflicting field and all the
+    # changes that don't conflict.
+    ours, theirs = load_record(lines[1]), load_record(lines[3])
+    assert ours == workflow("a", "Ours", [case("t1", "ours"), case("t2", "two")])
+    assert theirs == workflow("a", "Ours", [case("t1", "theirs"), case("t2", "two")])
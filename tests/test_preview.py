@@ -0,0 +1,49 @@
+import pytest
+
+from workflows.pages.preview import (
+    PREVIEW_CHARS,
+    PREVIEW_LINES,
+    Preview,
+    format_preview,
+    preview,
+)
+from workflows.pages.types import CodeSnippet
+
+
+def code(lines: int, end: str = "\n") -> str:
+    return "\n".join(f"line {i}" for i in range(1, lines + 1)) + end
+
+
+@pytest.mark.parametrize("end", ["\n", ""])
+def test_short_snippets_are_shown_whole(end):
+    result = preview(code(PREVIEW_LINES, end))
+    assert not result.truncated
+    assert result.lines == PREVIEW_LINES
+    assert result.head.rstrip("\n") == code(PREVIEW_LINES, "")
+
+
+def test_long_snippets_show_their_first_lines():
+    result = preview(code(PREVIEW_LINES + 1))
+
+    assert result.truncated
+    assert result.lines == PREVIEW_LINES + 1
+    assert result.head == code(PREVIEW_LINES, "")
+
+
+def test_long_lines_are_cut():
+    result = preview("x" * (PREVIEW_CHARS * 2))
+    assert (result.lines, result.truncated) == (1, True)
+    assert len(result.head) == PREVIEW_CHARS
+
+
+def test_previews_are_cached_by_code():
+    assert preview(None) == preview("") == Preview(0, 0, "")
+    assert preview(code(100)) is preview(code(100))
+
+
+def test_format_preview():
+    snippet = CodeSnippet(code="x", language="gel", url="schema.gel")
+    assert format_preview(snippet, preview("x")) == "gel · 1 line · schema.gel"
+    large = CodeSnippet(code=code(300))
+    expected = "plain text · 300 lines · 2.5 KB"
+    assert format_preview(large, preview(large.code)) == expected
@@ -0,0 +1,57 @@
+import sys
+
+import pytest
+
+from workflows import retrieval
+from workflows.pages.store import WorkflowStore
+from workflows.pages.types import Example, Workflow
+from workflows.pages.types import Test as WorkflowTest  # not a test case
+
+WORKFLOWS = [
+    Workflow(
+        name="RAG",
+        examples=[
+            Example(description="Vector search with the AI extension"),
+            Example(description="Chunking documents before embedding them"),
+        ],
+        tests=[WorkflowTest(test_prompt="How do I run a vector search?")],
+    ),
+    Workflow(
+        name="Auth",
+        examples=[Example(description="Sign in with email and password")],
+        tests=[
+            WorkflowTest(test_prompt="Add email sign in"),
+            WorkflowTest(test_prompt="Search users by vector"),
+        ],
+    ),
+    # Skipped: no descriptions to retrieve.
+    Workflow(name="Empty", tests=[WorkflowTest(test_prompt="vector")]),
+]
+
+
+def test_recall_and_mrr_per_workflow():
+    report = retrieval.evaluate(WORKFLOWS, k=1)
+
+    assert (report.queries, report.examples) == (3, 3)
+    [rag, auth] = report.workflows
+    assert (rag.name, rag.recall, rag.mrr) == ("RAG", 0.5, 1.0)
+    assert (auth.name, auth.queries, auth.recall, auth.mrr) == ("Auth", 2, 0.5, 0.5)
+    assert report.recall == pytest.approx(0.5)
+    assert report.mrr == pytest.approx(2 / 3)
+    assert "3 queries over 3 example descriptions" in retrieval.format_report(report)
+
+
+def test_min_recall_fails_the_run(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    for workflow in WORKFLOWS:
+        store.put(workflow)
+
+    argv = ["retrieval-benchmark", "--file", str(path), "-k", "1", "--json"]
+    monkeypatch.setattr(sys, "argv", argv)
+    retrieval.main()
+    assert retrieval.RetrievalReport.model_validate_json(capsys.readouterr().out).k == 1
+
+    monkeypatch.setattr(sys, "argv", [*argv, "--min-recall", "0.9"])
+    with pytest.raises(SystemExit):
+        retrieval.main()
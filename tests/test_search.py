@@ -0,0 +1,63 @@
+from workflows.pages.search import BM25Index, WorkflowIndex
+from workflows.pages.store import WorkflowStore
+from workflows.pages.types import CodeSnippet, Example, Workflow
+from workflows.pages.types import Test as WorkflowTest  # not a test case
+
+
+def keys(hits):
+    return [key for key, _ in hits]
+
+
+def test_bm25_ranks_rare_terms_and_short_documents_first():
+    index = BM25Index()
+    index.add("common", "select user from user")
+    index.add("rare", "select vector")
+    index.add("long", "vector " + "padding " * 20)
+    index.add("other", "insert user")
+
+    assert keys(index.search("vector")) == ["rare", "long"]
+    assert keys(index.search("select vector", limit=1)) == ["rare"]
+    assert index.search("missing") == []
+
+
+def test_bm25_documents_can_be_replaced_and_removed():
+    index = BM25Index()
+    index.add("a", "vector search")
+    index.add("b", "auth")
+    index.add("a", "auth auth")
+
+    assert keys(index.search("vector")) == []
+    assert keys(index.search("auth")) == ["a", "b"]
+
+    index.remove("a")
+    index.remove("missing")
+    assert len(index) == 1
+    assert keys(index.search("auth")) == ["b"]
+
+
+def test_workflow_index_follows_the_store(tmp_path):
+    store = WorkflowStore(tmp_path / "workflows.jsonl")
+    example = Example(
+        name="Vector search", code=[CodeSnippet(code="ext::ai::search(Doc, q)")]
+    )
+    test = WorkflowTest(test_prompt="Set up auth\nwith email")
+    workflow = Workflow(name="RAG", examples=[example], tests=[test])
+    store.put(workflow)
+    index = WorkflowIndex(store)
+
+    [hit] = index.search("ext ai")
+    assert (hit.workflow_id, hit.kind, hit.item_id, hit.title) == (
+        workflow.id,
+        "example",
+        example.id,
+        "Vector search",
+    )
+    [hit] = index.search("email")
+    assert (hit.kind, hit.title) == ("test", "Set up auth")
+
+    workflow.examples = []
+    store.put(workflow)
+    assert index.search("ext ai") == []
+
+    store.delete(workflow.id)
+    assert index.search("email") == []
@@ -0,0 +1,60 @@
+import io
+
+from workflows.pages.serialization import (
+    dump_canonical,
+    dump_workflow,
+    is_canonical,
+    load_record,
+    load_workflow,
+    load_workflows,
+    write_workflows,
+)
+from workflows.pages.types import CodeSnippet, Example, Workflow
+from workflows.pages.types import Test as WorkflowTest  # not a test case
+
+
+def test_workflows_round_trip():
+    workflows = [
+        Workflow(
+            name="Auth ✓",
+            tests=[WorkflowTest(initial_state=[CodeSnippet(code="a\n")])],
+            examples=[Example(code=[CodeSnippet(code="b", source_hash="ab")])],
+        ),
+        Workflow(),
+    ]
+    f = io.BytesIO()
+    written = write_workflows(f, workflows)
+
+    data = f.getvalue()
+    assert written == len(data)
+    assert data.splitlines() == [dump_workflow(workflow) for workflow in workflows]
+    assert data.splitlines()[1] == workflows[1].model_dump_json().encode()
+    assert load_workflows(data.splitlines(keepends=True) + [b"\n"]) == workflows
+    assert load_workflow(data.splitlines()[0]) == workflows[0]
+    assert load_workflows([]) == []
+
+
+def test_canonical_form_is_independent_of_field_order_and_line_endings():
+    workflow = Workflow(
+        name="Auth",
+        examples=[Example(instructions="one\ntwo\n", code=[CodeSnippet(code="x")])],
+    )
+    record = load_record(workflow.model_dump_json())
+    record["examples"][0]["instructions"] = "one\r\ntwo\r\n"
+    shuffled = dict(reversed(record.items()))
+
+    line = dump_canonical(shuffled)
+    assert line == workflow.model_dump_json().encode()
+    assert is_canonical(line + b"\n")
+    assert not is_canonical(workflow.model_dump_json(indent=2).encode())
+
+
+def test_only_ingested_snippets_have_a_source_hash():
+    example = Example(
+        code=[CodeSnippet(code="pasted"), CodeSnippet(code="read", source_hash="ab")]
+    )
+    line = dump_canonical(Workflow(examples=[example]).model_dump())
+
+    pasted, read = load_record(line)["examples"][0]["code"]
+    assert "source_hash" not in pasted
+    assert read["source_hash"] == "ab"
@@ -0,0 +1,84 @@
+import pytest
+
+from workflows.pages.store import WorkflowStore
+from workflows.pages.types import Example, Workflow
+from workflows.server import (
+    INTERNAL_ERROR,
+    INVALID_PARAMS,
+    INVALID_REQUEST,
+    METHOD_NOT_FOUND,
+    RESOURCE_PREFIX,
+    Server,
+)
+
+EXAMPLE = Example(name="Sign in", description="Sign in with a magic link")
+
+
+@pytest.fixture
+def server(tmp_path):
+    store = WorkflowStore(tmp_path / "workflows.jsonl")
+    store.put(Workflow(name="Auth", examples=[EXAMPLE]))
+    return Server(store)
+
+
+def call(server, method, params=None):
+    message = {"jsonrpc": "2.0", "id": 1, "method": method}
+    if params is not None:
+        message["params"] = params
+    return server.handle(message)
+
+
+def tool(server, name, **arguments):
+    return call(server, "tools/call", {"name": name, "arguments": arguments})
+
+
+def test_examples_are_searched_and_fetched(server):
+    found = tool(server, "search_examples", query="magic")
+    assert EXAMPLE.id in found["result"]["content"][0]["text"]
+
+    read = call(server, "resources/read", {"uri": f"{RESOURCE_PREFIX}{EXAMPLE.id}"})
+    assert "Sign in with a magic link" in read["result"]["contents"][0]["text"]
+
+    fetched = tool(server, "fetch_example", example_id="missing")
+    assert fetched["result"]["isError"]
+
+
+@pytest.mark.parametrize(
+    "message, code",
+    [
+        ([1, 2], INVALID_REQUEST),
+        ({"jsonrpc": "2.0", "id": 1}, INVALID_REQUEST),
+        ({"jsonrpc": "2.0", "id": 1, "method": "nothing"}, METHOD_NOT_FOUND),
+        ({"jsonrpc": "2.0", "id": 1, "method": "ping", "params": [1]}, INVALID_PARAMS),
+        (
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "tools/call",
+                "params": {"name": "search_examples", "arguments": "magic"},
+            },
+            INVALID_PARAMS,
+        ),
+        (
+            {"jsonrpc": "2.0", "id": 1, "method": "resources/read", "params": {}},
+            INVALID_PARAMS,
+        ),
+        (
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "tools/call",
+                "params": {"name": "fetch_example", "arguments": {"example_id": [1]}},
+            },
+            INTERNAL_ERROR,
+        ),
+    ],
+)
+def test_bad_requests_get_errors(server, message, code):
+    assert server.handle(message)["error"]["code"] == code
+    assert call(server, "ping") == {"jsonrpc": "2.0", "id": 1, "result": {}}
+
+
+def test_notifications_get_no_answer(server):
+    message = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+    assert server.handle(message) is None
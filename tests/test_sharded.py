@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from workflows.pages.sharded import (
+    MANIFEST_FILE,
+    MARKER_FILE,
+    ShardedWorkflowStore,
+    convert,
+    is_sharded,
+)
+from workflows.pages.store import WorkflowStore, get_store
+from workflows.pages.types import Example, Workflow
+from workflows.pages.validate import validate_directory
+
+
+def test_put_round_trips_through_the_files(tmp_path):
+    store = ShardedWorkflowStore(tmp_path / "workflows")
+    workflow = Workflow(name="Auth", examples=[Example(name="Sign in")])
+    store.put(workflow)
+
+    assert (tmp_path / "workflows" / f"{workflow.id}.json").exists()
+    assert ShardedWorkflowStore(tmp_path / "workflows").get(workflow.id) == workflow
+
+
+def test_edits_of_the_same_size_are_seen(tmp_path):
+    store = ShardedWorkflowStore(tmp_path)
+    workflow = Workflow(name="Auth")
+    store.put(workflow)
+    assert store.summaries()[0].name == "Auth"
+
+    shard = tmp_path / f"{workflow.id}.json"
+    stat = shard.stat()
+    shard.write_text(shard.read_text().replace('"Auth"', '"Oath"'))
+    os.utime(shard, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert shard.stat().st_size == stat.st_size
+
+    assert store.summaries()[0].name == "Oath"
+    assert store.get(workflow.id).name == "Oath"
+
+
+def test_files_added_and_removed_by_hand_are_seen(tmp_path):
+    store = ShardedWorkflowStore(tmp_path)
+    kept, removed = Workflow(name="Kept"), Workflow(name="Removed")
+    store.put(kept)
+    store.put(removed)
+
+    added = Workflow(name="Added")
+    (tmp_path / f"{added.id}.json").write_text(added.model_dump_json())
+    (tmp_path / f"{removed.id}.json").unlink()
+
+    assert sorted(store.ids()) == sorted([kept.id, added.id])
+    assert store.get(added.id) == added
+
+
+def test_manifest_is_local_and_rebuilt_from_the_files(tmp_path):
+    store = ShardedWorkflowStore(tmp_path)
+    workflow = Workflow(name="Auth")
+    store.put(workflow)
+    assert MANIFEST_FILE in (tmp_path / ".gitignore").read_text().splitlines()
+
+    (tmp_path / MANIFEST_FILE).write_text("<<<<<<< ours\n")
+    assert ShardedWorkflowStore(tmp_path).ids() == [workflow.id]
+
+
+def test_convert_round_trips(tmp_path):
+    source = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(source)
+    workflows = [Workflow(name=name) for name in ("One", "Two", "Three")]
+    for workflow in workflows:
+        store.put(workflow)
+
+    convert(source, tmp_path / "workflows")
+    convert(tmp_path / "workflows", tmp_path / "again.jsonl")
+
+    assert WorkflowStore(tmp_path / "again.jsonl").all() == workflows
+
+
+def test_only_marked_directories_are_stores(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "package.json").write_text("{}")
+    assert not is_sharded(tmp_path / "src")
+    with pytest.raises(FileNotFoundError):
+        get_store(tmp_path / "src")
+    with pytest.raises(FileNotFoundError):
+        get_store(tmp_path / "workflow")
+    with pytest.raises(FileNotFoundError):
+        convert(tmp_path / "workflows.jsonl", tmp_path / "workflows")
+    (tmp_path / "workflows.jsonl").write_text("")
+    with pytest.raises(FileExistsError):
+        convert(tmp_path / "workflows.jsonl", tmp_path / "src")
+    assert sorted(os.listdir(tmp_path)) == ["src", "workflows.jsonl"]
+    assert os.listdir(tmp_path / "src") == ["package.json"]
+
+    convert(tmp_path / "workflows.jsonl", tmp_path / "workflows")
+    assert is_sharded(tmp_path / "workflows")
+
+
+def test_reading_a_checkout_writes_nothing(tmp_path):
+    workflow = Workflow(name="Auth")
+    (tmp_path / MARKER_FILE).write_text("")
+    (tmp_path / f"{workflow.id}.json").write_text(workflow.model_dump_json())
+
+    assert get_store(tmp_path).get(workflow.id) == workflow
+    assert sorted(os.listdir(tmp_path)) == [MARKER_FILE, f"{workflow.id}.json"]
+
+
+def test_directories_with_only_a_manifest_get_a_marker(tmp_path):
+    store = ShardedWorkflowStore(tmp_path)
+    store.put(Workflow())
+    (tmp_path / MARKER_FILE).unlink()
+    assert is_sharded(tmp_path)
+
+    ShardedWorkflowStore(tmp_path).put(Workflow())
+    assert (tmp_path / MARKER_FILE).exists()
+
+
+def test_other_json_files_are_skipped(tmp_path):
+    store = ShardedWorkflowStore(tmp_path)
+    workflow = Workflow(name="Auth")
+    store.put(workflow)
+    (tmp_path / "blobs.json").write_text('{"0123": [0, 10]}')
+    (tmp_path / "list.json").write_text("[1, 2]")
+
+    assert store.ids() == [workflow.id]
+    assert list(validate_directory(tmp_path)) == []
+
+    shard = tmp_path / f"{workflow.id}.json"
+    shard.write_text('{"name": "no id any more"}')
+    assert store.ids() == []
+
+    shard.write_text('{"id": "broken", ')
+    with pytest.raises(ValueError):
+        ShardedWorkflowStore(tmp_path).ids()
+    [error] = validate_directory(tmp_path)
+    assert error.file == shard.name
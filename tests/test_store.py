@@ -0,0 +1,111 @@
+import pytest
+
+from workflows.pages.serialization import load_record
+from workflows.pages.store import MISSING_VERSION, WorkflowConflict, WorkflowStore
+from workflows.pages.types import Example, Workflow
+
+
+def lines(path):
+    return path.read_bytes().splitlines()
+
+
+def test_put_round_trips_through_the_file(tmp_path):
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    workflow = Workflow(name="Auth", examples=[Example(name="Sign in")])
+    store.put(workflow)
+
+    reopened = WorkflowStore(path)
+    assert reopened.ids() == [workflow.id]
+    assert reopened.get(workflow.id) == workflow
+
+
+def test_put_refuses_a_stale_version(tmp_path):
+    store = WorkflowStore(tmp_path / "workflows.jsonl")
+    workflow = Workflow(name="Auth")
+    store.put(workflow, MISSING_VERSION)
+    with pytest.raises(WorkflowConflict):
+        store.put(Workflow(id=workflow.id, name="Other"), MISSING_VERSION)
+
+    _, version = store.checkout(workflow.id)
+    store.put(Workflow(id=workflow.id, name="Mine"), version)
+    with pytest.raises(WorkflowConflict):
+        store.put(Workflow(id=workflow.id, name="Theirs"), version)
+    assert store.get(workflow.id).name == "Mine"
+
+
+def test_unchanged_put_writes_nothing(tmp_path):
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    workflow = Workflow(name="Auth")
+    store.put(workflow)
+    size = path.stat().st_size
+
+    store.put(workflow.model_copy(deep=True))
+    assert path.stat().st_size == size
+
+
+def test_delete_is_a_tombstone_until_compacted(tmp_path):
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    kept, deleted = Workflow(name="Kept"), Workflow(name="Deleted")
+    store.put(kept)
+    store.put(deleted)
+    store.put(Workflow(id=kept.id, name="Kept again"))
+    assert store.delete(deleted.id)
+    assert not store.delete(deleted.id)
+
+    assert len(lines(path)) == 4
+    assert WorkflowStore(path).ids() == [kept.id]
+
+    store.compact()
+    assert [load_record(line)["name"] for line in lines(path)] == ["Kept again"]
+    assert WorkflowStore(path).get(kept.id).name == "Kept again"
+
+
+def test_changes_from_outside_are_seen(tmp_path):
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    workflow = Workflow(name="Auth")
+    store.put(workflow)
+
+    WorkflowStore(path).put(Workflow(id=workflow.id, name="Edited elsewhere"))
+    assert store.get(workflow.id).name == "Edited elsewhere"
+
+
+def test_torn_last_line_is_ignored_and_cut_off(tmp_path):
+    path = tmp_path / "workflows.jsonl"
+    store = WorkflowStore(path)
+    workflow = Workflow(name="Auth")
+    store.put(workflow)
+
+    # What a crash halfway through appending a line leaves behind.
+    line = Workflow(name="Torn").model_dump_json().encode() + b"\n"
+    offset = path.stat().st_size
+    (tmp_path / ".workflows.jsonl.pending").write_text(f"{offset} {len(line)}")
+    with path.open("ab") as f:
+        f.write(line[:20])
+
+    store = WorkflowStore(path)
+    assert store.ids() == [workflow.id]
+
+    added = Workflow(name="Added")
+    store.put(added)
+    assert [load_record(line)["name"] for line in lines(path)] == ["Auth", "Added"]
+    assert not (tmp_path / ".workflows.jsonl.pending").exists()
+
+
+@pytest.mark.parametrize("pending", [None, "0 1000"])
+def test_invalid_last_line_is_refused(tmp_path, pending):
+    path = tmp_path / "workflows.jsonl"
+    WorkflowStore(path).put(Workflow(name="Auth"))
+    with path.open("ab") as f:
+        f.write(b'{"id": "edited by hand", "name": ')
+    if pending is not None:
+        # A marker left for another line doesn't make this one torn.
+        (tmp_path / ".workflows.jsonl.pending").write_text(pending)
+    data = path.read_bytes()
+
+    with pytest.raises(ValueError, match="incomplete"):
+        WorkflowStore(path)
+    assert path.read_bytes() == data
@@ -0,0 +1,89 @@
+from workflows.pages import types
+from workflows.pages.types import CodeSnippet, Example, Workflow
+from workflows.pages.types import Test as WorkflowTest  # not a test case
+
+
+def test_upsert_replaces_by_id():
+    workflow = Workflow()
+    first = WorkflowTest(test_prompt="first")
+    second = WorkflowTest(test_prompt="second")
+    workflow.upsert_test(first)
+    workflow.upsert_test(second)
+    workflow.upsert_test(WorkflowTest(id=first.id, test_prompt="edited"))
+
+    assert [test.test_prompt for test in workflow.tests] == ["edited", "second"]
+
+
+def test_remove_keeps_positions_of_later_items():
+    example = Example()
+    snippets = [CodeSnippet(code=str(i)) for i in range(3)]
+    for snippet in snippets:
+        example.upsert_code_snippet(snippet)
+    example.remove_code_snippet(snippets[0])
+    example.upsert_code_snippet(CodeSnippet(id=snippets[2].id, code="edited"))
+
+    assert [snippet.code for snippet in example.code] == ["1", "edited"]
+
+
+def test_upsert_after_removing_earlier_items():
+    workflow = Workflow()
+    tests = [WorkflowTest(test_prompt=str(i)) for i in range(4)]
+    for test in tests:
+        workflow.upsert_test(test)
+    workflow.remove_test(tests[0])
+    workflow.remove_test(tests[2])
+    workflow.upsert_test(WorkflowTest(id=tests[3].id, test_prompt="edited"))
+    workflow.upsert_test(WorkflowTest(test_prompt="new"))
+
+    assert [test.test_prompt for test in workflow.tests] == ["1", "edited", "new"]
+
+
+def test_inserts_dont_reindex(monkeypatch):
+    rebuilds = []
+    rebuild = types._Positions._rebuild
+    monkeypatch.setattr(
+        types._Positions,
+        "_rebuild",
+        lambda self, items: rebuilds.append(len(items)) or rebuild(self, items),
+    )
+    example = Example()
+    for i in range(1000):
+        example.upsert_code_snippet(CodeSnippet(code=str(i)))
+    example.remove_code_snippet(example.code[-1])
+    example.upsert_code_snippet(CodeSnippet(id=example.code[-1].id, code="edited"))
+
+    assert len(example.code) == 999
+    assert example.code[-1].code == "edited"
+    assert rebuilds == [0]
+
+
+def test_upsert_after_list_changed_directly():
+    workflow = Workflow()
+    workflow.upsert_test(WorkflowTest(test_prompt="first"))
+    appended = WorkflowTest(test_prompt="appended")
+    workflow.tests.append(appended)
+    workflow.upsert_test(WorkflowTest(id=appended.id, test_prompt="edited"))
+
+    assert [test.test_prompt for test in workflow.tests] == ["first", "edited"]
+
+
+def test_upsert_after_list_replaced():
+    workflow = Workflow()
+    workflow.upsert_example(Example(name="old"))
+    example = Example(name="new")
+    workflow.examples = [example]
+    workflow.upsert_example(Example(id=example.id, name="edited"))
+
+    assert [example.name for example in workflow.examples] == ["edited"]
+
+
+def test_copies_have_their_own_positions():
+    workflow = Workflow()
+    workflow.upsert_example(Example(name="first"))
+    copy = workflow.model_copy(deep=True)
+    copy.upsert_example(Example(name="second"))
+    workflow.remove_example(workflow.examples[0])
+
+    assert [example.name for example in copy.examples] == ["first", "second"]
+    assert workflow.examples == []
+    assert copy == Workflow.model_validate(copy.model_dump())
@@ -0,0 +1,58 @@
+import pytest
+
+from workflows import cli
+from workflows.pages.serialization import dump_workflow
+from workflows.pages.sharded import convert
+from workflows.pages.types import Workflow
+from workflows.pages.validate import validate_directory, validate_file
+
+VALID = dump_workflow(Workflow(name="Valid")) + b"\n"
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "workflows.jsonl"
+    path.write_bytes(
+        VALID * 3
+        + b'{"id": "a", "tests": 1}\n'
+        + VALID
+        + b"\n"
+        + b'{"id": "b"\n'
+        + VALID * 50
+        + b'{"id": "c", "examples": [{"code": "x"}]}\n'
+    )
+    return path
+
+
+def test_errors_have_line_numbers(path):
+    errors = list(validate_file(path, jobs=1))
+
+    assert [(error.line, error.location) for error in errors] == [
+        (4, "tests"),
+        (7, ""),
+        (58, "examples.0.code"),
+    ]
+    assert str(errors[0]) == "4: tests: Input should be a valid array"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_chunks_are_numbered_from_the_start_of_the_file(path, jobs):
+    expected = list(validate_file(path, jobs=1))
+    assert list(validate_file(path, jobs=jobs, chunk_size=100)) == expected
+
+
+def test_directories_report_file_names(tmp_path):
+    source = tmp_path / "workflows.jsonl"
+    source.write_bytes(VALID)
+    convert(source, tmp_path / "workflows")
+    (tmp_path / "workflows" / "bad.json").write_text('{"id": "bad", "tests": 1}')
+
+    [error] = validate_directory(tmp_path / "workflows")
+    assert str(error) == "bad.json: tests: Input should be a valid array"
+
+
+def test_cli_prints_errors_with_the_path(path, capsys):
+    with pytest.raises(SystemExit, match="3 errors"):
+        cli.main(["validate", str(path), "--jobs", "1"])
+    first = capsys.readouterr().out.splitlines()[0]
+    assert first == f"{path}:4: tests: Input should be a valid array"
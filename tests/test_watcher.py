@@ -0,0 +1,77 @@
+import pytest
+
+from workflows.pages import watcher
+from workflows.pages.store import WorkflowStore
+from workflows.pages.types import Workflow
+from workflows.pages.watcher import WorkflowWatcher, changes, watch
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    # Checked by hand, unless a test polls.
+    monkeypatch.setattr(watcher, "Observer", None)
+    monkeypatch.setattr(watcher, "POLL_INTERVAL", 3600)
+    path = tmp_path / "workflows.jsonl"
+    # The editor's store, and another process writing to the same file.
+    return WorkflowStore(path), WorkflowStore(path)
+
+
+def test_changes_by_others_are_recorded_by_generation(stores):
+    store, other = stores
+    first, second = Workflow(name="First"), Workflow(name="Second")
+    store.put(first)
+    store.put(second)
+    store.checkout_shared(first.id)
+    file_watcher = WorkflowWatcher(store)
+
+    file_watcher.check()
+    assert file_watcher.changes_since(0) == (0, set())
+
+    other.put(Workflow(id=first.id, name="Renamed"))
+    file_watcher.check()
+    assert file_watcher.changes_since(0) == (1, {first.id})
+    # The store's cached copy was dropped.
+    assert store.checkout_shared(first.id)[0].name == "Renamed"
+
+    other.delete(second.id)
+    file_watcher.check()
+    assert file_watcher.changes_since(0) == (2, {first.id, second.id})
+    assert file_watcher.changes_since(1) == (2, {second.id})
+    assert file_watcher.wait(1, timeout=0) == 2
+
+
+def test_pages_see_everything_changed_when_they_fall_behind(stores, monkeypatch):
+    monkeypatch.setattr(watcher, "HISTORY_SIZE", 1)
+    store, other = stores
+    file_watcher = WorkflowWatcher(store)
+    for name in ["First", "Second"]:
+        other.put(Workflow(name=name))
+        file_watcher.check()
+
+    assert file_watcher.changes_since(0) == (2, None)
+    assert file_watcher.changes_since(1)[1] is not None
+
+
+def test_sessions_remember_their_generation(stores, monkeypatch):
+    monkeypatch.setattr(watcher, "_watchers", {})
+    store, other = stores
+    state = {}
+
+    assert changes(state, store, "list") is None
+    watch(state, store, "list")
+    workflow = Workflow()
+    other.put(workflow)
+    watcher.get_watcher(store).check()
+
+    assert changes(state, store, "list") == {workflow.id}
+    assert changes(state, store, "list") == set()
+
+
+def test_polling_notices_changes(stores, monkeypatch):
+    monkeypatch.setattr(watcher, "POLL_INTERVAL", 0.01)
+    store, other = stores
+    file_watcher = WorkflowWatcher(store)
+    assert file_watcher.polling
+
+    other.put(Workflow())
+    assert file_watcher.wait(0, timeout=10) == 1